@@ -21,9 +21,13 @@
 # SOFTWARE.
 
 ESC_CHAR = "#"
-THREAD_TIMEOUT = 60  # sec.
+THREAD_TIMEOUT = 60  # sec. Longest device task, unless set by "Task_Timeout".
+TASK_MARGIN = 5  # sec. Added to the sampling window to get a device task deadline.
+TASK_GRACE = 1000  # ms. Past its deadline a task is overrun and its device powered off.
 TIMEOUT = 60  # sec.
 SESSION_TIMEOUT = 604800  # sec.
+SESSION_IDLE = 1800  # sec. Session ends after this user inactivity, 0 never.
+SESSION_POLL = 1000  # ms. Longest main loop wait in a user session, login, logout and menu exit wake it up.
 LOGIN_ATTEMPTS = 3
 PASSWD = "pippo"
 WD_TIMEOUT = 30000  # 1000ms < watchdog timer timeout < 32000ms
@@ -39,11 +43,50 @@ SENT_FILE_PFX = "_"
 BUF_DAYS = 3
 DATA_SEPARATOR = ","
 LOG_LEVEL = 0  # 0 screen output, 1 log to file
+LOG_THRESHOLD = 20  # Messages under this level are printed only, not saved: 10 debug, 20 info, 30 warning, 40 error.
+CONSOLE_THRESHOLD = 20  # Messages under this level are not printed, 10 shows the debug ones.
+LOG_FILE = "Log.txt"
+LOG_BUF = 1024  # bytes. Log lines kept in ram, written out when full, before sleeping and on errors.
+LOG_FILE_SIZE = 32768  # bytes. The log file is rotated past this, to Log.1.txt, Log.2.txt...
+LOG_BUDGET = 131072  # bytes. All the log files, the oldest is dropped past this.
+ASYNCIO = 0  # 0 worker threads, 1 uasyncio runtime
+WORKERS = 2  # Worker threads running device tasks.
+WORKER_SPARES = 2  # Workers started at most to replace the ones stuck in overrun tasks.
+CPU_GOVERNOR = 1  # 0 fixed clock set in boot.py, 1 clock set by running phase
+CPU_FREQ = {"io-wait":48000000, "transfer":84000000, "compute":168000000}  # Hz.
+PROFILER = 0  # 0 disabled, 1 times awake cycles and code sites
+PROFILER_SITES = 32  # Profiler table size.
+PROFILER_INTERVAL = 3600  # sec. Logs the profiler table to the data file.
+GC_ADAPTIVE = 1  # 0 collects at every main loop pass, 1 adaptive threshold and safe point collections
+GC_CYCLES = 8  # Wake cycles of allocations between automatic collections.
+GC_MIN_THRESHOLD = 4096  # bytes. Lowest gc threshold.
+GC_LARGEST_MIN = 8192  # bytes. Largest buffer needed, caches are released when it doesn't fit.
+GC_PROBE_INTERVAL = 10  # Safe points between largest buffer probes.
 VERBOSE = 0  # 0 nothing, 1 shows device activity
 DEVICE_PATH = "devices"
-DEVICE_STATUS = {0:"OFF", 1:"ON", 2:"READY"}
+DEVICE_STATUS = {0:"OFF", 1:"ON", 2:"READY", 3:"DEGRADED"}
 LEDS = {"IO":1, "PWR":2, "RUN":3, "SLEEP":4}  # red, green, yellow, blue
 UARTS = {1:2, 2:4, 3:6, 4:1}
 DEVICES = {"L80M39_1":1, "Y32500_1":1, "METRECX_1":2, "AQUADOPP_1":3}
+MODEM = "dev_quasar.GSMQ2403_1"  # Sends the data files, if configured.
 DATA_ACQUISITION_INTERVAL = 60  # sec.
-SCHEDULER = {"L80M39_1":{"sync_rtc":120, "last_fix":30}}
+SLEEP_TOLERANCE = 2  # sec. Events this close share a wake: "on" earlier, "off" later, tasks earlier once warmed up. 0 disables.
+RTC_WAKEUP_MAX = 65535  # sec. Longest rtc wakeup period (1 Hz clock).
+STARTUP_TIMEOUT = 30  # sec. Device start up deadline, unless set by "Startup_Timeout".
+STARTUP_RETRY = 3600  # sec. Degraded devices start up retry interval.
+MOORING_RING = 32  # Gps fixes kept by the mooring watch.
+MOORING_ALPHA = 0.25  # Drift velocity smoothing factor, 1 keeps the last fix only.
+CLOCK_MAX_ERROR = 500  # ms. Predicted rtc error allowed before the next gps sync.
+CLOCK_MAX_INTERVAL = 86400  # sec. Longest rtc sync interval.
+CLOCK_FORGET = 0.8  # Weight of the past syncs in the drift fit, 0 keeps the last one only.
+CLOCK_LATENCY = 0  # ms. Receiver delay from the utc second to the end of its RMC sentence.
+ENERGY_TIERS = ((12.1, 1, 1, 0), (11.8, 2, 1, 6), (11.6, 4, 2, 24), (0, 8, 4, None))  # (battery V from, interval stretch, samples divider, upload period h: 0 at once, None never)
+ENERGY_HYSTERESIS = 0.2  # V. Over the upper tier level to recover it.
+ENERGY_SAMPLED = ("ADC_1", "METRECX_1")  # Devices taking fewer samples in the low tiers.
+BRIDGE_BUF = 512  # bytes. Transparent mode chunk, one buffer per direction.
+BRIDGE_POLL = 200  # ms. Transparent mode wait for input, then the interactive mode is rechecked.
+BRIDGE_GUARD = 1000  # ms. Binary transparent mode: a [BACKSPACE] alone after this console silence backs to the menu.
+VIEW_BLOCK = 512  # bytes. File viewer read block, the longest line shown whole.
+VIEW_LINES = 20  # File viewer lines per page.
+VIEW_INDEX = 16  # File viewer pages kept to page back, older ones are found reading backwards.
+TASK_SCHEDULER = {"L80M39_1":{"sync_rtc":120, "last_fix":30}}
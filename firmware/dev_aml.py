@@ -24,16 +24,25 @@
 import utime
 from device import DEVICE
 import tools.utils as utils
+import tools.profiler as profiler
 import constants
 
 class METRECX(DEVICE):
     """Creates an aml metrecx multiparametric probe object."""
 
-    def __init__(self, instance):
+    def __init__(self, instance, tasks=[]):
         DEVICE.__init__(self, instance)
         self.timeout = constants.TIMEOUT
         self.prompt = ">"
-
+        data_tasks = ["log"]
+        if tasks:
+            if any(elem in data_tasks for elem in tasks):
+                self.main()  # Logs the sample.
+            for task in tasks:
+                if task not in data_tasks:
+                    eval("self." + task + "()", {"self":self})
+
+    @profiler.profiled("METRECX.start_up")
     def start_up(self):
         """Performs device specific initialization sequence."""
         if self.init_power():
@@ -48,13 +57,15 @@ class METRECX(DEVICE):
         return False
 
     def _timeout(self, start, timeout=None):
-        """Checks if a timeout occourred
+        """Checks if a timeout occourred or the task is cancelled
 
         Params:
             start(int)
         Returns:
             True or False
         """
+        if self.cancelled():  # Past the task deadline.
+            return True
         if timeout is None:
             timeout = self.timeout
         if timeout > 0 and utime.time() - start >= timeout:
@@ -67,22 +78,23 @@ class METRECX(DEVICE):
         Returns:
             bytes or None
         """
-        start = utime.time()
-        while not self._timeout(start, timeout):
-            if self.uart.any():
-                return self.uart.read().split(b"\r\n")[1].decode("utf-8")
-        return
+        if timeout is None:
+            timeout = self.timeout
+        rx = self.read_reply(self.deadline(timeout))
+        if rx is not None:
+            return rx.split(b"\r\n")[1].decode("utf-8")
 
     def _break(self):
-        utils.log_file("{} => waiting for instrument getting ready...".format(self.__qualname__))  # DEBUG
-        while True:
-            self._flush_uart()
+        utils.log_file("{} => waiting for instrument getting ready...".format(self.__qualname__), level=utils.DEBUG)  # DEBUG
+        while not self.cancelled():
+            self.flush_uart()
             self.uart.write(b"\x03")  # <CTRL+C>
             if self._get_prompt(120):
                 return True
+        return False
 
     def _get_prompt(self, timeout=None):
-        self._flush_uart()
+        self.flush_uart()
         self.uart.write(b"\r")
         rx = self._get_reply(timeout)
         if rx == self.prompt:
@@ -121,9 +133,9 @@ class METRECX(DEVICE):
     def _set_clock(self):
         """Syncs the intrument clock."""
         if self._set_date() and self._set_time():
-            utils.log_file("{} => clock synced (dev: {} {} board: {})".format(self.__qualname__, self._get_date(), self._get_time(), utils.time_string(utime.mktime(utime.localtime()))))  # DEBUG
+            utils.log_file("{} => clock synced (dev: {} {} board: {})".format(self.__qualname__, self._get_date(), self._get_time(), utils.time_string(utime.mktime(utime.localtime()))), level=utils.DEBUG)  # DEBUG
             return True
-        utils.log_file("{} => unable to sync clock".format(self.__qualname__))  # DEBUG
+        utils.log_file("{} => unable to sync clock".format(self.__qualname__), level=utils.WARNING)  # DEBUG
         return False
 
     def _set_sample_rate(self):
@@ -133,30 +145,30 @@ class METRECX(DEVICE):
             if self._get_reply() ==  self.prompt:
                 self._get_sample_rate()
                 return True
-        utils.log_file("{} => unable to set sampling rate".format(self.__qualname__))  # DEBUG
+        utils.log_file("{} => unable to set sampling rate".format(self.__qualname__), level=utils.WARNING)  # DEBUG
         return False
 
     def _get_sample_rate(self):
         if self._get_prompt():
             self.uart.write("DIS S\r")
-            utils.log_file("{} => {}".format(self.__qualname__, self._get_reply()))  # DEBUG
+            utils.log_file("{} => {}".format(self.__qualname__, self._get_reply()), level=utils.DEBUG)  # DEBUG
 
     def _stop_logging(self):
         if self._get_prompt():
             self.uart.write("SET SCAN NOLOGGING\r")
             if self._get_prompt():
-                utils.log_file("{} => logging stopped".format(self.__qualname__))  # DEBUG
+                utils.log_file("{} => logging stopped".format(self.__qualname__), level=utils.DEBUG)  # DEBUG
                 return True
-        utils.log_file("{} => unable to stop logging".format(self.__qualname__))  # DEBUG
+        utils.log_file("{} => unable to stop logging".format(self.__qualname__), level=utils.WARNING)  # DEBUG
         return False
 
     def _start_logging(self):
         if self._get_prompt():
             self.uart.write("SET SCAN LOGGING\r")
             if self._get_prompt():
-                utils.log_file("{} => logging started".format(self.__qualname__))  # DEBUG
+                utils.log_file("{} => logging started".format(self.__qualname__), level=utils.DEBUG)  # DEBUG
                 return True
-        utils.log_file("{} => unable to start logging".format(self.__qualname__))  # DEBUG
+        utils.log_file("{} => unable to start logging".format(self.__qualname__), level=utils.WARNING)  # DEBUG
         return False
 
     def _format_data(self, sample):
@@ -174,27 +186,39 @@ class METRECX(DEVICE):
             data.append(field)
         return constants.DATA_SEPARATOR.join(data)
 
+    @profiler.profiled("METRECX.main")
     def main(self):
         """Captures instrument data."""
         if not self.init_uart():
             return
-        utils.log_file("{} => acquiring data...".format(self.__qualname__))  # DEBUG
+        utils.log_file("{} => acquiring data...".format(self.__qualname__), level=utils.DEBUG)  # DEBUG
         self.led_on()
         sample = ""
-        new_line = False
-        start = utime.time()
-        while True:
-            if utime.time() - start > self.config["Samples"] // self.config["Sample_Rate"]:
-                utils.log_file("{} => no data coming from serial".format(self.__qualname__))  # DEBUG
-                break
-            if self.uart.any():
-                byte = self.uart.read(1)
-                if byte == b"\n":
-                    new_line = True
-                elif byte == b"\r" and new_line:
-                    break
-                elif new_line:
-                    sample += byte.decode("utf-8")
+        deadline = self.deadline(self.config["Samples"] // self.config["Sample_Rate"])
+        if self.read_until(b"\n", deadline) is not None:  # Skips the first line, may be truncated.
+            line = self.read_until(b"\r", deadline)
+            if line is not None:
+                sample = line[:-1].decode("utf-8")
+        if not sample:
+            utils.log_file("{} => no data coming from serial".format(self.__qualname__), level=utils.DEBUG)  # DEBUG
+        utils.log_data(self._format_data(sample))
+        self.led_on()
+        return
+
+    async def amain(self):
+        """Coroutine version of :func:`main`."""
+        if not self.init_uart():
+            return
+        utils.log_file("{} => acquiring data...".format(self.__qualname__), level=utils.DEBUG)  # DEBUG
+        self.led_on()
+        sample = ""
+        deadline = self.deadline(self.config["Samples"] // self.config["Sample_Rate"])
+        if await self.aread_until(b"\n", deadline) is not None:  # Skips the first line, may be truncated.
+            line = await self.aread_until(b"\r", deadline)
+            if line is not None:
+                sample = line[:-1].decode("utf-8")
+        if not sample:
+            utils.log_file("{} => no data coming from serial".format(self.__qualname__), level=utils.DEBUG)  # DEBUG
         utils.log_data(self._format_data(sample))
         self.led_on()
         return
@@ -203,9 +227,12 @@ class METRECX(DEVICE):
 class UVXCHANGE(DEVICE):
     """Creates an aml uvxchange untifouling object."""
 
-    def __init__(self, instance):
+    def __init__(self, instance, tasks=[]):
         DEVICE.__init__(self, instance)
-        
+        for task in tasks:
+            eval("self." + task + "()", {"self":self})
+
+    @profiler.profiled("UVXCHANGE.start_up")
     def start_up(self):
         """Performs device specific initialization sequence."""
         if self.init_power():
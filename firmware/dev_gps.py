@@ -25,10 +25,17 @@
 import pyb
 import utime
 import tools.utils as utils
+import tools.profiler as profiler
+import tools.governor as governor
+import tools.mooring as mooring
+import tools.clock as clock
 import constants
 from device import DEVICE
 from tools.nmea import NMEA
-from math import sin, cos, sqrt, atan2, radians
+
+I2C_COUNT = 0xFD  # Bytes available register, 2 bytes big endian.
+I2C_DATA = 0xFF  # Stream register.
+I2C_POLL = 100  # ms. Bytes available polling interval.
 
 class GPS(NMEA, DEVICE):
     """Creates a GPS device object.
@@ -47,6 +54,7 @@ class GPS(NMEA, DEVICE):
         """Constructor method."""
         DEVICE.__init__(self, instance)
         NMEA.__init__(self, instance)
+        self.init_i2c()
         data_tasks = ["log","last_fix","sync_rtc"]
         if tasks:
             if any(elem in data_tasks for elem in tasks):
@@ -57,6 +65,31 @@ class GPS(NMEA, DEVICE):
                 for task in tasks:
                     eval("self." + task + "()", {"self":self})
 
+    def init_i2c(self):
+        """Initializes the i2c bus and its burst read buffer.
+
+        The buffer is allocated once per object, the receiver stream is read
+        into it by :func:`_i2c_read_reg` and passed to
+        :func:`tools.nmea.NMEA.feed`.
+        """
+        if self.config.get("I2C_Address"):
+            try:
+                self.i2c_addr = int(self.config["I2C_Address"], 16)
+                self.i2c = pyb.I2C(int(self.config.get("I2C_Bus", 1)), pyb.I2C.MASTER, baudrate=int(self.config.get("I2C_Baudrate", 100000)))
+                governor.register(self.i2c, pyb.I2C.MASTER, baudrate=int(self.config.get("I2C_Baudrate", 100000)))  # Reinitialized at cpu frequency switch.
+                size = int(self.config.get("I2C_Buf_Len", 255))
+                if not hasattr(self, "i2c_buf") or len(self.i2c_buf) != size:
+                    self.i2c_buf = bytearray(size)
+                    self.i2c_mv = memoryview(self.i2c_buf)
+                    self.i2c_count = bytearray(2)
+                self.i2c_head = 0  # First unparsed byte.
+                self.i2c_tail = 0  # First free byte.
+                return True
+            except (ValueError) as err:
+                utils.log_file("{} => {}.".format(self.name, err), constants.LOG_LEVEL)
+        return False
+
+    @profiler.profiled("GPS.start_up")
     def start_up(self):
         """Performs the device specific initialization sequence.
 
@@ -68,10 +101,25 @@ class GPS(NMEA, DEVICE):
           return True
         return False
 
+    def set_output(self):
+        """Restricts the receiver output to the needed sentences.
+
+        Receivers without known commands stream their default sentences, the
+        parser skips the unwanted ones.
+
+        Returns:
+            True if the receiver accepted the output config
+        """
+        return False
+
+    @profiler.profiled("GPS.main")
     def main(self, sentence="RMC"):
         """Retreives data either from a UART or I2C gps device.
 
-        Passes  data char by char to :func:`tools.nmea.NMEA.get_sentence` to get a valid
+        Serial data is read line by line by :func:`device.DEVICE.read_line`
+        and passed to :func:`tools.nmea.NMEA.parse`, I2C data is burst read by
+        :func:`_i2c_read_reg` and passed chunk by chunk to
+        :func:`tools.nmea.NMEA.feed` to get a valid
         :download:`NMEA <../../media/NV08C_RTK_NMEA_Protocol_Specification_V16_ENG_1.pdf>` string.
 
         Parameters:
@@ -81,51 +129,138 @@ class GPS(NMEA, DEVICE):
             ``True`` or ``False`` depends on gps got a valid fix.
         """
         utils.log_file("{} => acquiring data...".format(self.name), constants.LOG_LEVEL)
+        if self.config["I2C_Address"]:
+            self._i2c_flush()
         while True:
-            if not self.status() == "READY":  # Exits if the device has been switched off by scheduler.
-                utils.log_file("{} => timeout occourred".format(self.name), constants.LOG_LEVEL, True)  # DEBUG
+            if self.cancelled():  # Exits past the task deadline.
+                utils.log_file("{} => timeout occourred".format(self.name), constants.LOG_LEVEL, True, level=utils.WARNING)  # DEBUG
+                return False
+            if utils.status_table[self.name] != 2:  # Exits if the scheduler switched the device off, or left it on acquiring.
+                utils.log_file("{} => acquisition ended by the off event ({})".format(self.name, constants.DEVICE_STATUS[utils.status_table[self.name]]), constants.LOG_LEVEL)
                 return False
             if self.config["I2C_Address"]:  # Retreives data from an I2C device.
-                for char in self._i2c_read_reg():
-                    if self.get_sentence(char, sentence):
-                        continue
+                if self.i2c_head == self.i2c_tail and not self._i2c_read_reg(self.deadline(1)):
+                    continue
+                count = self.feed(self.i2c_mv[self.i2c_head:self.i2c_tail], sentence)
+                if count < 0:  # Chunk consumed, no sentence completed.
+                    self.i2c_head = self.i2c_tail
+                    continue
+                self.i2c_head += count
             else:  # Retreives data from a serial device.
-                if self.uart.any():
-                    if not self.get_sentence(self.uart.readchar(), sentence):
-                        continue
-                else:
+                line = self.read_line(self.deadline(1))
+                if not line or not self.parse(line, sentence):
                     continue
             if self.fixed():
                 return True
             else:
-                utils.log_file("{} => invalid data received".format(self.name), constants.LOG_LEVEL, True)  # DEBUG
+                utils.log_file("{} => invalid data received".format(self.name), constants.LOG_LEVEL, True, level=utils.WARNING)  # DEBUG
 
-    def _i2c_read_reg(self):
-        """Reads the data form the i2c register."""
-        pass
+    async def amain(self, sentence="RMC"):
+        """Coroutine version of :func:`main`, awaits data from a UART gps
+        device.
 
+        Parameters:
+            ``sentence`` :obj:`str` The desired NMEA sentence.
+
+        Return:
+            ``True`` or ``False`` depends on gps got a valid fix.
+        """
+        if self.config["I2C_Address"]:
+            return self.main(sentence)
+        utils.log_file("{} => acquiring data...".format(self.name), constants.LOG_LEVEL)
+        while True:
+            if self.cancelled():  # Exits past the task deadline.
+                utils.log_file("{} => timeout occourred".format(self.name), constants.LOG_LEVEL, True, level=utils.WARNING)  # DEBUG
+                return False
+            if utils.status_table[self.name] != 2:  # Exits if the scheduler switched the device off, or left it on acquiring.
+                utils.log_file("{} => acquisition ended by the off event ({})".format(self.name, constants.DEVICE_STATUS[utils.status_table[self.name]]), constants.LOG_LEVEL)
+                return False
+            line = await self.aread_line(self.deadline(1))
+            if not line or not self.parse(line, sentence):
+                continue
+            if self.fixed():
+                return True
+            else:
+                utils.log_file("{} => invalid data received".format(self.name), constants.LOG_LEVEL, True, level=utils.WARNING)  # DEBUG
+
+    def _i2c_read_reg(self, deadline):
+        """Burst reads the receiver stream into the i2c buffer.
+
+        Reads the bytes available count, then as many bytes (a buffer at most)
+        from the stream register in a single transfer, polls the count every
+        :data:`I2C_POLL` ms while the receiver has nothing to send.
+
+        Params:
+            deadline(int): ticks_ms
+        Returns:
+            count(int): number of bytes read, 0 if deadline expired
+        """
+        while True:
+            try:
+                self.i2c.mem_read(self.i2c_count, self.i2c_addr, I2C_COUNT)
+                count = min(self.i2c_count[0] << 8 | self.i2c_count[1], len(self.i2c_buf))
+                if count:
+                    self.i2c.mem_read(self.i2c_mv[:count], self.i2c_addr, I2C_DATA)
+                    self.i2c_head = 0
+                    self.i2c_tail = count
+                    return count
+            except OSError as err:
+                utils.log_file("{} => i2c error {}".format(self.name, err), constants.LOG_LEVEL, True, level=utils.WARNING)  # DEBUG
+            remain = utime.ticks_diff(deadline, utime.ticks_ms())
+            if remain <= 0:
+                return 0
+            utime.sleep_ms(min(I2C_POLL, remain))
+
+    def _i2c_flush(self):
+        """Discards the bytes the receiver holds, queued during the warm up."""
+        self.i2c_head = self.i2c_tail = 0
+        self.nmea_len = -1
+        try:
+            self.i2c.mem_read(self.i2c_count, self.i2c_addr, I2C_COUNT)
+            count = self.i2c_count[0] << 8 | self.i2c_count[1]
+            while count > 0:
+                size = min(count, len(self.i2c_buf))
+                self.i2c.mem_read(self.i2c_mv[:size], self.i2c_addr, I2C_DATA)
+                count -= size
+        except OSError as err:
+            utils.log_file("{} => i2c error {}".format(self.name, err), constants.LOG_LEVEL, True, level=utils.WARNING)  # DEBUG
+
+    @profiler.profiled("GPS.log")
     def log(self):
         """Writes out acquired data to a file."""
         utils.log_data("$" + ",".join(map(str, self.sentence)))
         return
 
     def sync_rtc(self):
-        """Synchronizes the board RTC with the gps utc timestamp."""
+        """Synchronizes the board RTC with the gps utc timestamp.
+
+        The sentence parsed by :func:`main` may have waited in the receive
+        buffer, a fresh one is read and its utc (fraction included) is passed
+        with its arrival time to :func:`tools.clock.sync`, which measures the
+        rtc drift and sets the rtc on the next utc second.
+        """
         if self.fixed():
             utils.log_file("{} => syncyng rtc...".format(self.name), constants.LOG_LEVEL)
+            if not self.config["I2C_Address"]:
+                self.flush_uart()  # The i2c backlog is flushed by main.
+            if not self.main():
+                return
+            received = utime.ticks_ms()
             utc_time = self.sentence[1]
             utc_date = self.sentence[9]
-            rtc = pyb.RTC()
             try:
-                rtc.datetime((int("20"+utc_date[4:6]), int(utc_date[2:4]), int(utc_date[0:2]), 0, int(utc_time[0:2]), int(utc_time[2:4]), int(utc_time[4:6]), float(utc_time[6:])))  # rtc.datetime(yyyy, mm, dd, 0, hh, ii, ss, sss)
-                utils.log_file("{} => rtc successfully synchronized (UTC: {})".format(self.name, utils.time_string(utime.time())), constants.LOG_LEVEL)
-            except:
-                utils.log_file("{} => unable to synchronize rtc".format(self.name, utils.time_string(utime.time())), constants.LOG_LEVEL)
+                utc = utime.mktime((int("20"+utc_date[4:6]), int(utc_date[2:4]), int(utc_date[0:2]), int(utc_time[0:2]), int(utc_time[2:4]), int(utc_time[4:6]), 0, 0))
+                if clock.sync(utc, int((utc_time[7:] + "000")[:3]) + constants.CLOCK_LATENCY, received):
+                    utils.log_file("{} => rtc successfully synchronized (UTC: {})".format(self.name, utils.time_string(utime.time())), constants.LOG_LEVEL)
+                    return
+            except ValueError:
+                pass
+            utils.log_file("{} => unable to synchronize rtc".format(self.name), constants.LOG_LEVEL)
         return
 
     def last_fix(self):
         """Stores last gps valid position and utc timestamp in
-        :attr:`tools.utils.gps`.
+        :attr:`tools.utils.gps` and passes the fix to :mod:`tools.mooring`.
         """
         if self.fixed():
             utils.log_file("{} => saving last gps fix...".format(self.name), constants.LOG_LEVEL)
@@ -137,24 +272,17 @@ class GPS(NMEA, DEVICE):
             speed = "{}".format(self.sentence[7])
             heading = "{}".format(self.sentence[8])
             utils.gps = (utc, lat, lon, speed, heading)
-            utils.log_file("{} => last fix (UTC: {} POSITION: {} {}, SPEED: {}, HEADING: {})".format(self.name, utc, lat, lon, speed, heading), constants.LOG_LEVEL)  # DEBUG
+            utils.log_file("{} => last fix (UTC: {} POSITION: {} {}, SPEED: {}, HEADING: {})".format(self.name, utc, lat, lon, speed, heading), constants.LOG_LEVEL, level=utils.DEBUG)  # DEBUG
+            if not mooring.configured:
+                mooring.init(self.config["Gps"])
+            try:
+                epoch = utime.mktime((int("20"+utc_date[4:6]), int(utc_date[2:4]), int(utc_date[0:2]), int(utc_time[0:2]), int(utc_time[2:4]), int(utc_time[4:6]), 0, 0))
+                mooring.fix(mooring.parse(self.sentence[3], self.sentence[4]), mooring.parse(self.sentence[5], self.sentence[6]), epoch)
+            except ValueError:
+                utils.log_file("{} => invalid position".format(self.name), constants.LOG_LEVEL)
         return
 
     def displacement(self):
-        # approximate radius of earth in km
-        R = 6373.0
-        lat1 = radians(utils.gps())
-        lon1 = radians(21.0122287)
-        lat2 = radians(52.406374)
-        lon2 = radians(16.9251681)
-
-        dlon = lon2 - lon1
-        dlat = lat2 - lat1
-
-        a = sin(dlat / 2)**2 + cos(lat1) * cos(lat2) * sin(dlon / 2)**2
-        c = 2 * atan2(sqrt(a), sqrt(1 - a))
-
-        distance = R * c
-
-        print("Result:", distance)
-        print("Should be:", 278.546, "km")
+        """Returns the last fix distance (m) from the anchor, -1 if no fixes,
+        see :mod:`tools.mooring`."""
+        return mooring.distance()
@@ -22,16 +22,23 @@
 
 """Module docstring."""
 
+import array
 import utime
 from device import DEVICE
 from tools.nmea import NMEA
 import tools.utils as utils
+import tools.governor as governor
+import tools.profiler as profiler
 import constants
 from math import sin, cos, radians, atan2, degrees, pow, sqrt
 
 #define PRESS_CONV_FACT(X) (X*0.075+800.00) //per barometro young modello 61201 VECCHIA !!!!
 #define PRESS_CONV_FACT(X) (X*0.125+600.00)   //per barometro young modello 61202V NUOVA !!!!
 
+"""STRING sample fields: wind speed, wind direction, temperature, pressure,
+humidity, solar radiance, heading."""
+FIELDS = 7
+
 class Y32500(DEVICE, NMEA):
     """Creates a young_32500 meteo object."""
 
@@ -40,223 +47,219 @@ class Y32500(DEVICE, NMEA):
         DEVICE.__init__(self, instance)
         NMEA.__init__(self, instance)
         data_tasks = ["log"]
-        if "tasks" in kwargs:
-            if any(elem in data_tasks for elem in kwargs["tasks"]):
+        if tasks:
+            if any(elem in data_tasks for elem in tasks):
                 if self.main():
-                    for task in kwargs["tasks"]:
+                    for task in tasks:
                         eval("self." + task + "()", {"self":self})
             else:
-                for task in kwargs["tasks"]:
+                for task in tasks:
                     eval("self." + task + "()", {"self":self})
 
+    @profiler.profiled("Y32500.start_up")
     def start_up(self):
         """Performs device specific initialization sequence."""
         if self.init_power():
             return True
         return False
 
-    def _wd_vect_avg(self, strings):
-        """Calculates wind vector average direction.
+    def _init_samples(self):
+        """Preallocates the samples window, FIELDS integers per sample."""
+        self.samples = array.array("l", [0] * FIELDS * self.config["Samples"])
+        self.count = 0  # Acquired samples.
+        self.fields = FIELDS  # Fields of the shortest acquired sample.
+
+    def _add_sample(self, line):
+        """Stores a STRING sample into the samples window.
+
+        Params:
+            line(bytes)
+        Returns:
+            True or False if the window is full or the sample invalid
+        """
+        if self.count * FIELDS == len(self.samples):
+            return False
+        words = line.decode("utf-8").split(self.config["Data_Separator"])
+        i = self.count * FIELDS
+        try:
+            for j in range(min(len(words), FIELDS)):
+                self.samples[i + j] = int(words[j])
+        except ValueError:
+            return False
+        self.fields = min(self.fields, len(words))
+        self.count += 1
+        return True
+
+    def _values(self, field):
+        """Yields a field of the acquired samples, nothing if any sample misses it.
 
         Params:
-            strings(list)
+            field(int)
+        """
+        if field < self.fields:
+            for i in range(field, self.count * FIELDS, FIELDS):
+                yield self.samples[i]
+
+    def _ws_factor(self):
+        """Returns the wind speed conversion factor."""
+        return float(self.config["Meteo"]["Windspeed_" + self.config["Meteo"]["Windspeed_Unit"]])
+
+    def _avg(self, field, factor=1, offset=0):
+        """Calculates a field average.
+
+        Params:
+            field(int)
+            factor(float)
+            offset(float)
+        Returns:
+            avg(float)
+        """
+        avg = 0
+        try:
+            avg = sum(self._values(field)) / self.count * factor + offset
+        except:
+            pass
+        return avg
+
+    def _wd_vect_avg(self):
+        """Calculates wind vector average direction.
+
         Returns:
             avg(float)
         """
         avg = 0
-        sample_list = []
         try:
-            for sample in strings:
-                sample_list.append([int(sample[0])* float(self.config["Meteo"]["Windspeed_"+self.config["Meteo"]["Windspeed_Unit"]]), int(sample[1])/10])
+            factor = self._ws_factor()
             x = 0
             y = 0
-            for sample in sample_list:
-                direction = sample[1]
-                speed = sample[0]
-                x = x + (math.sin(math.radians(direction)) * speed)
-                y = y + (math.cos(math.radians(direction)) * speed)
-            avg = math.degrees(math.atan2(x, y))
+            for speed, direction in zip(self._values(0), self._values(1)):
+                x = x + (sin(radians(direction / 10)) * speed * factor)
+                y = y + (cos(radians(direction / 10)) * speed * factor)
+            avg = degrees(atan2(x, y))
             if avg < 0:
                 avg += 360
         except:
             pass
         return avg
 
-    def _ws_vect_avg(self, strings):
+    def _ws_vect_avg(self):
         """Calculates wind vector average speed.
 
-        Params:
-            strings(list)
         Returns:
             avg(float)
         """
         avg = 0
-        sample_list = []
         try:
-            for sample in strings:
-                sample_list.append([int(sample[0])* float(self.config["Meteo"]["Windspeed_"+self.config["Meteo"]["Windspeed_Unit"]]), int(sample[1])/10])
+            factor = self._ws_factor()
             x = 0
             y = 0
-            for sample in sample_list:
-                direction = sample[1]
-                speed = sample[0]
-                x = x + (math.sin(math.radians(direction)) * math.pow(speed,2))
-                y = y + (math.cos(math.radians(direction)) * math.pow(speed,2))
-            avg = math.sqrt(x+y) / len(sample_list)
+            for speed, direction in zip(self._values(0), self._values(1)):
+                x = x + (sin(radians(direction / 10)) * pow(speed * factor, 2))
+                y = y + (cos(radians(direction / 10)) * pow(speed * factor, 2))
+            avg = sqrt(x+y) / self.count
         except:
             pass
         return avg
 
-    def _ws_avg(self, strings):
+    def _ws_avg(self):
         """Calculates average wind speed.
 
-        Params:
-            strings(list)
         Returns:
             avg(float)
         """
-        avg = 0
-        sample_list = []
         try:
-            for sample in strings:
-                sample_list.append(int(sample[0]) * float(self.config["Meteo"]["Windspeed_"+self.config["Meteo"]["Windspeed_Unit"]]))
-            avg = sum(sample_list) / len(sample_list)
+            return self._avg(0, self._ws_factor())
         except:
-            pass
-        return avg
-
-    def _ws_max(self, strings):
+            return 0
+
+    def _gust(self):
+        """Returns the index of the sample with the max wind speed, None if no samples."""
+        gust = None
+        i = 0
+        for speed in self._values(0):
+            if gust is None or speed > self.samples[gust * FIELDS]:
+                gust = i
+            i += 1
+        return gust
+
+    def _ws_max(self):
         """Calculates max wind speed (gust).
 
-        Params:
-            strings(list)
         Returns:
             max(float)
         """
-        max = 0
-        sample_list = []
+        gust = self._gust()
+        if gust is None:
+            return 0
         try:
-            for sample in strings:
-                sample_list.append(int(sample[0]) * float(self.config["Meteo"]["Windspeed_"+self.config["Meteo"]["Windspeed_Unit"]]))
-            max = max(sample_list)
+            return self.samples[gust * FIELDS] * self._ws_factor()
         except:
-            pass
-        return max
+            return 0
 
-    def _wd_max(self, strings):
+    def _wd_max(self):
         """Calculates gust direction.
 
-        Params:
-            strings(list)
         Returns:
             max(float)
         """
-        max = 0
-        try:
-            for sample in strings:
-                if sample[0] == self._ws_max(strings):
-                    max = sample[1] / 10
-        except:
-            pass
-        return max
+        gust = self._gust()
+        if gust is None or self.fields < 2:
+            return 0
+        return self.samples[gust * FIELDS + 1] / 10
 
-    def _temp_avg(self, strings):
+    def _temp_avg(self):
         """Calculates average air temperature.
 
-        Params:
-            strings(list)
         Returns:
             avg(float)
         """
-        avg = 0
-        sample_list = []
-        try:
-            for sample in strings:
-                sample_list.append(int(sample[2]) * float(self.config["Meteo"]["Temp_Conv_0"]) - float(self.config["Meteo"]["Temp_Conv_1"]))
-            avg = sum(sample_list) / len(sample_list)
-        except:
-            pass
-        return avg
+        return self._avg(2, float(self.config["Meteo"]["Temp_Conv_0"]), - float(self.config["Meteo"]["Temp_Conv_1"]))
 
-    def _press_avg(self, strings):
+    def _press_avg(self):
         """Calculates average barometric pressure.
 
-        Params:
-            strings(list)
         Returns:
             avg(float)
         """
-        avg = 0
-        sample_list = []
-        try:
-            for sample in strings:
-                sample_list.append(int(sample[3]) * float(self.config["Meteo"]["Press_Conv_0"]) + float(self.config["Meteo"]["Press_Conv_1"]))
-            avg = sum(sample_list) / len(sample_list)
-        except:
-            pass
-        return avg
+        return self._avg(3, float(self.config["Meteo"]["Press_Conv_0"]), float(self.config["Meteo"]["Press_Conv_1"]))
 
-    def _hum_avg(self, strings):
+    def _hum_avg(self):
         """Calculates average relative humidity.
 
-        Params:
-            strings(list)
         Returns:
             avg(float)
         """
-        avg = 0
-        sample_list = []
-        try:
-            for sample in strings:
-                sample_list.append(int(sample[4]) * float(self.config["Meteo"]["Hum_Conv_0"]))
-            avg = sum(sample_list) / len(sample_list)
-        except:
-            pass
-        return avg
+        return self._avg(4, float(self.config["Meteo"]["Hum_Conv_0"]))
 
-    def _compass_avg(self, strings):
+    def _compass_avg(self):
         """Calculates average heading.
 
-        Params:
-            strings(list)
         Returns:
             avg(float)
         """
         avg = 0
-        sample_list = []
         try:
-            for sample in strings:
-                sample_list.append(int(sample[6]) / 10)
             x = 0
             y = 0
-            for sample in sample_list:
-                x = x + math.sin(math.radians(sample))
-                y = y + math.cos(math.radians(sample))
-            avg = math.degrees(math.atan2(x, y))
+            for heading in self._values(6):
+                x = x + sin(radians(heading / 10))
+                y = y + cos(radians(heading / 10))
+            avg = degrees(atan2(x, y))
             if avg < 0:
                 avg += 360
         except:
             pass
         return avg
 
-    def _radiance_avg(self, strings):
+    def _radiance_avg(self):
         """Calculates average solar radiance.
 
-        Params:
-            strings(list)
         Returns:
             avg(float)
         """
-        avg = 0
-        sample_list = []
-        try:
-            for sample in strings:
-                sample_list.append(int(sample[5]) * float(self.config["Meteo"]["Rad_Conv_0"]))
-            avg = sum(sample_list) / len(sample_list)
-        except:
-            pass
-        return avg
+        return self._avg(5, float(self.config["Meteo"]["Rad_Conv_0"]))
 
+    @profiler.profiled("Y32500.main")
     def main(self):
         """Gets data from weather station
 
@@ -292,58 +295,88 @@ class Y32500(DEVICE, NMEA):
 
         utils.log_file("{} => acquiring data...".format(self.name), constants.LOG_LEVEL)
         self.led_on()
-        string_count = 0
         new_string = False
-        string = ""
-        strings = []
+        self._init_samples()
         self.data = []
-        start = utime.time()
-        while string_count < self.config["Samples"]:
-            if not self.status() == "READY":
-                utils.log_file("{} => timeout occourred".format(self.name), constants.LOG_LEVEL, True)  # DEBUG
+        while self.count < self.config["Samples"]:
+            if self.cancelled() or not self.status() == "READY":  # Exits past the task deadline, read_line would return at once.
+                utils.log_file("{} => timeout occourred".format(self.name), constants.LOG_LEVEL, True, level=utils.WARNING)  # DEBUG
                 return False
-            if self.uart.any():
-                char = self.uart.readchar()
-                if self.config["Data_Format"] == "STRING":
-                    if chr(char) == "\n":
-                        new_string = True
-                    elif chr(char) == "\r":
-                        if new_string:
-                            strings.append(string.split(self.config["Data_Separator"]))
-                            string = ""
-                            new_string = False
-                            string_count += 1
-                    else:
-                        if new_string:
-                            string = string + chr(char)
-                elif self.config["Data_Format"] == "NMEA":
-                    self.get_sentence(char)
-                    if self.checksum_verified:
-                        if self.sentence[0] in self.config["String_To_Acquire"]:
-                            if self.sentence[0] == "WIMWV":
-                                valid_data = False
-                                if self.sentence[5] == "A":
-                                    return True
-                                else:
-                                    utils.log_file("{} => invalid data received".format(self.name), constants.LOG_LEVEL, True)  # DEBUG
+            line = self.read_line(self.deadline(1))
+            if line is None:
+                continue
+            if self.config["Data_Format"] == "STRING":
+                if new_string:  # Skips the first line, may be truncated.
+                    self._add_sample(line)
+                new_string = True
+            elif self.config["Data_Format"] == "NMEA":
+                if self.parse(line):
+                    if self.sentence[0] in self.config["String_To_Acquire"]:
+                        if self.sentence[0] == "WIMWV":
+                            valid_data = False
+                            if self.sentence[5] == "A":
+                                return True
+                            else:
+                                utils.log_file("{} => invalid data received".format(self.name), constants.LOG_LEVEL, True, level=utils.WARNING)  # DEBUG
+        return self._set_data()
+
+    async def amain(self):
+        """Coroutine version of :func:`main`."""
+        utils.log_file("{} => acquiring data...".format(self.name), constants.LOG_LEVEL)
+        self.led_on()
+        new_string = False
+        self._init_samples()
+        self.data = []
+        while self.count < self.config["Samples"]:
+            if self.cancelled() or not self.status() == "READY":  # Exits past the task deadline, read_line would return at once.
+                utils.log_file("{} => timeout occourred".format(self.name), constants.LOG_LEVEL, True, level=utils.WARNING)  # DEBUG
+                return False
+            line = await self.aread_line(self.deadline(1))
+            if line is None:
+                continue
+            if self.config["Data_Format"] == "STRING":
+                if new_string:  # Skips the first line, may be truncated.
+                    self._add_sample(line)
+                new_string = True
+            elif self.config["Data_Format"] == "NMEA":
+                if self.parse(line):
+                    if self.sentence[0] == "WIMWV" and self.sentence[0] in self.config["String_To_Acquire"]:
+                        if self.sentence[5] == "A":
+                            return True
+                        else:
+                            utils.log_file("{} => invalid data received".format(self.name), constants.LOG_LEVEL, True, level=utils.WARNING)  # DEBUG
+        return self._set_data()
+
+    def _set_data(self):
+        """Computes the data string out of the acquired samples.
+
+        Returns:
+            True
+        """
+        with governor.phase("compute"):
+            return self._calc_data()
+
+    def _calc_data(self):
+        """Computes the samples statistics, see :func:`_set_data`."""
         epoch = utime.time()
         self.data.append(self.config["String_Label"])
         self.data.append(utils.unix_epoch(epoch))
         self.data.append(utils.datestamp(epoch))  # YYMMDD
         self.data.append(utils.timestamp(epoch))  # hhmmss
-        self.data.append("{:.1f}".format(self._wd_vect_avg(strings)))  # vectorial avg wind direction
-        self.data.append("{:.1f}".format(self._ws_avg(strings)))  # avg wind speed
-        self.data.append("{:.1f}".format(self._temp_avg(strings)))  # avg temp
-        self.data.append("{:.1f}".format(self._press_avg(strings)))  # avg pressure
-        self.data.append("{:.1f}".format(self._hum_avg(strings)))  # avg relative humidity
-        self.data.append("{:.1f}".format(self._compass_avg(strings)))  # avg heading
-        self.data.append("{:.1f}".format(self._ws_vect_avg(strings)))  # vectorial avg wind speed
-        self.data.append("{:.1f}".format(self._ws_max(strings)))  # gust speed
-        self.data.append("{:.1f}".format(self._wd_max(strings)))  # gust direction
-        self.data.append("{:0d}".format(len(strings)))  # number of strings
-        self.data.append("{:.1f}".format(self._radiance_avg(strings)))  # solar radiance (optional)
+        self.data.append("{:.1f}".format(self._wd_vect_avg()))  # vectorial avg wind direction
+        self.data.append("{:.1f}".format(self._ws_avg()))  # avg wind speed
+        self.data.append("{:.1f}".format(self._temp_avg()))  # avg temp
+        self.data.append("{:.1f}".format(self._press_avg()))  # avg pressure
+        self.data.append("{:.1f}".format(self._hum_avg()))  # avg relative humidity
+        self.data.append("{:.1f}".format(self._compass_avg()))  # avg heading
+        self.data.append("{:.1f}".format(self._ws_vect_avg()))  # vectorial avg wind speed
+        self.data.append("{:.1f}".format(self._ws_max()))  # gust speed
+        self.data.append("{:.1f}".format(self._wd_max()))  # gust direction
+        self.data.append("{:0d}".format(self.count))  # number of strings
+        self.data.append("{:.1f}".format(self._radiance_avg()))  # solar radiance (optional)
         return True
 
+    @profiler.profiled("Y32500.log")
     def log(self):
         """Writes out acquired data to file."""
         utils.log_data(",".join(map(str, self.data)))
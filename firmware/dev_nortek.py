@@ -22,8 +22,11 @@
 import utime
 from device import DEVICE
 import tools.utils as utils
+import tools.governor as governor
+import tools.profiler as profiler
 import constants
 import ubinascii
+import uos
 import math
 
 """Module text here"""
@@ -65,7 +68,7 @@ class AQUADOPP(DEVICE):
 
     hw_cfg = ("Recorder installed", "Compass installed")
 
-    def __init__(self, instance):
+    def __init__(self, instance, tasks=[]):
         """Example of docstring on the __init__ method.
 
         The __init__ method may be documented in either the class level
@@ -88,10 +91,18 @@ class AQUADOPP(DEVICE):
         self.config_file = __name__ + "." + constants.CONFIG_TYPE
         DEVICE.__init__(self, self.instance)
         self.timeout = self.config["Timeout"]
-        self.usr_cfg = ()
-        self.hw_cfg = ()
-        self.head_cfg = ()
-
+        self.usr_cfg = b""  # Raw config structures, fields are decoded on use.
+        self.hw_cfg = b""
+        self.head_cfg = b""
+        data_tasks = ["log"]
+        if tasks:
+            if any(elem in data_tasks for elem in tasks):
+                self.main()  # Logs the sample.
+            for task in tasks:
+                if task not in data_tasks:
+                    eval("self." + task + "()", {"self":self})
+
+    @profiler.profiled("AQUADOPP.start_up")
     def start_up(self):
         """Class methods are similar to regular functions.
 
@@ -109,22 +120,26 @@ class AQUADOPP(DEVICE):
         if self.init_power():
             utime.sleep_ms(500)  # DEBUG Allows instrument to start properly prior to send commands
             if self.init_uart():
-                self._set_clock()
-                self._set_usr_cfg()
-                if self._get_cfg():
+                self._sync_clock()
+                deployed = self._deployed()
+                if self._set_usr_cfg() and deployed:  # Programs the ClockDeploy read by SD.
+                    self._parse_cfg()
+                elif self._get_cfg():
                     self._parse_cfg()
                 self._start_delayed()
                 return True
         return False
 
     def _timeout(self, start, timeout=None):
-        """Checks if a ``timeout`` occourred
+        """Checks if a ``timeout`` occourred or the task is cancelled
 
         Params:
             start(int)
         Returns:
             True or False
         """
+        if self.cancelled():  # Past the task deadline.
+            return True
         if timeout is None:
             timeout = self.timeout
         if timeout > 0 and utime.time() - start >= timeout:
@@ -132,18 +147,16 @@ class AQUADOPP(DEVICE):
         return False
 
     def _get_reply(self, timeout=None):
-        """Returns replies from instrument.
+        """Returns replies from instrument, see :func:`device.DEVICE.read_reply`.
 
+        Params:
+            timeout(int): s, default "Timeout", the task deadline at most
         Returns:
             bytes or None
         """
-        start = utime.time()
-        while True:
-            if self._timeout(start, timeout):
-                return
-            if self.uart.any():
-                x = self.uart.read()
-                return x
+        if timeout is None:
+            timeout = self.timeout
+        return self.read_reply(self.deadline(timeout))
 
     def _ack(self, rx):
         """Parses acknowledge bytes sequence.
@@ -293,11 +306,11 @@ class AQUADOPP(DEVICE):
                     try:
                         with open("config/adcp.cfg", "wb") as cfg:
                             cfg.write(rx)
-                            utils.log_file("{} => retreived instrument config".format(self.__qualname__))  # DEBUG
+                            utils.log_file("{} => retreived instrument config".format(self.__qualname__), level=utils.DEBUG)  # DEBUG
                             return True
                     except:
                         break
-        utils.log_file("{} => unable to retreive instrument config".format(self.__qualname__))  # DEBUG
+        utils.log_file("{} => unable to retreive instrument config".format(self.__qualname__), level=utils.WARNING)  # DEBUG
         return False
 
     def _parse_cfg(self):
@@ -305,13 +318,13 @@ class AQUADOPP(DEVICE):
         try:
             with open("config/adcp.cfg", "rb") as cfg:
                 bytes = cfg.read()
-                self.hw_cfg = self._parse_hw_cfg(bytes[0:48])         # Hardware config (48 bytes)
-                self.head_cfg = self._parse_head_cfg(bytes[48:272])   # Head config (224 bytes)
-                self.usr_cfg = self._parse_usr_cfg(bytes[272:784])    # Deployment config (512 bytes)
-            utils.log_file("{} => parsed instrument config".format(self.__qualname__))  # DEBUG
+                self.hw_cfg = bytes[0:48]         # Hardware config (48 bytes)
+                self.head_cfg = bytes[48:272]     # Head config (224 bytes)
+                self.usr_cfg = bytes[272:784]     # Deployment config (512 bytes)
+            utils.log_file("{} => parsed instrument config".format(self.__qualname__), level=utils.DEBUG)  # DEBUG
             return True
         except:
-            utils.log_file("{} => unable to parse instrument config".format(self.__qualname__))  # DEBUG
+            utils.log_file("{} => unable to parse instrument config".format(self.__qualname__), level=utils.WARNING)  # DEBUG
             return False
 
 
@@ -320,7 +333,7 @@ class AQUADOPP(DEVICE):
         start = utime.time()
         while True:
             if self._timeout(start):
-                utils.log_file("{} => unable to retreive hardware config".format(self.__qualname__))  # DEBUG
+                utils.log_file("{} => unable to retreive hardware config".format(self.__qualname__), level=utils.WARNING)  # DEBUG
                 return False
             if self._break():
                 vebose("=> GP", constants.VERBOSE)
@@ -328,10 +341,29 @@ class AQUADOPP(DEVICE):
                 rx = self._get_reply()
                 if self._ack(rx):
                     if self.verify_checksum(rx[:-2]):
-                        self.hw_cfg = self._parse_hw_cfg(rx)
-                        utils.log_file("{} => retreived hardware config".format(self.__qualname__))  # DEBUG
+                        self.hw_cfg = rx
+                        utils.log_file("{} => retreived hardware config".format(self.__qualname__), level=utils.DEBUG)  # DEBUG
                         return True
 
+    def _cfg_word(self, cfg, offset):
+        """Decodes a word of a raw config structure.
+
+        Params:
+            cfg(bytes): hw_cfg, head_cfg or usr_cfg
+            offset(int): byte offset
+        Returns:
+            (int)
+        """
+        return int.from_bytes(cfg[offset:offset + 2], "little")
+
+    def _nbins(self):
+        """Returns the deployment config Nbins."""
+        return self._cfg_word(self.usr_cfg, 34)
+
+    def _nbeams(self):
+        """Returns the deployment config NBeams."""
+        return self._cfg_word(self.usr_cfg, 18)
+
     def _parse_hw_cfg(self, reply):
         """Parses the hardware configuration
 
@@ -378,9 +410,7 @@ class AQUADOPP(DEVICE):
                 try:
                     with open(self.config["Adcp"]["Deployment_Config"], "rb") as pdc:
                         cfg = pdc.read()
-                        rate = int.from_bytes(cfg[38:40], "little")
-                        self.config["Activation_Rate"] = rate
-                        self.config["Warmup_Duration"] = rate - self.config["Samples"]
+                        self._set_rate(cfg)
                         usr_cfg = cfg[0:48] + self._set_start() + cfg[54:510]
                         checksum = self._calc_checksum(usr_cfg)
                         tx = usr_cfg + ubinascii.unhexlify(hex(checksum)[-2:] + hex(checksum)[2:4])
@@ -389,13 +419,92 @@ class AQUADOPP(DEVICE):
                         utils.verbose("=> CC", constants.VERBOSE)
                         rx = self._get_reply()
                         if self._ack(rx):
-                            utils.log_file("{} => uploaded deployment config".format(self.__qualname__))  # DEBUG
+                            self._set_fingerprint(self._fingerprint(cfg))
+                            utils.log_file("{} => uploaded deployment config".format(self.__qualname__), level=utils.DEBUG)  # DEBUG
                             return True
                 except:
                     break
-        utils.log_file("{} => unable to upload deployment config".format(self.__qualname__))  # DEBUG
+        utils.log_file("{} => unable to upload deployment config".format(self.__qualname__), level=utils.WARNING)  # DEBUG
         return False
 
+    def _set_rate(self, cfg):
+        """Sets up the device Activation_Rate and Warmup_Duration parameters
+        according to the deployment config MeasInterval.
+
+        Params:
+            cfg(bytes)
+        """
+        rate = int.from_bytes(cfg[38:40], "little")
+        self.config["Activation_Rate"] = rate
+        self.config["Warmup_Duration"] = rate - self.config["Samples"]
+
+    def _fingerprint(self, usr_cfg):
+        """Computes the deployment config fingerprint.
+
+        Same as :func:`_calc_checksum` but skips the ClockDeploy words written
+        by :func:`_set_start`, that change at every upload.
+
+        Params:
+            usr_cfg(bytes)
+        Returns:
+            fingerprint(int)
+        """
+        sum = 0
+        for i in range(0, 48, 2):
+            sum += int.from_bytes(usr_cfg[i:i+2], "little")
+        for i in range(54, 510, 2):
+            sum += int.from_bytes(usr_cfg[i:i+2], "little")
+        return (int.from_bytes(b"\xb5\x8c", "big") + sum) % 65536
+
+    def _get_fingerprint(self):
+        """Reads the fingerprint of the last uploaded deployment config.
+
+        Returns:
+            fingerprint(int) or None
+        """
+        try:
+            with open("config/adcp.fpr", "r") as fpr:
+                return int(fpr.read())
+        except:
+            return
+
+    def _set_fingerprint(self, fingerprint):
+        """Stores the fingerprint of the uploaded deployment config.
+
+        Params:
+            fingerprint(int)
+        """
+        try:
+            with open("config/adcp.fpr", "w") as fpr:
+                fpr.write(str(fingerprint))
+        except:
+            utils.log_file("{} => unable to store deployment config fingerprint".format(self.__qualname__), level=utils.WARNING)  # DEBUG
+
+    def _deployed(self):
+        """Checks if the cached instrument config (``config/adcp.cfg``) holds
+        the current deployment config.
+
+        The fingerprint of the local deployment config is compared with the
+        one of the last uploaded config. The deployment config is uploaded at
+        every start up anyway, as the only way to program the ClockDeploy words
+        read by SD, a match skips the complete config readback only.
+
+        Returns:
+            True or False
+        """
+        try:
+            with open(self.config["Adcp"]["Deployment_Config"], "rb") as pdc:
+                cfg = pdc.read()
+            uos.stat("config/adcp.cfg")
+        except:
+            return False
+        fingerprint = self._fingerprint(cfg)
+        if fingerprint != self._get_fingerprint():
+            return False
+        self._set_rate(cfg)
+        utils.log_file("{} => deployment config unchanged".format(self.__qualname__), level=utils.DEBUG)  # DEBUG
+        return True
+
     def _set_start(self):
         """Computes the measurement starting time to be synced with scheduler."""
         now = utime.time() - self.config["Activation_Delay"]
@@ -406,7 +515,7 @@ class AQUADOPP(DEVICE):
         next += self.config["Activation_Delay"]
         start = utime.localtime(next)
         start = ubinascii.unhexlify("{:02d}{:02d}{:02d}{:02d}{:02d}{:02d}".format(start[4], start[5], start[2], start[3], int(str(start[0])[2:]), start[1]))
-        utils.log_file("{} => set start at {}".format(self.__qualname__, utils.time_string(next)))  # DEBUG
+        utils.log_file("{} => set start at {}".format(self.__qualname__, utils.time_string(next)), level=utils.DEBUG)  # DEBUG
         return start
 
     def _get_usr_cfg(self):
@@ -416,7 +525,7 @@ class AQUADOPP(DEVICE):
             start = utime.time()
             while True:
                 if self._timeout(start):
-                    utils.log_file("{} => unable to retreive deployment config".format(self.__qualname__))  # DEBUG
+                    utils.log_file("{} => unable to retreive deployment config".format(self.__qualname__), level=utils.WARNING)  # DEBUG
                     return False
                 if self._break():
                     utils.verbose("=> GC", constants.VERBOSE)
@@ -424,8 +533,8 @@ class AQUADOPP(DEVICE):
                     rx = self._get_reply()
                     if self._ack(rx):
                         if self.verify_checksum(rx[:-2]):
-                            self.usr_cfg = self._parse_usr_cfg(rx)
-                            utils.log_file("{} => retreived deployment config".format(self.__qualname__))  # DEBUG
+                            self.usr_cfg = rx
+                            utils.log_file("{} => retreived deployment config".format(self.__qualname__), level=utils.DEBUG)  # DEBUG
                             return True
 
     def _parse_usr_cfg(self, bytestring):
@@ -518,7 +627,7 @@ class AQUADOPP(DEVICE):
         start = utime.time()
         while True:
             if self._timeout(start):
-                utils.log_file("{} => unable to retreive head config".format(self.__qualname__))  # DEBUG
+                utils.log_file("{} => unable to retreive head config".format(self.__qualname__), level=utils.WARNING)  # DEBUG
                 return False
             if self._break():
                 utils.verbose("=> GH", constants.VERBOSE)
@@ -526,8 +635,8 @@ class AQUADOPP(DEVICE):
                 rx = self._get_reply()
                 if self._ack(rx):
                     if self.verify_checksum(rx[:-2]):
-                        self.head_cfg = self._parse_head_cfg(rx)
-                        utils.log_file("{} => retreived head config".format(self.__qualname__))  # DEBUG
+                        self.head_cfg = rx
+                        utils.log_file("{} => retreived head config".format(self.__qualname__), level=utils.DEBUG)  # DEBUG
                         return True
 
     def _parse_head_cfg(self, bytestring):
@@ -605,13 +714,13 @@ class AQUADOPP(DEVICE):
         start = utime.time()
         while True:
             if self._timeout(start):
-                utils.log_file("{} => unable to format recorder".format(self.__qualname__))  # DEBUG
+                utils.log_file("{} => unable to format recorder".format(self.__qualname__), level=utils.WARNING)  # DEBUG
                 return False
             if self._break():
                 utils.verbose("=> FO", constants.VERBOSE)
                 self.uart.write(b"\x46\x4F\x12\xD4\x1E\xEF")
                 if self._ack(self._get_reply()):
-                    utils.log_file("{} => recorder formatted".format(self.__qualname__))  # DEBUG
+                    utils.log_file("{} => recorder formatted".format(self.__qualname__), level=utils.DEBUG)  # DEBUG
                     return True
 
     def _acquire_data(self):
@@ -619,7 +728,7 @@ class AQUADOPP(DEVICE):
         instrument without storing data to the recorder. Instrument enters Power
         Down Mode when measurement has been made.
         """
-        utils.log_file("{} => acquiring 1 sample...".format(self.__qualname__))  # DEBUG
+        utils.log_file("{} => acquiring 1 sample...".format(self.__qualname__), level=utils.DEBUG)  # DEBUG
         start = utime.time()
         while True:
             if self._timeout(start):
@@ -641,7 +750,7 @@ class AQUADOPP(DEVICE):
         start = utime.time()
         while True:
             if self._timeout(start):
-                utils.log_file("{} => unable to start measurement".format(self.__qualname__))  # DEBUG
+                utils.log_file("{} => unable to start measurement".format(self.__qualname__), level=utils.WARNING)  # DEBUG
                 return False
             if self._break():
                 utils.verbose("=> SD", constants.VERBOSE)
@@ -650,7 +759,7 @@ class AQUADOPP(DEVICE):
                 if not self._ack(rx):
                     self._format_recorder()
                 else:
-                    utils.log_file("{} => measurement started".format(self.__qualname__))  # DEBUG
+                    utils.log_file("{} => measurement started".format(self.__qualname__), level=utils.DEBUG)  # DEBUG
                     return True
 
     def _conv_data(self, bytestring):
@@ -695,8 +804,8 @@ class AQUADOPP(DEVICE):
         """
         cells = []
         if self.usr_cfg:
-            nbins = self.usr_cfg[18]
-            nbeams = self.usr_cfg[10]
+            nbins = self._nbins()
+            nbeams = self._nbeams()
             j = 0
             for beam in range(nbeams):
                 for bin in range(nbins):
@@ -721,17 +830,17 @@ class AQUADOPP(DEVICE):
             "{}".format(sample[13]),                                        # Pressure
             "{}".format(sample[14]),                                        # Temperature
             "{}".format(self._get_flow()),                                  # Flow
-            "{}".format(self.usr_cfg[17]),                                  # CoordSystem
-            "{}".format(self.usr_cfg[4]),                                   # BlankingDistance
-            "{}".format(self.usr_cfg[20]),                                  # MeasInterval
-            "{}".format(self.usr_cfg[19]),                                  # BinLength
-            "{}".format(self.usr_cfg[18]),                                  # NBins
-            "{}".format(self.head_cfg[3][3]),                               # TiltSensorMounting
+            "{}".format(self.coord_system[self._cfg_word(self.usr_cfg, 32)]),  # CoordSystem
+            "{}".format(self._cfg_word(self.usr_cfg, 6)),                   # BlankingDistance
+            "{}".format(self._cfg_word(self.usr_cfg, 38)),                  # MeasInterval
+            "{}".format(self._cfg_word(self.usr_cfg, 36)),                  # BinLength
+            "{}".format(self._nbins()),                                     # NBins
+            "{}".format("DOWN" if self._cfg_word(self.head_cfg, 4) >> 3 & 1 else "UP"),  # TiltSensorMounting
             ]
         j = 17
-        for bin in range(self.usr_cfg[18]):
+        for bin in range(self._nbins()):
             data.append("#{}".format(bin + 1))                              # (#Cell number)
-            for beam in range(self.usr_cfg[10]):
+            for beam in range(self._nbeams()):
                 data.append("{}".format(sample[j]))                         # East, North, Up/Down
                 j += 1
         return data
@@ -744,8 +853,8 @@ class AQUADOPP(DEVICE):
     """def _rel_sample(self, sample):
         velocity = []
         direction = []
-        nbins = self.usr_cfg[18]
-        nbeams = self.usr_cfg[10]
+        nbins = self._nbins()
+        nbeams = self._nbeams()
         if sample:
             sample = sample[17:]
             i = 0
@@ -782,6 +891,44 @@ class AQUADOPP(DEVICE):
                         rx[0:2],  # Minute
                         rx[2:4])  # Seconds
 
+    def _get_clock_drift(self):
+        """Reads the instrument RTC and computes its drift from the board RTC.
+
+        Returns:
+            drift(int): seconds or None
+        """
+        start = utime.time()
+        while True:
+            if self._timeout(start):
+                return
+            if self._break():
+                utils.verbose("=> RC", constants.VERBOSE)
+                self.uart.write("RC")
+                rx = self._get_reply()
+                if self._ack(rx):
+                    rx = ubinascii.hexlify(rx).decode("utf-8")
+                    try:
+                        clock = utime.mktime((
+                            2000 + int(rx[8:10]),   # Year
+                            int(rx[10:12]),         # Month
+                            int(rx[4:6]),           # Day
+                            int(rx[6:8]),           # Hour
+                            int(rx[0:2]),           # Minute
+                            int(rx[2:4]),           # Seconds
+                            0, 0))
+                    except ValueError:
+                        return
+                    return abs(utime.time() - clock)
+
+    def _sync_clock(self):
+        """Syncs the instrument RTC only if it drifts more than Clock_Drift
+        seconds from the board RTC."""
+        drift = self._get_clock_drift()
+        if drift is not None and drift <= self.config["Adcp"]["Clock_Drift"]:
+            utils.log_file("{} => clock drift {} s, sync not needed".format(self.__qualname__, drift), level=utils.DEBUG)  # DEBUG
+            return True
+        return self._set_clock()
+
     def _set_clock(self):
         """Sets up the instrument RTC.
 
@@ -790,7 +937,7 @@ class AQUADOPP(DEVICE):
         start = utime.time()
         while True:
             if self._timeout(start):
-                utils.log_file("{} => unable to sync clock".format(self.__qualname__))  # DEBUG
+                utils.log_file("{} => unable to sync clock".format(self.__qualname__), level=utils.WARNING)  # DEBUG
                 return False
             if self._break():
                 now = utime.localtime()
@@ -799,24 +946,56 @@ class AQUADOPP(DEVICE):
                 self.uart.write(ubinascii.unhexlify(tx))
                 utils.verbose("=> SC" + str(tx), constants.VERBOSE)
                 if self._ack(self._get_reply()):
-                    utils.log_file("{} => clock synced (dev: {} board: {})".format(self.__qualname__, self._get_clock(), utils.time_string(utime.mktime(now))))  # DEBUG
+                    utils.log_file("{} => clock synced (dev: {} board: {})".format(self.__qualname__, self._get_clock(), utils.time_string(utime.mktime(now))), level=utils.DEBUG)  # DEBUG
                     return True
 
+    def _frame_length(self, bytestring):
+        """Gets the data structure length from its Size field (words).
+
+        Params:
+            bytestring(memoryview): bytes received from sync byte onwards
+        Returns:
+            length(int) or None
+        """
+        if len(bytestring) < 4:
+            return
+        return int.from_bytes(bytes(bytestring[2:4]), "little") * 2
+
+    @profiler.profiled("AQUADOPP.main")
     def main(self):
         """Captures instrument data."""
         if not self.init_uart():
             return
-        utils.log_file("{} => acquiring data...".format(self.__qualname__))  # DEBUG
+        utils.log_file("{} => acquiring data...".format(self.__qualname__), level=utils.DEBUG)  # DEBUG
         self.led_on()
+        if not self.usr_cfg:  # Created per acquisition, start_up parsed it in another object.
+            self._parse_cfg()
         data = "$ADCP"
-        start = utime.time()
-        while True:
-            if utime.time() - start > self.config["Samples"] // self.config["Sample_Rate"]:
-                utils.log_file("{} => timeout occourred".format(self.__qualname__))  # DEBUG
-                break
-            if self.uart.any():
-                data = ";".join([self.config["String_Label"]] + self._format_data(self._conv_data(self.uart.read())))
-                break
+        sample = self.read_frame(b"\xa5", self._frame_length, self.deadline(self.config["Samples"] // self.config["Sample_Rate"]))
+        if sample is None:
+            utils.log_file("{} => timeout occourred".format(self.__qualname__), level=utils.WARNING)  # DEBUG
+        else:
+            with governor.phase("compute"):
+                data = ";".join([self.config["String_Label"]] + self._format_data(self._conv_data(sample)))
+        utils.log_data(data)
+        self.led_on()
+        return
+
+    async def amain(self):
+        """Coroutine version of :func:`main`."""
+        if not self.init_uart():
+            return
+        utils.log_file("{} => acquiring data...".format(self.__qualname__), level=utils.DEBUG)  # DEBUG
+        self.led_on()
+        if not self.usr_cfg:  # Created per acquisition, start_up parsed it in another object.
+            self._parse_cfg()
+        data = "$ADCP"
+        sample = await self.aread_frame(b"\xa5", self._frame_length, self.deadline(self.config["Samples"] // self.config["Sample_Rate"]))
+        if sample is None:
+            utils.log_file("{} => timeout occourred".format(self.__qualname__), level=utils.WARNING)  # DEBUG
+        else:
+            with governor.phase("compute"):
+                data = ";".join([self.config["String_Label"]] + self._format_data(self._conv_data(sample)))
         utils.log_data(data)
         self.led_on()
         return
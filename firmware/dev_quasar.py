@@ -25,12 +25,14 @@ import uos
 import utime
 import uselect
 from device import DEVICE
-from tools.ymodem import YMODEM
 import tools.utils as utils
+import tools.imports as imports
+import tools.governor as governor
+import tools.profiler as profiler
 import constants
 import _thread
 
-class GSMQ2403(DEVICE, YMODEM):
+class GSMQ2403(DEVICE):
     """Creates a Quasar gsmq2403 modem object."""
 
     def __init__(self, instance, tasks=[]):
@@ -49,8 +51,9 @@ class GSMQ2403(DEVICE, YMODEM):
         self.call_attempt = self.config["Modem"]["Call_Attempt"]
         self.call_delay = self.config["Modem"]["Call_Delay"]
         self.call_timeout = self.config["Modem"]["Call_Timeout"]
-        YMODEM.__init__(self, self._getc, self._putc, mode="Ymodem1k")
+        self.ymodem = None
 
+    @profiler.profiled("GSMQ2403.start_up")
     def start_up(self):
         """Performs device specific initialization sequence."""
         #if self.init_power() and self._set_auto_answer():  DEBUG
@@ -66,26 +69,14 @@ class GSMQ2403(DEVICE, YMODEM):
         """
         utils.log_file("{} => starting up...".format(__name__), constants.LOG_LEVEL, False)
         for _ in range(constants.TIMEOUT):
-            rx_buff = []
             self.uart.write("AT\r")
-            t0 = utime.time()
+            deadline = self.deadline(5)  # Waits 5 sec for response.
             while True:
-                if utime.time() - t0 > 5:  # Waits 5 sec for response.
+                rx = self._get_line(deadline)
+                if rx is None or rx == "ERROR":
                     break
-                if self.uart.any():
-                    byte = self.uart.read(1)
-                    if byte == b"\n":
-                        continue
-                    elif byte == b"\r":
-                        rx = "".join(rx_buff)
-                        if rx:
-                            if rx == "ERROR":
-                                break
-                            if rx == "OK":
-                                return True
-                            rx_buff = []
-                    else:
-                        rx_buff.append(chr(ord(byte)))
+                if rx == "OK":
+                    return True
             utime.sleep(1)
         utils.log_file("{} => unavailable   ".format(__name__), constants.LOG_LEVEL, True)
         return False
@@ -102,29 +93,38 @@ class GSMQ2403(DEVICE, YMODEM):
             utils.log_file("{} => initialization sequence".format(__name__), constants.LOG_LEVEL, True)
             for at in ["AT\r","AT+CREG=0\r","AT+CBST=7,0,1\r","ATS0=2\r","ATS0?\r"]:
                 self.uart.write(at)
-                rx_buff = []
-                t = utime.time()
+                deadline = self.deadline(self.call_timeout)
                 while True:
-                    if utime.time() - t == self.call_timeout:
+                    rx = self._get_line(deadline)
+                    if rx is None:
                         print("TIMEOUT OCCURRED")
                         return False
-                    if self.uart.any():
-                        byte = self.uart.read(1)
-                        if byte == b"\n":
-                            continue
-                        elif byte == b"\r":
-                            rx = "".join(rx_buff)
-                            if rx:
-                                print(rx)
-                                if rx == "OK":
-                                    break
-                                rx_buff = []
-                        else:
-                            rx_buff.append(chr(ord(byte)))
+                    print(rx)
+                    if rx == "OK":
+                        break
                 utime.sleep(self.ats_delay)
             return True
 
 
+    def _get_line(self, deadline):
+        """Gets the next non empty modem reply.
+
+        Params:
+            deadline(int): ticks_ms
+        Returns:
+            string or None if deadline expired, noise lines are skipped
+        """
+        while True:
+            rx = self.read_until(b"\r", deadline)
+            if rx is None:
+                return
+            rx = rx.strip()
+            if rx:
+                try:
+                    return rx.decode("utf-8")
+                except UnicodeError:  # Line noise (e.g. 0xFF), not a reply.
+                    continue
+
     def _getc(self, size, timeout=1):
         """Reads bytes from serial.
 
@@ -134,11 +134,7 @@ class GSMQ2403(DEVICE, YMODEM):
         Returns:
             given data or None
         """
-        r, w, e = uselect.select([self.uart], [], [], timeout)
-        if r:
-            return self.uart.read(size)
-        else:
-            return
+        return self.read_bytes(size, self.deadline(timeout))
 
     def _putc(self, data, timeout=1):
         """Writes bytes to serial.
@@ -155,9 +151,27 @@ class GSMQ2403(DEVICE, YMODEM):
         else:
             return
 
+    def _load_ymodem(self):
+        """Imports the ymodem protocol at first transfer.
+
+        Returns:
+            ymodem(obj)
+        """
+        if self.ymodem is None:
+            self.ymodem = imports.load("tools.ymodem").YMODEM(self._getc, self._putc, mode="Ymodem1k")
+            self.ymodem.uart = self.uart
+        return self.ymodem
+
+    def _unload_ymodem(self):
+        """Frees the ymodem protocol after a transfer, sent once a day at most."""
+        self.ymodem = None
+        imports.unload("tools.ymodem")
+
     def _send(self):
         """Sends files."""
-        if self.send(self.unsent_files, constants.TMP_FILE_PFX, constants.SENT_FILE_PFX):
+        with governor.phase("transfer"):
+            sent = self._load_ymodem().send(self.unsent_files, constants.TMP_FILE_PFX, constants.SENT_FILE_PFX)
+        if sent:
             self.sent = True
             return True
         return False
@@ -178,51 +192,44 @@ class GSMQ2403(DEVICE, YMODEM):
         "#                                                #\r\n"+
         "##################################################\r\n"+
         "WAITING FOR FILES...")
-        for counter in range(attempts):
-            if self.recv():
-                break
+        with governor.phase("transfer"):
+            for counter in range(attempts):
+                if self._load_ymodem().recv():
+                    break
+        self._unload_ymodem()
         self.uart.write("...RECEIVED\r\n\r\n")
         self.received = True
         return
 
+    @profiler.profiled("GSMQ2403.call")
     def _call(self):
         """Starts a call.
 
         Returns:
             True or False
         """
-        self.uart.read()  # Flushes uart buffer
+        self.flush_uart()  # Flushes uart buffer
         for at in self.pre_ats:
             self.uart.write(at)
-            rx_buff = []
-            now = utime.time()
+            deadline = self.deadline(self.call_timeout)
             while True:
-                if utime.time() - now == self.call_timeout:
+                rx = self._get_line(deadline)
+                if rx is None:
                     print("TIMEOUT OCCURRED")
                     return False
-                if self.uart.any():
-                    byte = self.uart.read(1)
-                    if byte == b"\n":
-                        continue
-                    elif byte == b"\r":
-                        rx = "".join(rx_buff)
-                        if rx:
-                            print(rx)
-                            if rx == "ERROR":
-                                return False
-                            if rx == "NO CARRIER":
-                                return False
-                            if rx == "NO ANSWER":
-                                return False
-                            if rx == "OK":
-                                break
-                            elif "CONNECT" in rx:
-                                self.uart.read(1)  # Clears last byte \n
-                                self.connected = True
-                                return True
-                            rx_buff = []
-                    else:
-                        rx_buff.append(chr(ord(byte)))
+                print(rx)
+                if rx == "ERROR":
+                    return False
+                if rx == "NO CARRIER":
+                    return False
+                if rx == "NO ANSWER":
+                    return False
+                if rx == "OK":
+                    break
+                elif "CONNECT" in rx:
+                    self.read_bytes(1, deadline)  # Clears last byte \n
+                    self.connected = True
+                    return True
             utime.sleep(self.ats_delay)
 
     def _hangup(self):
@@ -231,34 +238,20 @@ class GSMQ2403(DEVICE, YMODEM):
         Returns:
             True or False
         """
-        self.uart.read()  # Flushes uart buffer
+        self.flush_uart()  # Flushes uart buffer
         for at in self.post_ats:
             self.uart.write(at)
-            rx_buff = []
-            now = utime.time()
-            while True:
-                if utime.time() - now == self.call_timeout:
-                    print("TIMEOUT OCCURRED WHILE HANG UP")
-                    return False
-                if self.uart.any():
-                    byte = self.uart.read(1)
-                    if byte == b"\n":
-                        continue
-                    elif byte == b"\r":
-                        rx = "".join(rx_buff)
-                        if rx:
-                            print(rx)
-                            if "ERROR" in rx:
-                                return False
-                            elif "OK" in rx:
-                                break
-                            rx_buff = []
-                            break
-                    else:
-                        rx_buff.append(chr(ord(byte)))
+            rx = self._get_line(self.deadline(self.call_timeout))
+            if rx is None:
+                print("TIMEOUT OCCURRED WHILE HANG UP")
+                return False
+            print(rx)
+            if "ERROR" in rx:
+                return False
             utime.sleep(self.ats_delay)
         return True
 
+    @profiler.profiled("GSMQ2403.data_transfer")
     def data_transfer(self):
         """Sends files over the gsm network."""
         if not self.init_uart():
@@ -291,6 +284,7 @@ class GSMQ2403(DEVICE, YMODEM):
                     error_count += 1
                     continue
                 break
+        self._unload_ymodem()
         self.led_on()
         # self.deinit_uart() DEBUG Restore before deploy???
         return
@@ -20,11 +20,78 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-"""This module contains specific Quectel GPS devices tools."""
+"""This module contains specific Quectel GPS devices tools.
 
+The L80M39 time to first fix is the main gps energy cost. The receiver keeps
+its ephemeris, time and position while its backup supply ("Backup") holds or
+while in standby ("Standby", PMTK161 instead of powering it off), so that
+starts within EPHEMERIS_AGE of the last fix are hot. The warm-up is then
+learned from the time to first fix of each wake. After a power loss the
+last fix and the rtc time are sent as aiding (PMTK740/741, "Aiding").
+
+The receiver streams GGA, GSA, GSV, RMC and VTG by default, at start up its
+output is restricted to the "Nmea_Output" sentences (PMTK314) at one fix every
+"Fix_Interval" ms (PMTK220) and checked by the receiver acks. The config is
+lost with the receiver supply, so it is sent again after each power on by the
+next task, within its deadline, unless the receiver rejected it: the parser
+then skips the unwanted sentences. The aiding is sent at power on instead, the
+receiver needs it from its acquisition start, after a boot wait of
+BOOT_TIMEOUT at most.
+"""
+
+import utime
+import tools.utils as utils
+import tools.mooring as mooring
 from dev_gps import GPS
 import constants
 
+EPHEMERIS_AGE = 7200  # s. Broadcast ephemeris validity, later starts are warm or cold.
+WARMUP_MIN = 2  # s. Shortest learned warm-up, also added to a measured time to first fix.
+FIX_WAIT = 1500  # ms. A task fixing within it found the receiver already fixed.
+SAVE_INTERVAL = 3600  # s. Last fix file update interval.
+OUTPUT_ATTEMPTS = 3  # Output config attempts at start up, one second each.
+BOOT_TIMEOUT = 1  # s. Longest wait for the receiver first output after power on.
+"""PMTK314 sentence fields, the others are left off."""
+OUTPUT_FIELDS = ("GLL", "RMC", "VTG", "GGA", "GSA", "GSV")
+FIX_FILE = constants.CONFIG_DIR + "/gps.fix"
+
+"""Last fix [lat, N/S, lon, E/W, unix time], loaded from FIX_FILE at first use."""
+state = None
+saved = 0  # Last fix file update time.
+powered = None  # Power on or standby exit time (rtc, ticks stop in stop mode), None once fixed.
+standby = False
+kept = False  # Left on through an off event to end its acquisition.
+warmup = None  # s. Learned warm-up, None uses the configured one.
+filtered = None  # Output config accepted, None if not sent yet.
+owed = False  # Output config to send again by the next task, lost with the supply.
+
+"""Time to first fix figures [wakes, fixes, misses, last s, total s, max s]."""
+stats = [0, 0, 0, 0, 0, 0]
+
+def _pmtk(body):
+    """Returns a PMTK command line.
+
+    Params:
+        body(str): between $ and *
+    Returns:
+        (str)
+    """
+    checksum = 0
+    for char in body:
+        checksum ^= ord(char)
+    return "${}*{:02X}\r\n".format(body, checksum)
+
+def _load():
+    """Reads the last fix file."""
+    global state
+    state = []
+    try:
+        with open(FIX_FILE, "r") as fix:
+            fields = fix.read().split(",")
+            state = fields[0:4] + [int(fields[4])]
+    except:
+        pass
+
 class L80M39(GPS):
     """Creates a Quectel L80M39 GPS device object.
 
@@ -41,3 +108,269 @@ class L80M39(GPS):
     def __init__(self, instance, tasks=[]):
         """Constructor method."""
         GPS.__init__(self, instance, tasks)
+        if warmup is not None and self._hot():
+            self.config["Warmup_Duration"] = min(warmup, self.config["Warmup_Duration"])
+
+    def _hot(self):
+        """Returns True if the receiver keeps a valid ephemeris."""
+        if state is None:
+            _load()
+        return bool(self.config.get("Backup") or self.config.get("Standby")) and bool(state) and utime.time() - state[4] < EPHEMERIS_AGE
+
+    def on(self):
+        """Turns on the receiver, or wakes it up from standby, and starts
+        timing its first fix."""
+        global powered, standby, kept, owed
+        if kept:  # Still acquiring.
+            kept = False
+            GPS.on(self)
+            return
+        if standby:
+            self.uart.write(b"\r\n")  # Any byte ends the standby.
+            standby = False
+            GPS.on(self)
+        else:
+            GPS.on(self)
+            owed = filtered and not self.config.get("Backup")
+            if self.config.get("Aiding") and not self._hot():
+                self._boot()
+                self._aid()
+        powered = utime.time()
+        stats[0] += 1
+
+    def off(self):
+        """Puts the receiver in standby if "Standby" is set, turns it off
+        otherwise.
+
+        A receiver still without a fix since powered on less than
+        "Warmup_Duration" ago is left on, as an acquisition cut short by each
+        off event would never end. Its status goes back to ON (warming up), so
+        that the scheduler doesn't switch on a powered receiver, and a running
+        task ends logging the off event, the receiver acquiring for the next.
+        """
+        global powered, standby, kept
+        if powered is not None and utils.status_table.get(self.name) == 2 and utime.time() - powered < self.config["Warmup_Duration"]:
+            kept = True
+            utils.status_table[self.name] = 1
+            utils.log_file("{} => ON (acquiring)".format(self.name), constants.LOG_LEVEL)
+            return
+        kept = False
+        powered = None
+        if self.config.get("Standby") and hasattr(self, "uart"):  # Keeps the output config too.
+            self.uart.write(_pmtk("PMTK161,0"))
+            standby = True
+            utils.status_table[self.name] = 0
+            utils.log_file("{} => STANDBY".format(self.name), constants.LOG_LEVEL)
+            return
+        standby = False
+        GPS.off(self)
+
+    def start_up(self):
+        """Sets the receiver output, see :func:`set_output`, then its power
+        status.
+
+        Returns:
+            True
+        """
+        if hasattr(self, "gpio"):
+            self.gpio.on()
+        self._boot()
+        self.set_output()
+        return GPS.start_up(self)
+
+    def _boot(self):
+        """Waits for the receiver first output line (PMTK010 once booted, or
+        a sentence if it was on), the commands sent before it are lost."""
+        if hasattr(self, "uart"):
+            self.read_line(self.deadline(BOOT_TIMEOUT))
+
+    def set_output(self):
+        """Restricts the receiver output to "Nmea_Output" at "Fix_Interval",
+        the receiver must be powered.
+
+        Returns:
+            True if the receiver acknowledged both commands
+        """
+        global filtered
+        if not hasattr(self, "uart") or "Nmea_Output" not in self.config["Gps"]:
+            return False
+        filtered = False
+        for command in self._output():
+            for attempt in range(OUTPUT_ATTEMPTS):  # The receiver may still be booting.
+                result = self._ack(command.split(",")[0][5:], self.deadline(1))
+                if result is not None or attempt == OUTPUT_ATTEMPTS - 1:
+                    break
+                self.uart.write(command)
+            if not self._accepted(command, result):
+                return False
+        return self._accepted()
+
+    async def aset_output(self):
+        """Coroutine version of :func:`set_output`."""
+        global filtered
+        if not hasattr(self, "uart") or "Nmea_Output" not in self.config["Gps"]:
+            return False
+        filtered = False
+        for command in self._output():
+            for attempt in range(OUTPUT_ATTEMPTS):
+                result = await self._aack(command.split(",")[0][5:], self.deadline(1))
+                if result is not None or attempt == OUTPUT_ATTEMPTS - 1:
+                    break
+                self.uart.write(command)
+            if not self._accepted(command, result):
+                return False
+        return self._accepted()
+
+    def _accepted(self, command=None, result=3):
+        """Logs a rejected command, or the output config once all accepted.
+
+        Params:
+            command(str): None once every command is accepted
+            result(int): command ack flag
+        Returns:
+            True if accepted
+        """
+        global filtered
+        if result != 3:
+            utils.log_file("{} => output config rejected ({}), parsing the full stream".format(self.name, command.strip()), constants.LOG_LEVEL)
+            return False
+        if command is None:
+            filtered = True
+            utils.log_file("{} => output set to {}".format(self.name, ",".join(self.config["Gps"]["Nmea_Output"])), constants.LOG_LEVEL)
+        return True
+
+    def _output(self):
+        """Sends the output config.
+
+        Returns:
+            [command,...]
+        """
+        commands = [
+            _pmtk("PMTK314," + ",".join("1" if field in self.config["Gps"]["Nmea_Output"] else "0" for field in OUTPUT_FIELDS) + ",0" * 13),
+            _pmtk("PMTK220,{}".format(int(self.config["Gps"].get("Fix_Interval", 1000))))]
+        for command in commands:
+            self.uart.write(command)
+        return commands
+
+    def _ack(self, command, deadline):
+        """Waits for the receiver ack of a command.
+
+        Params:
+            command(str): command number
+            deadline(int): ticks_ms
+        Returns:
+            flag(int): 3 accepted, 0 invalid, 1 unsupported, 2 failed, None if
+            no ack by deadline
+        """
+        head = ("$PMTK001," + command + ",").encode()
+        while True:
+            line = self.read_line(deadline)
+            if line is None:
+                return None
+            if line.startswith(head):
+                return self._flag(line, head)
+
+    async def _aack(self, command, deadline):
+        """Coroutine version of :func:`_ack`."""
+        head = ("$PMTK001," + command + ",").encode()
+        while True:
+            line = await self.aread_line(deadline)
+            if line is None:
+                return None
+            if line.startswith(head):
+                return self._flag(line, head)
+
+    def _flag(self, line, head):
+        """Returns the ack flag of a PMTK001 line, 0 if unreadable."""
+        try:
+            return int(line[len(head):len(head) + 1])
+        except ValueError:
+            return 0
+
+    def _aid(self):
+        """Sends the rtc time and the last fix position to the receiver."""
+        if not hasattr(self, "uart"):
+            return
+        now = utime.localtime()
+        if now[0] < 2020:  # Rtc not synchronized yet.
+            return
+        self.uart.write(_pmtk("PMTK740,{:04d},{:02d},{:02d},{:02d},{:02d},{:02d}".format(*now[0:6])))
+        if state:
+            lat = mooring.parse(state[0], state[1])
+            lon = mooring.parse(state[2], state[3])
+            self.uart.write(_pmtk("PMTK741,{:.6f},{:.6f},0,{:04d},{:02d},{:02d},{:02d},{:02d},{:02d}".format((lat[0] + lat[1]) / 60, (lon[0] + lon[1]) / 60, *now[0:6])))
+        utils.log_file("{} => aiding sent".format(self.name), constants.LOG_LEVEL, True, level=utils.DEBUG)  # DEBUG
+
+    def main(self, sentence="RMC"):
+        """Extends :func:`dev_gps.GPS.main` with the owed output config and
+        the time to first fix."""
+        global owed
+        if owed:
+            owed = False
+            if hasattr(self, "uart"):
+                self.flush_uart()  # Full stream since the warm-up, the receiver booted.
+            self.set_output()
+        start = utime.ticks_ms()
+        return self._first_fix(GPS.main(self, sentence), start)
+
+    async def amain(self, sentence="RMC"):
+        """Coroutine version of :func:`main`."""
+        global owed
+        if self.config["I2C_Address"]:
+            return self.main(sentence)
+        if owed:
+            owed = False
+            if hasattr(self, "uart"):
+                self.flush_uart()
+            await self.aset_output()
+        start = utime.ticks_ms()
+        return self._first_fix(await GPS.amain(self, sentence), start)
+
+    def _first_fix(self, fixed, start):
+        """Times the first fix of the wake, learns the warm-up and stores the
+        fix.
+
+        The warm-up shrinks by a quarter while fixes are found at the task
+        start, a fix the task waited for sets it to the time to first fix, a
+        miss restores the configured one.
+
+        Params:
+            fixed(bool): :func:`main` result
+            start(int): task start ticks_ms
+        Returns:
+            fixed(bool)
+        """
+        global powered, warmup
+        if powered is not None:
+            if fixed:
+                ttff = max(utime.time() - powered, 0)
+                stats[1] += 1
+                stats[3] = ttff
+                stats[4] += ttff
+                stats[5] = max(stats[5], ttff)
+                if utime.ticks_diff(utime.ticks_ms(), start) < FIX_WAIT:
+                    warmup = max(WARMUP_MIN, (self.config["Warmup_Duration"] if warmup is None else warmup) * 3 // 4)
+                else:
+                    warmup = ttff + WARMUP_MIN
+                powered = None
+                utils.log_file("{} => first fix in {} s, warm-up {} s".format(self.name, ttff, warmup), constants.LOG_LEVEL, True, level=utils.DEBUG)  # DEBUG
+            else:
+                stats[2] += 1
+                warmup = None
+        if fixed:
+            self._save()
+        return fixed
+
+    def _save(self):
+        """Keeps the last fix, writes it to FIX_FILE every SAVE_INTERVAL."""
+        global state, saved
+        now = utime.time()
+        state = [self.sentence[3], self.sentence[4], self.sentence[5], self.sentence[6], now]
+        if now - saved < SAVE_INTERVAL:
+            return
+        saved = now
+        try:
+            with open(FIX_FILE, "w") as fix:
+                fix.write(",".join(map(str, state)))
+        except:
+            utils.log_file("{} => unable to store last fix".format(self.name), constants.LOG_LEVEL, level=utils.WARNING)  # DEBUG
@@ -24,7 +24,11 @@
 
 import pyb
 import utime
+import uselect
 import tools.utils as utils
+import tools.governor as governor
+import tools.supervisor as supervisor
+import tools.energy as energy
 import constants
 
 class DEVICE(object):
@@ -47,34 +51,331 @@ class DEVICE(object):
         """Gets the device configuration."""
         try:
             self.config = utils.read_config(self.__module__ + "." + constants.CONFIG_TYPE)[self.__qualname__][self.instance]
+            if "Samples" in self.config:  # Fewer in the low energy tiers.
+                self.config["Samples"] = energy.samples(self.__qualname__ + "_" + self.instance, self.config["Samples"])
             return self.config
         except:
-            utils.log_file("{} => unable to load configuration.".format(self.name), constants.LOG_LEVEL)  # DEBUG
+            utils.log_file("{} => unable to load configuration.".format(self.name), constants.LOG_LEVEL, level=utils.WARNING)  # DEBUG
             return False
 
     def init_uart(self):
-        """Initializes the uart bus."""
+        """Initializes the uart bus and its receive buffer."""
         if "Uart" in self.config:
             try:
                 self.uart = pyb.UART(int(constants.UARTS[constants.DEVICES[self.__qualname__ + "_" + self.instance]]), int(self.config["Uart"]["Baudrate"]))
-                self.uart.init(int(self.config["Uart"]["Baudrate"]),
-                    bits=int(self.config["Uart"]["Bits"]),
-                    parity=eval(self.config["Uart"]["Parity"]),
-                    stop=int(self.config["Uart"]["Stop"]),
-                    timeout=int(self.config["Uart"]["Timeout"]),
-                    flow=int(self.config["Uart"]["Flow_Control"]),
-                    timeout_char=int(self.config["Uart"]["Timeout_Char"]),
-                    read_buf_len=int(self.config["Uart"]["Read_Buf_Len"]))
+                kwargs = {
+                    "bits":int(self.config["Uart"]["Bits"]),
+                    "parity":eval(self.config["Uart"]["Parity"]),
+                    "stop":int(self.config["Uart"]["Stop"]),
+                    "timeout":int(self.config["Uart"]["Timeout"]),
+                    "flow":int(self.config["Uart"]["Flow_Control"]),
+                    "timeout_char":int(self.config["Uart"]["Timeout_Char"]),
+                    "read_buf_len":int(self.config["Uart"]["Read_Buf_Len"])}
+                self.uart.init(int(self.config["Uart"]["Baudrate"]), **kwargs)
+                governor.register(self.uart, int(self.config["Uart"]["Baudrate"]), **kwargs)  # Reinitialized at cpu frequency switch.
+                self.init_buffer(int(self.config["Uart"]["Read_Buf_Len"]))
+                return True
             except (ValueError) as err:
-                utils.log_file("{} => {}.".format(self.name, err), constants.LOG_LEVEL)
+                utils.log_file("{} => {}.".format(self.name, err), constants.LOG_LEVEL, level=utils.ERROR)
+        return False
 
     def deinit_uart(self):
         """Deinitializes the uart bus."""
+        governor.unregister(self.uart)
         self.uart.deinit()
 
     def flush_uart(self):
         """Flushes the uart read buffer."""
         self.uart.read()
+        self.rx_head = self.rx_tail = self.rx_scan = 0
+
+    def init_buffer(self, size):
+        """Preallocates the uart receive buffer.
+
+        The buffer is allocated once per object, bytes are bulk read into it by
+        :func:`_fill` (or :func:`_afill`) and consumed by :func:`read_line`,
+        :func:`read_until`, :func:`read_frame`, :func:`read_bytes` and
+        :func:`read_reply` (or by their coroutine counterparts).
+
+        Params:
+            size(int): buffer length in bytes
+        """
+        if not hasattr(self, "rx_buf") or len(self.rx_buf) != size:
+            self.rx_buf = bytearray(size)
+            self.rx_mv = memoryview(self.rx_buf)
+        self.rx_head = 0  # First unread byte.
+        self.rx_tail = 0  # First free byte.
+        self.rx_scan = 0  # First byte not yet searched for a delimiter.
+        self.rx_poll = uselect.poll()
+        self.rx_poll.register(self.uart, uselect.POLLIN)
+
+    def deadline(self, timeout):
+        """Returns the ticks_ms deadline to pass to the read methods, the
+        running task deadline at most.
+
+        Params:
+            timeout(int): seconds from now
+        Returns:
+            deadline(int)
+        """
+        deadline = utime.ticks_add(utime.ticks_ms(), int(timeout * 1000))
+        token = supervisor.token(self.name)
+        if token and utime.ticks_diff(token.deadline, deadline) < 0:
+            return token.deadline
+        return deadline
+
+    def cancelled(self):
+        """Returns True if the running task must return, see
+        :mod:`tools.supervisor`."""
+        return supervisor.cancelled(self.name)
+
+    def _compact(self):
+        """Makes room at the receive buffer tail.
+
+        Unread bytes are moved to the buffer start when the tail is reached, a
+        buffer full of unread bytes is discarded.
+        """
+        if self.rx_head == self.rx_tail:
+            self.rx_head = self.rx_tail = self.rx_scan = 0
+        elif self.rx_tail == len(self.rx_buf):
+            if self.rx_head == 0:
+                utils.log_file("{} => receive buffer overrun".format(self.name), constants.LOG_LEVEL, level=utils.WARNING)  # DEBUG
+                self.rx_tail = self.rx_scan = 0
+            else:
+                self.rx_buf[0:self.rx_tail - self.rx_head] = self.rx_buf[self.rx_head:self.rx_tail]
+                self.rx_tail -= self.rx_head
+                self.rx_scan -= self.rx_head
+                self.rx_head = 0
+
+    def _fill(self, deadline):
+        """Waits for incoming bytes and bulk reads them into the receive buffer.
+
+        Sleeps in poll until bytes are available or ``deadline`` expires.
+
+        Params:
+            deadline(int): ticks_ms
+        Returns:
+            count(int): number of bytes read, 0 if deadline expired
+        """
+        self._compact()
+        while True:
+            count = self.uart.any()
+            if count:
+                count = self.uart.readinto(self.rx_mv[self.rx_tail:min(len(self.rx_buf), self.rx_tail + count)])
+                if count:
+                    self.rx_tail += count
+                    return count
+            remain = utime.ticks_diff(deadline, utime.ticks_ms())
+            if remain <= 0:
+                return 0
+            self.rx_poll.poll(remain)
+
+    async def _afill(self, deadline):
+        """Coroutine version of :func:`_fill`, awaits incoming bytes on a
+        uasyncio stream.
+
+        Params:
+            deadline(int): ticks_ms
+        Returns:
+            count(int): number of bytes read, 0 if deadline expired
+        """
+        import uasyncio
+        self._compact()
+        remain = utime.ticks_diff(deadline, utime.ticks_ms())
+        if remain <= 0:
+            return 0
+        if not hasattr(self, "rx_stream"):
+            self.rx_stream = uasyncio.StreamReader(self.uart)
+        try:
+            data = await uasyncio.wait_for_ms(self.rx_stream.read(len(self.rx_buf) - self.rx_tail), remain)
+        except uasyncio.TimeoutError:
+            return 0
+        count = len(data)
+        self.rx_buf[self.rx_tail:self.rx_tail + count] = data
+        self.rx_tail += count
+        return count
+
+    def _get_until(self, delim):
+        """Gets buffered bytes up to and including ``delim``.
+
+        Params:
+            delim(bytes)
+        Returns:
+            bytes or None if not yet received
+        """
+        i = self.rx_buf.find(delim, self.rx_scan, self.rx_tail)  # Searches in place.
+        if i < 0:
+            self.rx_scan = max(self.rx_head, self.rx_tail - len(delim) + 1)  # Scans new bytes only.
+            return
+        i += len(delim)
+        data = bytes(self.rx_mv[self.rx_head:i])
+        self.rx_head = self.rx_scan = i
+        return data
+
+    def _get_frame(self, sync, length_fn):
+        """Gets a buffered binary frame starting with ``sync``.
+
+        Bytes preceding the sync sequence are discarded.
+
+        Params:
+            sync(bytes)
+            length_fn(function): gets the bytes received from sync onwards,
+                returns the whole frame length or None if they are not enough to
+                compute it
+        Returns:
+            bytes or None if not yet received
+        """
+        while True:
+            i = self.rx_buf.find(sync, self.rx_head, self.rx_tail)
+            if i < 0:
+                self.rx_head = self.rx_scan = max(self.rx_head, self.rx_tail - len(sync) + 1)
+                return
+            self.rx_head = self.rx_scan = i
+            length = length_fn(self.rx_mv[self.rx_head:self.rx_tail])
+            if length and length > len(self.rx_buf):
+                self.rx_head = self.rx_scan = self.rx_head + len(sync)  # Unreliable length, resyncs.
+                continue
+            if length and self.rx_tail - self.rx_head >= length:
+                frame = bytes(self.rx_mv[self.rx_head:self.rx_head + length])
+                self.rx_head = self.rx_scan = self.rx_head + length
+                return frame
+            return
+
+    def _get_bytes(self, size):
+        """Gets up to ``size`` buffered bytes.
+
+        Params:
+            size(int)
+        Returns:
+            bytes
+        """
+        count = min(size, self.rx_tail - self.rx_head)
+        data = bytes(self.rx_mv[self.rx_head:self.rx_head + count])
+        self.rx_head = self.rx_scan = self.rx_head + count
+        return data
+
+    def read_until(self, delim, deadline):
+        """Reads bytes up to and including ``delim``.
+
+        Params:
+            delim(bytes)
+            deadline(int): ticks_ms
+        Returns:
+            bytes or None if deadline expired
+        """
+        while True:
+            data = self._get_until(delim)
+            if data is not None:
+                return data
+            if not self._fill(deadline):
+                return
+
+    def read_line(self, deadline):
+        """Reads a line terminated by \\n, line terminators are stripped.
+
+        Params:
+            deadline(int): ticks_ms
+        Returns:
+            bytes or None if deadline expired
+        """
+        line = self.read_until(b"\n", deadline)
+        if line is None:
+            return
+        return line.rstrip(b"\r\n")
+
+    def read_frame(self, sync, length_fn, deadline):
+        """Reads a binary frame, see :func:`_get_frame`.
+
+        Params:
+            sync(bytes)
+            length_fn(function)
+            deadline(int): ticks_ms
+        Returns:
+            bytes or None if deadline expired
+        """
+        while True:
+            frame = self._get_frame(sync, length_fn)
+            if frame is not None:
+                return frame
+            if not self._fill(deadline):
+                return
+
+    def read_bytes(self, size, deadline):
+        """Reads ``size`` bytes, that may exceed the receive buffer length.
+
+        Params:
+            size(int)
+            deadline(int): ticks_ms
+        Returns:
+            bytes (shorter than size if deadline expired) or None
+        """
+        data = self._get_bytes(size)
+        while len(data) < size and self._fill(deadline):
+            data += self._get_bytes(size - len(data))
+        return data or None
+
+    def read_reply(self, deadline):
+        """Reads a reply burst: waits for its first bytes, then reads on until
+        the uart stays silent for "Timeout_Char" ms.
+
+        Params:
+            deadline(int): ticks_ms, for the first bytes
+        Returns:
+            bytes or None if deadline expired
+        """
+        data = self._get_bytes(len(self.rx_buf))
+        if not data:
+            if not self._fill(deadline):
+                return
+            data = self._get_bytes(len(self.rx_buf))
+        gap = int(self.config["Uart"]["Timeout_Char"])
+        while self._fill(utime.ticks_add(utime.ticks_ms(), gap)):
+            data += self._get_bytes(len(self.rx_buf))
+        return data
+
+    async def aread_until(self, delim, deadline):
+        """Coroutine version of :func:`read_until`."""
+        while True:
+            data = self._get_until(delim)
+            if data is not None:
+                return data
+            if not await self._afill(deadline):
+                return
+
+    async def aread_line(self, deadline):
+        """Coroutine version of :func:`read_line`."""
+        line = await self.aread_until(b"\n", deadline)
+        if line is None:
+            return
+        return line.rstrip(b"\r\n")
+
+    async def aread_frame(self, sync, length_fn, deadline):
+        """Coroutine version of :func:`read_frame`."""
+        while True:
+            frame = self._get_frame(sync, length_fn)
+            if frame is not None:
+                return frame
+            if not await self._afill(deadline):
+                return
+
+    async def aread_bytes(self, size, deadline):
+        """Coroutine version of :func:`read_bytes`."""
+        data = self._get_bytes(size)
+        while len(data) < size and await self._afill(deadline):
+            data += self._get_bytes(size - len(data))
+        return data or None
+
+    async def aread_reply(self, deadline):
+        """Coroutine version of :func:`read_reply`."""
+        data = self._get_bytes(len(self.rx_buf))
+        if not data:
+            if not await self._afill(deadline):
+                return
+            data = self._get_bytes(len(self.rx_buf))
+        gap = int(self.config["Uart"]["Timeout_Char"])
+        while await self._afill(utime.ticks_add(utime.ticks_ms(), gap)):
+            data += self._get_bytes(len(self.rx_buf))
+        return data
 
     def init_gpio(self):
         """Creates the device pin object."""
@@ -82,7 +383,7 @@ class DEVICE(object):
             try:
                 self.gpio = pyb.Pin(self.config["Ctrl_Pin"], pyb.Pin.OUT)
             except (ValueError) as err:
-                utils.log_file("{} => {}.".format(self.name, err), constants.LOG_LEVEL)
+                utils.log_file("{} => {}.".format(self.name, err), constants.LOG_LEVEL, level=utils.ERROR)
 
     def init_led(self):
         """Creates the device led object."""
@@ -90,7 +391,7 @@ class DEVICE(object):
             self.led = pyb.LED(constants.LEDS["RUN"])
             self.led.off()
         except ValueError as err:
-            utils.log_file("{} => {}.".format(self.name, err), constants.LOG_LEVEL)
+            utils.log_file("{} => {}.".format(self.name, err), constants.LOG_LEVEL, level=utils.ERROR)
 
     def led_on(self):
         """Power on the device led."""
@@ -107,13 +408,14 @@ class DEVICE(object):
             self.on()
         else:
             self.off()
+        return True
 
     def on(self):
         """Turns on device."""
         if hasattr(self, "gpio"):
             self.gpio.on()  # set pin to off
         utils.status_table[self.name] = 1
-        utils.log_file("{} => ON".format(self.name), constants.LOG_LEVEL)  #
+        utils.log_file("{} => ON".format(self.name), constants.LOG_LEVEL, level=utils.DEBUG)  #
         return
 
     def off(self):
@@ -121,7 +423,7 @@ class DEVICE(object):
         if hasattr(self, "gpio"):
             self.gpio.off()  # set pin to off
         utils.status_table[self.name] = 0
-        utils.log_file("{} => OFF".format(self.name), constants.LOG_LEVEL)  # DEBUG
+        utils.log_file("{} => OFF".format(self.name), constants.LOG_LEVEL, level=utils.DEBUG)  # DEBUG
         return
 
     def toggle(self):
@@ -135,7 +437,8 @@ class DEVICE(object):
 
     def status(self, status=None):
         """Returns or sets the current device status."""
-        for key, value in constants.DEVICE_STATUS.items():
-            if status and value == status.upper():
-                utils.status_table[self.__name__] = key
+        if status:
+            for key, value in constants.DEVICE_STATUS.items():
+                if value == status.upper():
+                    utils.status_table[self.name] = key
         return constants.DEVICE_STATUS[utils.status_table[self.name]]
@@ -24,13 +24,17 @@ import machine
 import pyb
 import utime
 import uselect
-from pyboard import PYBOARD
-from scheduler import SCHEDULER
-from menu import MENU
-from session import SESSION
+import tools.imports as imports
+PYBOARD = imports.load("pyboard").PYBOARD
+SCHEDULER = imports.load("scheduler").SCHEDULER
+SESSION = imports.load("session").SESSION
 import constants
 import _thread
 import tools.utils as utils
+import tools.startup as startup
+import tools.memory as memory
+import tools.supervisor as supervisor
+import tools.energy as energy
 import gc
 
 """Main file."""
@@ -42,6 +46,8 @@ print("\r")
 
 utils.log_file("Reset cause: {}".format(machine.reset_cause()), constants.LOG_LEVEL)  # DEBUG
 
+boot = utime.ticks_ms()  # Gets ticks at boot.
+
 board = PYBOARD()  # Creates a board object.
 
 session = SESSION(board=board, timeout=constants.SESSION_TIMEOUT)  # Starts up the remote session.
@@ -50,15 +56,44 @@ session = SESSION(board=board, timeout=constants.SESSION_TIMEOUT)  # Starts up t
 
 scheduler = SCHEDULER()  # Creates the scheduler object.
 
+startup.ready(boot)  # Records boot time.
+
+imports.log()  # Logs boot modules import costs.
+
+memory.register(imports.unload, ("menu",))  # Menu is reloaded at first use.
+memory.safe_point()  # Sets the gc threshold.
+
 _poll = uselect.poll()  # Creates a poll object to listen to.
 for input in board.input:
     _poll.register(input, uselect.POLLIN)
+_poll.register(utils.wakeup, uselect.POLLIN)  # Set at task end.
+_wake = uselect.poll()  # Waits of the user session branches, the inputs are read by the session threads.
+_wake.register(utils.wakeup, uselect.POLLIN)  # Set at task end, login, logout and menu exit.
 esc_cnt = 0  # Initializes the escape character counter.
+started = utime.ticks_ms()  # Ticks at the last thread start.
 
 t0 = utime.time()  # Gets timestamp at startup.
 
+def _wait_user():
+    """Blocks a user session pass until utils.wakeup is set, a session or task
+    deadline, SESSION_POLL ms at most."""
+    timeout = constants.SESSION_POLL
+    for remain in (session.remain(), supervisor.remain()):
+        if remain is not None:
+            timeout = min(timeout, remain)
+    if _wake.poll(timeout):
+        utils.wakeup.clear()
+
+if constants.ASYNCIO:  # Runs the uasyncio main loop, never returns.
+    import uasyncio
+    runtime = imports.load("runtime")
+    uasyncio.run(runtime.main(board, scheduler, session))
+
 while True:
     #_wdt.feed()  # Resets the watchdog timer.
+    session.check()  # Expires the session past its deadlines.
+    for device in supervisor.check():  # Powers off the overrun devices, a user session too.
+        scheduler.pool.abandon(device)
     if board.escaped:
         if not session.loggedin:
             pyb.repl_uart(board.uart)
@@ -75,10 +110,13 @@ while True:
             pyb.repl_uart(None)
             session.init()
             session.authenticating = False
+        else:
+            _wait_user()  # Till the login thread ends.
     elif board.prompted:  # Prompts user for interactive or file mode.
+        session.touch()  # Escaped by a logged in user.
         if board.set_mode(5):
             if board.interactive:
-                menu = MENU(board, scheduler)  # Creates the menu object.
+                menu = imports.load("menu").MENU(board, scheduler, session)  # Creates the menu object, imported at first use.
                 _thread.start_new_thread(menu.main, ())
             elif board.connected:
                 pyb.repl_uart(None)  # Disables repl to avoid byte collision
@@ -89,10 +127,21 @@ while True:
             pyb.repl_uart(None)  # Disables repl to avoid byte collision
             board.interactive = False
             session.init()
+        else:
+            _wait_user()  # Till the menu exits or the session ends.
     else:
-        poll = _poll.ipoll(0, 0)
+        if utils.processes or not scheduler.pool.idle() or board.interrupted or board.usb.isconnected():  # Can't sleep, waits for something to happen.
+            timeout = max(scheduler.next_event - utime.time(), 0) * 1000
+            remain = supervisor.remain()
+            if remain is not None:
+                timeout = min(timeout, remain)  # Checks the tasks deadlines.
+        else:
+            timeout = max(100 - utime.ticks_diff(utime.ticks_ms(), started), 0)  # Allows threads startup.
+        poll = _poll.ipoll(timeout, 0)  # Blocks until an input byte, a task end or the next event.
         for stream in poll:
-            if stream[0].read(1).decode("utf-8") == constants.ESC_CHAR:
+            if stream[0] is utils.wakeup:
+                utils.wakeup.clear()
+            elif stream[0].read(1).decode("utf-8") == constants.ESC_CHAR:
                 esc_cnt += 1
                 if  esc_cnt  == 3:
                     if stream[0] == board.usb:
@@ -103,17 +152,22 @@ while True:
                     esc_cnt = 0
                     continue
 
-        utime.sleep_ms(100)  # Adds 100ms delay to allow threads startup.
         t0 = utime.time()  # Gets timestamp before sleep.
-        if not utils.processes and not board.interrupted and not board.usb.isconnected():  # Waits for no running threads and no usb connetion before sleep.
-            if utils.files_to_send():  # Checks for data files to send.
-                _thread.start_new_thread(utils.execute, ("quasar_gsmq2403.MODEM_1", ["data_transfer"]))  # Sends data files before sleeping.
+        if not utils.processes and scheduler.pool.idle() and not board.interrupted and not board.usb.isconnected():  # Waits for no running or queued tasks and no usb connetion before sleep.
+            if constants.MODEM in utils.status_table and not energy.deferred() and utils.files_to_send():  # Checks for data files to send, unless the battery is low.
+                energy.upload()
+                _thread.start_new_thread(utils.execute, (constants.MODEM, ["data_transfer"]))  # Sends data files before sleeping.
+                started = utime.ticks_ms()
             elif scheduler.next_event > t0:
-                utils.log_file("Sleeping for {}".format(utils.time_display(scheduler.next_event - t0)), constants.LOG_LEVEL)  # DEBUG
+                memory.safe_point()  # Collects with no task running.
+                utils.log_file("Sleeping for {}".format(utils.time_display(scheduler.next_event - t0)), constants.LOG_LEVEL, level=utils.DEBUG)  # DEBUG
                 board.go_sleep(scheduler.next_event - t0)  # Puts board in sleep mode.
                 t0 = utime.time()  # Gets timestamp at wakeup.
         board.lastfeed = utime.time()
         #_wdt.feed()  # Resets the watchdog timer.
+        if t0 >= scheduler.next_event:
+            started = utime.ticks_ms()
         scheduler.scheduled(t0)  # Checks out for scheduled events in event table.
-    gc.collect()  # Frees ram.
-    utils.mem_mon()  # DEBUG
+    if not constants.GC_ADAPTIVE:
+        gc.collect()  # Frees ram.
+        utils.mem_mon()  # DEBUG
@@ -24,6 +24,12 @@ import pyb
 import utime
 import uos
 import tools.utils as utils
+import tools.profiler as profiler
+import tools.imports as imports
+import tools.memory as memory
+import tools.supervisor as supervisor
+import tools.viewer as viewer
+import tools.logger as logger
 import constants
 import _thread
 import ubinascii
@@ -31,14 +37,17 @@ import uselect
 
 class MENU(object):
 
-    def __init__(self, board, scheduler):
+    def __init__(self, board, scheduler, session=None):
         """Initializes menu object.
 
         Params:
             board(obj)
+            scheduler(obj)
+            session(obj): told of the user activity
         """
         self.board = board
         self.scheduler = scheduler
+        self.session = session
         self.device = None
         self.exit = False
 
@@ -50,6 +59,7 @@ class MENU(object):
         "[2] DATA FILES\r\n" +
         "[3] NEXT EVENTS\r\n" +
         "[4] LAST LOG\r\n" +
+        "[5] PROFILE\r\n" +
         "[BACKSPACE] BACK TO SCHEDULED MODE")
 
     def _devices_menu(self):
@@ -75,64 +85,198 @@ class MENU(object):
         "[2] TRANSPARENT MODE\r\n" +
         "[3] SAMPLING\r\n" +
         "[4] CONFIGURATION\r\n" +
+        "[5] BINARY TRANSPARENT MODE\r\n" +
         "[BACKSPACE] BACK")
 
-    def _pass_through(self, device):
-        """Forwards device uart to board uart.
+    def _read(self, stream, buf):
+        """Reads the bytes a stream holds, a buffer at most, without waiting.
+
+        Params:
+            stream(obj): usb vcp or uart
+            buf(memoryview)
+        Returns:
+            count(int)
+        """
+        if stream is self.board.usb:  # Doesn't wait, any() is a bool.
+            return stream.readinto(buf) or 0
+        count = min(stream.any(), len(buf))
+        if not count:
+            return 0
+        return stream.readinto(buf, count) or 0
+
+    def _write(self, stream, data):
+        """Writes data, the usb vcp may take a part at a time, the rest is
+        dropped if it takes none.
+
+        Params:
+            stream(obj): usb vcp or uart
+            data(memoryview)
+        """
+        while data:
+            count = stream.write(data)
+            if not count:
+                return
+            data = data[count:]
+
+    def _pass_through(self, device, raw=False):
+        """Bridges the console (usb or board uart) and the device uart.
+
+        Bytes are moved in bulk, a buffer per direction, the loop waits in
+        uselect.poll for a stream to read. Device output goes to the console
+        the user last typed on. In text mode the typed bytes are echoed and
+        sent to the device at [CR], [BACKSPACE] backs to the menu. In binary
+        mode (vendor tools) they are sent as they come, a [BACKSPACE] alone
+        after BRIDGE_GUARD ms of console silence backs to the menu.
+
         Params:
             device(obj)
+            raw(bool): binary mode
+        Returns:
+            True on [BACKSPACE], False if the interactive mode ended
         """
         device.init_uart()
-        tx = ""
-        while True:
-            if not self.board.interactive:
-                device.deinit_uart()
-                return False
-            r, w, x = uselect.select([self.board.usb, self.board.uart, device.uart], [], [], 0)
-            for _ in r:
-                if _ == self.board.usb or _ == self.board.uart:
-                    byte = ord(_.read(1))
-                    if byte == 8:  # [BACKSPACE] Backs to previous menu.
-                        device.deinit_uart()
-                        return True
-                    elif byte == 13:  # [CR] Forwards cmds to device.
-                        tx += chr(byte)
-                        device.uart.write(tx)
-                        tx = ""
+        up = memoryview(bytearray(constants.BRIDGE_BUF))  # Console to device.
+        down = memoryview(bytearray(constants.BRIDGE_BUF))  # Device to console.
+        tx = bytearray()
+        console = self.board.usb if self.board.usb.isconnected() else self.board.uart
+        poller = uselect.poll()
+        for stream in (self.board.usb, self.board.uart, device.uart):
+            poller.register(stream, uselect.POLLIN)
+        typed = utime.ticks_ms()
+        try:
+            while self.board.interactive:
+                for ready in poller.ipoll(constants.BRIDGE_POLL):
+                    stream = ready[0]
+                    if stream is device.uart:
+                        count = self._read(stream, down)
+                        if count:
+                            self._write(console, down[:count])
+                        continue
+                    count = self._read(stream, up)
+                    if not count:
+                        continue
+                    console = stream
+                    self._touch()
+                    now = utime.ticks_ms()
+                    if raw:
+                        if count == 1 and up[0] == 8 and utime.ticks_diff(now, typed) >= constants.BRIDGE_GUARD:  # [BACKSPACE] Backs to previous menu.
+                            return True
+                        self._write(device.uart, up[:count])
                     else:
-                        tx += chr(byte)
-                        print(chr(byte), end="")
-                elif _ == device.uart:
-                     print("{}".format(chr(_.readchar())), end="")
-            """r, w, x = uselect.select(self.board.input, [], [], 0)
+                        for byte in up[:count]:
+                            if byte == 8:  # [BACKSPACE] Backs to previous menu.
+                                return True
+                            tx.append(byte)
+                            if byte == 13:  # [CR] Forwards cmds to device.
+                                self._write(device.uart, memoryview(tx))
+                                tx = bytearray()
+                        self._write(console, up[:count])  # Echo.
+                    typed = now
+            return False
+        finally:
+            device.deinit_uart()
+
+    def _touch(self):
+        """Tells the session of the user activity."""
+        if self.session:
+            self.session.touch()
+
+    def _key(self):
+        """Waits for a console byte.
+
+        Returns:
+            byte(int), None if the interactive mode ended
+        """
+        while self.board.interactive:
+            r, w, x = uselect.select(self.board.input, [], [], constants.BRIDGE_POLL / 1000)
             if r:
-                byte = ord(r[0].read(1))
-                if byte == 8:  # [BACKSPACE] Backs to previous menu.
-                    device.deinit_uart()
-                    return True
-                elif byte == 13:  # [CR] Forwards cmds to device.
-                    tx += chr(byte)
-                    device.uart.write(tx)
-                    tx = ""
-                else:
-                    tx += chr(byte)
-                    print(chr(byte), end="")
-            if device.uart.any():
-                print(device.uart.read())
-                #print("{}".format(chr(device.uart.readchar())), end="")"""
+                try:
+                    byte = ord(r[0].read(1))
+                    self._touch()
+                    return byte
+                except:
+                    pass
+        return None
+
+    def _line(self):
+        """Reads a console line, echoed.
+
+        Returns:
+            line(str), None on [BACKSPACE] or if the interactive mode ended
+        """
+        line = ""
+        while True:
+            byte = self._key()
+            if byte is None or byte == 8:
+                return None
+            if byte == 13:
+                print("")
+                return line
+            print(chr(byte), end="")
+            line += chr(byte)
+
+    def _out(self, line):
+        """Writes a viewer line to the console.
+
+        Params:
+            line(memoryview)
+        """
+        self._write(self.board.usb if self.board.usb.isconnected() else self.board.uart, line)
+
+    def _view(self, path, last=False):
+        """Shows a file a page at a time, the memory use doesn't grow with
+        its size (see tools.viewer).
+
+        Params:
+            path(str)
+            last(bool): starts from the last lines
+        """
+        try:
+            pager = viewer.PAGER(path)
+            print("\r\n\r\n{}".format(path))
+            if last:
+                viewer.tail(path, constants.VIEW_LINES, self._out)
+            else:
+                pager.forward(self._out)
+            while True:
+                print("\r\n[SPACE] NEXT PAGE, [B] PREVIOUS PAGE, [T] LAST LINES, [G] FIND, [BACKSPACE] BACK")
+                byte = self._key()
+                if byte is None or byte == 8:
+                    return
+                if byte == 32:
+                    if not pager.forward(self._out):
+                        print("END OF FILE")
+                elif byte in (66, 98):
+                    if not pager.back(self._out):
+                        print("FIRST PAGE")
+                elif byte in (84, 116):
+                    viewer.tail(path, constants.VIEW_LINES, self._out)
+                elif byte in (71, 103):
+                    print("FIND + [CR]: ", end="")
+                    pattern = self._line()
+                    if pattern:
+                        print("{} LINES FOUND".format(viewer.grep(path, pattern.encode(), self._out)))
+        except OSError:
+            print("NO {}".format(path))
 
     def _get_data_files(self):
-        """Lists data directory."""
+        """Lists data directory, a file can be chosen to view."""
         print("\r\n\r\nDATA FILES")
+        files = []
         for media in constants.MEDIA:
             try:
                 print("[{}]".format(media + "/" + constants.DATA_DIR))
                 data = uos.listdir(media + "/" + constants.DATA_DIR)
                 data.sort(reverse=True)
                 for file in data:
-                    print(file)
+                    files.append(media + "/" + constants.DATA_DIR + "/" + file)
+                    print("[{}] {}".format(len(files), file))
             except:
                 pass
+        print("FILE NUMBER + [CR] TO VIEW, [BACKSPACE] BACK")
+        choice = self._line()
+        if choice and choice.isdigit() and 0 < int(choice) <= len(files):
+            self._view(files[int(choice) - 1])
 
     def _get_event_table(self):
         """Shows scheduled events."""
@@ -143,12 +287,36 @@ class MENU(object):
                 print("{} ({}) ".format(device, constants.DEVICE_STATUS[utils.status_table[device.__qualname__]]), end="")
             print("\r")
 
+    def _get_profile(self):
+        """Shows the heap, the tasks, the import costs and the profiler table."""
+        heap = memory.stats()
+        largest = "N/A (TASKS RUNNING)"
+        if not utils.processes and self.scheduler.idle():
+            largest = "{} bytes".format(memory.largest_block())
+        print("\r\n\r\nHEAP")
+        print("FREE {} bytes, ALLOCATED {} bytes, LARGEST BLOCK {}".format(heap["free"], heap["alloc"], largest))
+        print("THRESHOLD {} bytes, RATE {} bytes/cycle".format(heap["threshold"], heap["rate"]))
+        print("COLLECTIONS {}, TOTAL {} ms, MAX {} ms, CACHE RELEASES {}".format(heap["collections"], heap["total_us"] // 1000, heap["max_us"] // 1000, heap["releases"]))
+        print("\r\n\r\nTASKS")
+        print("{:<32}{:>8}{:>10}{:>10}".format("DEVICE", "RUNS", "OVERRUNS", "MAX ms"))
+        for task in supervisor.table():
+            print("{:<32}{:>8}{:>10}{:>10}".format(*task))
+        print("\r\n\r\nIMPORTS")
+        print("{:<32}{:>8}{:>12}".format("MODULE", "ms", "HEAP bytes"))
+        for module in imports.table():
+            print("{:<32}{:>8}{:>12}".format(module[0], module[1] // 1000, module[2]))
+        print("\r\n\r\nPROFILE (current time: {})".format(utils.time_string(utime.time())))
+        if not constants.PROFILER:
+            print("DISABLED")
+            return
+        print("{:<32}{:>8}{:>12}{:>10}".format("SITE", "COUNT", "TOTAL ms", "MAX ms"))
+        for site in profiler.table():
+            print("{:<32}{:>8}{:>12}{:>10}".format(site[0], site[1], site[2] // 1000, site[3] // 1000))
+
     def get_config(self, device):
         """Shows device configuration."""
         print("\r\n\r\nCONFIGURATION")
-
-        with open(constants.CONFIG_DIR + "/" + device.__qualname__ + "." + constants.CONFIG_TYPE, "r") as file:
-            print(file.read())
+        self._view(constants.CONFIG_DIR + "/" + device.__qualname__ + "." + constants.CONFIG_TYPE)
 
     def main(self):
         key_buff = [27]  # Reads last char received
@@ -164,6 +332,7 @@ class MENU(object):
                 try:
                     byte = ord(r[0].read(1))  # Reads from main UART
                     key_buff.append(byte)  # Appends char to the command buffer, needed for multiple char commands
+                    self._touch()
                 except:
                     pass
             else:  # Checks for command completion
@@ -181,12 +350,16 @@ class MENU(object):
                                 elif 50 in key_buff:
                                     if self._pass_through(self.device):
                                         self._device_menu(self.device)
+                                elif 53 in key_buff:
+                                    if self._pass_through(self.device, raw=True):
+                                        self._device_menu(self.device)
                                 elif 51 in key_buff:
                                     self.board.operational = True
                                     self.device.main()
                                     self.board.operational = False
                                 elif 52 in key_buff:
                                     self.get_config(self.device)
+                                    self._device_menu(self.device)
                                 elif 8 in key_buff:
                                     device = False
                                     devices = True
@@ -213,6 +386,7 @@ class MENU(object):
                         elif 8 in key_buff:
                             print("")
                             self.board.interactive = False
+                            utils.wakeup.set()  # Lets the main loop resume.
                             #return  DEBUG
                         elif 49 in key_buff:
                             board  = False
@@ -220,6 +394,13 @@ class MENU(object):
                             self._devices_menu()
                         elif 50 in key_buff:
                             self._get_data_files()
+                            self._board_menu()
                         elif 51 in key_buff:
                             self._get_event_table()
+                        elif 52 in key_buff:
+                            logger.flush()
+                            self._view(constants.LOG_FILE, last=True)
+                            self._board_menu()
+                        elif 53 in key_buff:
+                            self._get_profile()
                     key_buff = []
@@ -22,12 +22,23 @@
 
 import pyb
 import uos
+import array
+import math
 import utime
 import uselect
 import tools.utils as utils
+import tools.governor as governor
+import tools.profiler as profiler
+import tools.startup as startup
+import tools.energy as energy
+import tools.logger as logger
 import constants
 from device import DEVICE
 
+CHANNELS = ("Battery_Level", "Current_Level", "Ambient_Temperature")  # Acquisition order.
+buffers = {}  # {name:(battery, current, ambient),...} Sample arrays of both acquisitions, once per device.
+timed = {}  # {name:adcs,...} Timed acquisition set up, once per device.
+
 class PYBOARD(object):
     """Creates a board object."""
 
@@ -83,7 +94,7 @@ class PYBOARD(object):
             self.config = utils.read_config(self.__module__ + "." + constants.CONFIG_TYPE)[self.__qualname__]["1"]
             return self.config
         except:
-            utils.log_file("{} => unable to load configuration.".format(self.__qualname__), constants.LOG_LEVEL)  # DEBUG
+            utils.log_file("{} => unable to load configuration.".format(self.__qualname__), constants.LOG_LEVEL, level=utils.WARNING)  # DEBUG
             return False
     def init_usb(self):
         self.usb = pyb.USB_VCP()
@@ -92,25 +103,28 @@ class PYBOARD(object):
         """Initializes the uart bus."""
         try:
             self.uart = pyb.UART(int(self.config["Uart"]["Bus"]), int(self.config["Uart"]["Baudrate"]))
-            self.uart.init(int(self.config["Uart"]["Baudrate"]),
-                bits=int(self.config["Uart"]["Bits"]),
-                parity=eval(self.config["Uart"]["Parity"]),
-                stop=int(self.config["Uart"]["Stop"]),
-                timeout=int(self.config["Uart"]["Timeout"]),
-                flow=int(self.config["Uart"]["Flow_Control"]),
-                timeout_char=int(self.config["Uart"]["Timeout_Char"]),
-                read_buf_len=int(self.config["Uart"]["Read_Buf_Len"]))
+            kwargs = {
+                "bits":int(self.config["Uart"]["Bits"]),
+                "parity":eval(self.config["Uart"]["Parity"]),
+                "stop":int(self.config["Uart"]["Stop"]),
+                "timeout":int(self.config["Uart"]["Timeout"]),
+                "flow":int(self.config["Uart"]["Flow_Control"]),
+                "timeout_char":int(self.config["Uart"]["Timeout_Char"]),
+                "read_buf_len":int(self.config["Uart"]["Read_Buf_Len"])}
+            self.uart.init(int(self.config["Uart"]["Baudrate"]), **kwargs)
+            governor.register(self.uart, int(self.config["Uart"]["Baudrate"]), **kwargs)  # Reinitialized at cpu frequency switch.
             return True
         except (ValueError) as err:
-            utils.log_file("{} => {}.".format(self.name, err), constants.LOG_LEVEL)
+            utils.log_file("{} => {}.".format(self.name, err), constants.LOG_LEVEL, level=utils.ERROR)
             return False
 
     def deinit_uart(self):
         """Deinitializes the uart bus."""
         try:
+            governor.unregister(self.uart)
             self.uart.deinit()
         except:
-            utils.log_file("{} => unable to deinitialize uart {}".format(self.__qualname__, self.config["Uart"]["Bus"]), constants.LOG_LEVEL)
+            utils.log_file("{} => unable to deinitialize uart {}".format(self.__qualname__, self.config["Uart"]["Bus"]), constants.LOG_LEVEL, level=utils.ERROR)
             return False
         return True
 
@@ -123,6 +137,7 @@ class PYBOARD(object):
         self.disable_interrupts()
         self.interrupt = line
         self.interrupted = True
+        utils.wakeup.set()  # Wakes up the main loop.
 
     def init_interrupts(self):
         """Initializes all external interrupts to wakes up board from sleep mode."""
@@ -142,8 +157,9 @@ class PYBOARD(object):
             irq.disable()
 
     def init_devices(self):
-        """ Initializes all configured devices. """
+        """Initializes all configured devices, see :mod:`tools.startup`."""
         utils.log_file("Initializing devices...", constants.LOG_LEVEL)
+        devices = []
         for file in uos.listdir(constants.CONFIG_DIR):
             f_name = file.split(".")[0]
             f_ext =  file.split(".")[1]
@@ -152,10 +168,8 @@ class PYBOARD(object):
                 for key in cfg.keys():
                     for obj in cfg[key]:
                         if cfg[key][obj]["Device"]:
-                            try:
-                                utils.create_device(f_name + "." + key + "_" + obj, tasks=["start_up"])
-                            except ImportError:
-                                pass
+                            devices.append(f_name + "." + key + "_" + obj)
+        startup.run(devices)
 
 
     def set_mode(self, timeout):
@@ -174,7 +188,7 @@ class PYBOARD(object):
             if t1 > timeout:
                 break
             print("ENTER YOUR CHOICE WITHIN {} SECS".format(timeout - t1), end="\r")
-            r, w, x = uselect.select(self.input, [], [], 0)
+            r, w, x = uselect.select(self.input, [], [], 1)  # Blocks till a byte or the next countdown second.
             if r:
                 byte = r[0].read(1)
                 if byte == b"\x1b":  # ESC
@@ -195,20 +209,28 @@ class PYBOARD(object):
             now(int): current timestamp
             wakeup(int): wakeup timestamp
         """
+        profiler.sleep(utime.time())
+        logger.flush()  # The log buffer would be lost on a reset.
         self.sleep_led()
         self.enable_interrupts()
         remain = constants.WD_TIMEOUT - (utime.time() - self.lastfeed) * 1000
         interval = interval * 1000
         if interval - remain > -3000:
             interval = remain - 3000
+        interval = min(interval, constants.RTC_WAKEUP_MAX * 1000)
         self.rtc.wakeup(interval)  # Set next rtc wakeup (ms).
         pyb.stop()
+        profiler.wake()
         self.pwr_led()
 
 class ADC(DEVICE):
 
     def __init__(self, instance, tasks=list()):
         DEVICE.__init__(self, instance)
+        channels = self.config["Adc"]["Channels"]
+        self.channels = tuple(int(channels[key]["Ch"]) for key in CHANNELS)  # Looked up once, not per sample.
+        self.coeffs = tuple(channels[key]["Calibration_Coeff"] for key in CHANNELS)
+        self.bit = int(self.config["Adc"]["Bit"])
         data_tasks = ["log"]
         if tasks:
             if any(elem in data_tasks for elem in tasks):
@@ -219,6 +241,7 @@ class ADC(DEVICE):
                 for task in tasks:
                     eval("self." + task + "()", {"self":self})
 
+    @profiler.profiled("ADC.start_up")
     def start_up(self):
         """Performs device specific initialization sequence."""
         if self.init_power():
@@ -246,60 +269,128 @@ class ADC(DEVICE):
     def ad22103(self, vout, vsupply):
         return (vout * 3.3 / vsupply - 0.25) / 0.028
 
-    def battery_level(self, vout):
-        return vout * self.config["Adc"]["Channels"]["Battery_Level"]["Calibration_Coeff"]
+    def init_buffers(self):
+        """Allocates the "Samples" * "Sample_Rate" counts arrays of the
+        channels, kept in :data:`buffers` across the device objects.
+
+        Returns:
+            (battery, current, ambient)
+        """
+        samples = int(self.config["Samples"]) * int(self.config["Sample_Rate"])
+        if self.name not in buffers or len(buffers[self.name][0]) != samples:
+            buffers[self.name] = tuple(array.array("H", [0] * samples) for key in CHANNELS)
+        return buffers[self.name]
+
+    def init_timed(self):
+        """Sets up the channel adcs of the timed acquisition, once per device,
+        kept in :data:`timed` across the device objects.
+
+        Returns:
+            adcs
+        """
+        if self.name not in timed:
+            timed[self.name] = tuple(pyb.ADC(channel) for channel in self.channels)
+        return timed[self.name]
+
+    def stats(self, buffer, scale):
+        """Computes the buffer statistics.
+
+        Sums are integer, exact on 12 bit counts.
 
-    def current_level(self, vout):
-        return vout * self.config["Adc"]["Channels"]["Current_Level"]["Calibration_Coeff"]
+        Params:
+            buffer(array): counts
+            scale(float): volts per count times the calibration coefficient
+        Returns:
+            (mean, min, max, std)
+        """
+        n = len(buffer)
+        total = sum(buffer)
+        squares = 0
+        for count in buffer:
+            squares += count * count
+        return total * scale / n, min(buffer) * scale, max(buffer) * scale, math.sqrt(n * squares - total * total) * scale / n
+
+    def poll(self):
+        """Reads the channels "Samples" * "Sample_Rate" times in a row into
+        the :func:`init_buffers` arrays, at "Bit" resolution, the internal
+        ones once as :func:`sample`.
+
+        Returns:
+            (core temp, core vbat, core vref, vref), full scale counts
+        """
+        battery, current, ambient = self.init_buffers()
+        battery_ch, current_ch, ambient_ch = self.channels
+        adcall = pyb.ADCAll(self.bit, self.adcall_mask(self.channels))
+        core = (adcall.read_core_temp(), adcall.read_core_vbat(), adcall.read_core_vref(), adcall.read_vref())
+        read_channel = adcall.read_channel
+        with governor.phase("compute"):
+            for i in range(len(battery)):
+                battery[i] = read_channel(battery_ch)
+                current[i] = read_channel(current_ch)
+                ambient[i] = read_channel(ambient_ch)
+        return core, 1 << self.bit
+
+    def sample(self):
+        """Samples the channels at "Timed_Freq" Hz, paced by the "Timer" timer,
+        "Samples" * "Sample_Rate" times into the :func:`init_buffers` arrays,
+        the internal ones once.
+
+        Returns:
+            (core temp, core vbat, core vref, vref), full scale counts
+        """
+        adcs = self.init_timed()
+        adcall = pyb.ADCAll(12, 0x70000)  # MCU_TEMP, VREF, VBAT
+        core = (adcall.read_core_temp(), adcall.read_core_vbat(), adcall.read_core_vref(), adcall.read_vref())
+        timer = pyb.Timer(int(self.config["Adc"].get("Timer", 6)), freq=int(self.config["Adc"].get("Timed_Freq", 1000)))
+        governor.register(timer, freq=int(self.config["Adc"].get("Timed_Freq", 1000)))  # Keeps its rate through a cpu frequency switch.
+        try:
+            if not pyb.ADC.read_timed_multi(adcs, self.init_buffers(), timer):
+                utils.log_file("{} => sampling overrun".format(self.name), constants.LOG_LEVEL, level=utils.WARNING)
+        finally:
+            governor.unregister(timer)
+            timer.deinit()
+        return core, 4096  # read_timed counts are 12 bit.
+
+    def values(self, core, full):
+        """Converts the sampled counts, the same for both acquisitions.
 
+        Params:
+            core(tuple): (core temp, core vbat, core vref, vref)
+            full(int): full scale counts
+        Returns:
+            (battery level, current level, ambient temperature, core temp,
+            core vbat, core vref, vref), (battery level min, max, std, current
+            level min, max, std)
+        """
+        battery, current, ambient = buffers[self.name]
+        vref = core[3]
+        with governor.phase("compute"):
+            battery = self.stats(battery, self.coeffs[0] * vref / full)
+            current = self.stats(current, self.coeffs[1] * vref / full)
+            ambient_temperature = self.ad22103(sum(ambient) * vref / full / len(ambient), vref)
+        return (battery[0], current[0], ambient_temperature) + core, battery[1:] + current[1:]
+
+    @profiler.profiled("ADC.main")
     def main(self):
-        """Gets data from internal sensors."""
+        """Gets data from internal sensors, sampled by :func:`sample` if "Timed"
+        is set in the "Adc" config, else polled by :func:`poll`."""
         utils.log_file("{} => checking up system status...".format(self.name), constants.LOG_LEVEL)
-        core_temp = 0
-        core_vbat = 0
-        core_vref = 0
-        vref = 0
-        battery_level = 0
-        current_level = 0
-        ambient_temperature = 0
+        if self.config["Adc"].get("Timed"):
+            values, extra = self.values(*self.sample())
+        else:
+            values, extra = self.values(*self.poll())
+        energy.update(values[0])  # Battery level.
         self.data = []
-        channels = []
-        for key in self.config["Adc"]["Channels"].keys():
-            channels.append(self.config["Adc"]["Channels"][key]["Ch"])
-        adcall = pyb.ADCAll(int(self.config["Adc"]["Bit"]), self.adcall_mask(channels))
-        for i in range(int(self.config["Samples"]) * int(self.config["Sample_Rate"])):
-            core_temp += adcall.read_core_temp()
-            core_vbat += adcall.read_core_vbat()
-            core_vref += adcall.read_core_vref()
-            vref += adcall.read_vref()
-            battery_level += adcall.read_channel(self.config["Adc"]["Channels"]["Battery_Level"]["Ch"])
-            current_level += adcall.read_channel(self.config["Adc"]["Channels"]["Current_Level"]["Ch"])
-            ambient_temperature += adcall.read_channel(self.config["Adc"]["Channels"]["Ambient_Temperature"]["Ch"])
-            i += 1
-        core_temp = core_temp / i
-        core_vbat = core_vbat / i
-        core_vref = core_vref / i
-        vref = vref / i
-        battery_level = battery_level / i * vref / pow(2, int(self.config["Adc"]["Bit"]))
-        current_level = current_level / i * vref / pow(2, int(self.config["Adc"]["Bit"]))
-        ambient_temperature = ambient_temperature / i * vref / pow(2, int(self.config["Adc"]["Bit"]))
-        battery_level = self.battery_level(battery_level)
-        current_level = self.current_level(current_level)
-        ambient_temperature = self.ad22103(ambient_temperature, vref)
         epoch = utime.time()
         self.data.append(self.config["String_Label"])
         self.data.append(str(utils.unix_epoch(epoch)))  # unix timestamp
         self.data.append(utils.datestamp(epoch))  # YYMMDD
         self.data.append(utils.timestamp(epoch))  # hhmmss
-        self.data.append("{:.4f}".format(battery_level))
-        self.data.append("{:.4f}".format(current_level))
-        self.data.append("{:.4f}".format(ambient_temperature))
-        self.data.append("{:.4f}".format(core_temp))
-        self.data.append("{:.4f}".format(core_vbat))
-        self.data.append("{:.4f}".format(core_vref))
-        self.data.append("{:.4f}".format(vref))
+        for value in values + extra:  # Battery, current, ambient temperature, core temp, vbat, vref, vref, battery and current min, max, std.
+            self.data.append("{:.4f}".format(value))
         return True
 
+    @profiler.profiled("ADC.log")
     def log(self):
         utils.log_data(",".join(map(str, self.data)))
         return
@@ -0,0 +1,139 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""uasyncio main loop, runs in place of the main.py polling loop when
+constants.ASYNCIO is set."""
+
+import pyb
+import utime
+import uasyncio
+import constants
+import _thread
+import tools.utils as utils
+import tools.imports as imports
+import tools.memory as memory
+import tools.supervisor as supervisor
+import tools.energy as energy
+
+async def _listen(board, session, stream, event):
+    """Awaits the escape sequence on an input stream.
+
+    Reads the stream only while the board is in scheduled mode, leaving it to
+    the session and menu threads otherwise.
+
+    Params:
+        board(obj)
+        session(obj)
+        stream(obj): USB_VCP or UART
+        event(obj): uasyncio.Event set on escape
+    """
+    reader = uasyncio.StreamReader(stream)
+    esc_cnt = 0
+    while True:
+        if board.escaped or board.prompted or board.interactive or board.connected or session.authenticating:
+            await uasyncio.sleep_ms(100)
+            continue
+        byte = await reader.read(1)
+        if byte.decode("utf-8") == constants.ESC_CHAR:
+            esc_cnt += 1
+            if esc_cnt == 3:
+                if stream == board.usb:
+                    board.prompted = True
+                else:
+                    board.escaped = True
+                board.interrupted = False
+                esc_cnt = 0
+                event.set()
+
+async def _wait(event, timeout):
+    """Awaits the event for at most timeout ms."""
+    try:
+        await uasyncio.wait_for_ms(event.wait(), timeout)
+    except uasyncio.TimeoutError:
+        pass
+    event.clear()
+
+async def main(board, scheduler, session):
+    """Main loop.
+
+    The scheduler and the input streams are awaited by their own tasks, devices
+    acquire data in :func:`tools.utils.aexecute` tasks. Interactive and file
+    transfer modes run in threads as in the threaded runtime.
+
+    Params:
+        board(obj)
+        scheduler(obj)
+        session(obj)
+    """
+    event = uasyncio.Event()
+    for input in board.input:
+        uasyncio.create_task(_listen(board, session, input, event))
+    uasyncio.create_task(scheduler.run(event))
+    await uasyncio.sleep_ms(0)  # Lets the tasks start up.
+    while True:
+        session.check()  # Expires the session past its deadlines.
+        supervisor.check()  # Powers off the overrun devices, a user session too.
+        if board.escaped:
+            if not session.loggedin:
+                pyb.repl_uart(board.uart)
+                _thread.start_new_thread(session.login, (constants.LOGIN_ATTEMPTS,))
+            else:
+                board.prompted = True
+            board.escaped = False
+        elif session.authenticating:  # Prevents sleeping while user is authenticating.
+            if session.loggedin:
+                board.prompted = True
+                session.authenticating = False
+            elif session.loggedout:
+                pyb.repl_uart(None)
+                session.init()
+                session.authenticating = False
+        elif board.prompted:  # Prompts user for interactive or file mode.
+            session.touch()  # Escaped by a logged in user.
+            if board.set_mode(5):
+                if board.interactive:
+                    menu = imports.load("menu").MENU(board, scheduler, session)  # Creates the menu object, imported at first use.
+                    _thread.start_new_thread(menu.main, ())
+                elif board.connected:
+                    pyb.repl_uart(None)  # Disables repl to avoid byte collision
+                    _thread.start_new_thread(board.devices[101].receive, (3,))
+            board.prompted = False
+        elif board.interactive or board.connected:  # Prevents sleeping while user is interacting.
+            if session.loggedout:
+                pyb.repl_uart(None)  # Disables repl to avoid byte collision
+                board.interactive = False
+                session.init()
+        else:
+            t0 = utime.time()
+            if not utils.processes and not board.interrupted and not board.usb.isconnected():  # Waits for no running tasks and no usb connetion before sleep.
+                if constants.MODEM in utils.status_table and not energy.deferred() and utils.files_to_send():  # Checks for data files to send, unless the battery is low.
+                    energy.upload()
+                    _thread.start_new_thread(utils.execute, (constants.MODEM, ["data_transfer"]))  # Sends data files before sleeping.
+                elif scheduler.next_event > t0:
+                    memory.safe_point()  # Collects with no task running.
+                    utils.log_file("Sleeping for {}".format(utils.time_display(scheduler.next_event - t0)), constants.LOG_LEVEL, level=utils.DEBUG)  # DEBUG
+                    board.go_sleep(scheduler.next_event - t0)  # Puts board in sleep mode.
+                    scheduler.event.set()  # Wakes up the scheduler, ticks_ms stopped while sleeping.
+            board.lastfeed = utime.time()
+            await _wait(event, min(max((scheduler.next_event - utime.time()) * 1000, 100), 1000))  # Rechecks tasks and interrupts every second at least.
+            continue
+        await _wait(event, 100)
@@ -22,34 +22,111 @@
 
 import utime
 import tools.utils as utils
+import tools.profiler as profiler
+import tools.startup as startup
+import tools.clock as clock
+import tools.energy as energy
 import constants
-import _thread
 
 class SCHEDULER(object):
-    """Scheduler class docstring."""
+    """Runs the device events.
+
+    Each event gets a window {timestamp:{device:(earliest, latest)}}: "on" may
+    run up to SLEEP_TOLERANCE earlier, "off" and "start_up" later, data tasks
+    earlier but never before the warm-up ends. The board wakes up at the latest
+    time that still meets the first deadline, and runs every event whose window
+    is open then, so close events share one wake.
+    """
 
     def __init__(self):
+        self.powered = {}  # {device:timestamp switched on,...}
+        self.running = 0  # uasyncio device tasks running.
+        if not constants.ASYNCIO:
+            from tools.pool import POOL
+            self.pool = POOL(constants.WORKERS)  # Runs device tasks.
         utils.log_file("Initializing the event table...", constants.LOG_LEVEL)
         self.calc_event_table()
+        self.calc_next_event()
 
+    @profiler.profiled("SCHEDULER.scheduled")
     def scheduled(self, timestamp):
-        """Executes any event defined at occurred timestamp.
+        """Executes the events due at timestamp, missed ones included.
+
+        The events the executed ones bring in (e.g. the tasks of a device
+        switched on) run in the same wake if their window is open.
 
         Params:
             timestamp(int)
         """
-        self.calc_next_event()
-        if timestamp > self.next_event:  # Executes missed event.
-            timestamp = self.next_event
-        if timestamp in self.event_table:
-            for device in self.event_table[timestamp]:
-                self.manage_task(device, self.event_table[timestamp][device])
+        for _ in range(len(utils.status_table) + 1):
+            events = self.due(timestamp)
+            if not events:
+                break
+            for event, device in events:
+                self.manage_task(device, self.event_table[event][device])
             self.calc_event_table()
+        self.calc_next_event()
+
+    def due(self, timestamp):
+        """Returns the events whose window is open at timestamp.
+
+        Params:
+            timestamp(int)
+        Returns:
+            [(event, device),...] sorted by event
+        """
+        return [(event, device) for event in sorted(self.event_table) for device in self.event_table[event] if self.windows[event][device][0] <= timestamp]
+
+    async def run(self, event=None):
+        """Executes the event table as a uasyncio task, awaits the next event
+        between executions.
+
+        The wait is cut short by setting :attr:`event`, as the board must do
+        after a sleep: ticks_ms doesn't run in stop mode.
+
+        Params:
+            event(obj): uasyncio.Event set after each execution and task end
+        """
+        import uasyncio
+        self.event = uasyncio.Event()
+        self.done = event
+        while True:
             self.calc_next_event()
+            try:
+                await uasyncio.wait_for_ms(self.event.wait(), max((self.next_event - utime.time()) * 1000, 100))  # Waits at least 100ms as the threaded main loop.
+            except uasyncio.TimeoutError:
+                pass
+            self.event.clear()
+            self.scheduled(utime.time())
+            if event:
+                event.set()
+
+    async def _aexecute(self, device, tasks):
+        """Awaits :func:`tools.utils.aexecute` then wakes up the main loop to
+        check for sleep, as utils.wakeup does for the threaded one."""
+        self.running += 1
+        try:
+            await utils.aexecute(device, tasks)
+        finally:
+            self.running -= 1
+        if self.done:
+            self.done.set()
+
+    def idle(self):
+        """Returns True if no device task is queued or running."""
+        if constants.ASYNCIO:
+            return not self.running
+        return self.pool.idle()
 
     def calc_next_event(self):
-        """Gets the earlier event from the event table."""
-        self.next_event = min(self.event_table)
+        """Plans the next wake: the first deadline, brought back to the last
+        window opening before it, RTC_WAKEUP_MAX from now if there is no event
+        (every device disabled)."""
+        if not self.event_table:
+            self.next_event = utime.time() + constants.RTC_WAKEUP_MAX
+            return
+        deadline = min([window[1] for event in self.windows for window in self.windows[event].values()])
+        self.next_event = max([window[0] for event in self.windows for window in self.windows[event].values() if window[0] <= deadline])
 
     def manage_task(self, device, tasks):
         """Manages the device status after a event event.
@@ -59,14 +136,24 @@ class SCHEDULER(object):
         Params:
             task(str)
         """
-        if "on" in tasks:
+        if "start_up" in tasks:
+            self.powered.pop(device, None)
+            startup.retry(device)
+        elif "on" in tasks:
             utils.create_device(device, tasks=["on"])
+            self.powered[device] = utime.time()
         elif "off" in tasks:
+            self.powered.pop(device, None)
             utils.create_device(device, tasks=["off"])
         else:
+            status = utils.status_table[device]
             utils.status_table[device] = 2  # Sets device ready.
-            _thread.stack_size(8 * 1024)  # Icreases thread stack size to avoid RuntimeError: maximum recursion depth exceeded
-            _thread.start_new_thread(utils.execute, (device, tasks,))
+            if constants.ASYNCIO:
+                import uasyncio
+                uasyncio.create_task(self._aexecute(device, tasks))
+            elif not self.pool.submit(device, tasks):  # Its overrun task still runs.
+                utils.status_table[device] = status
+                return
             utils.log_file("{} => {}".format(device, constants.DEVICE_STATUS[utils.status_table[device]]), constants.LOG_LEVEL)
 
     def calc_data_acquisition_interval(self, device):
@@ -74,17 +161,23 @@ class SCHEDULER(object):
         if device.split(".")[1] in constants.TASK_SCHEDULER:
             for event in constants.TASK_SCHEDULER[device.split(".")[1]]:
                 if event == "log":
-                    tmp = constants.TASK_SCHEDULER[device.split(".")[1]]["log"]
+                    tmp[0] = constants.TASK_SCHEDULER[device.split(".")[1]]["log"]  # Replaces the default interval.
                 else:
                     tmp.append(constants.TASK_SCHEDULER[device.split(".")[1]][event])
-        return min(tmp)
+        return energy.interval(min(tmp))
 
     def calc_event_table(self):
         """Calculates the subsequent events for all defined devices."""
         self.event_table = {} # {timestamp:{device1:[task1, task2,...],...}
+        self.windows = {}  # {timestamp:{device1:(earliest, latest),...}
         now = utime.time()
+        tolerance = constants.SLEEP_TOLERANCE
         for device in utils.status_table:
             status = utils.status_table[device]
+            if status == 3:  # device is degraded
+                timestamp = now - now % constants.STARTUP_RETRY + constants.STARTUP_RETRY
+                self.add_event(timestamp, device, "start_up", latest=timestamp + tolerance)
+                continue
             data_aquisition_interval = self.calc_data_acquisition_interval(device)
             next_acquisition = now - now % data_aquisition_interval + data_aquisition_interval
             obj = utils.create_device(device)
@@ -99,27 +192,30 @@ class SCHEDULER(object):
             if status in [0]:  # device is off
                 timestamp =  next_acquisition - sampling_duration - warmup_duration + activation_delay
                 task = "on"
-                self.add_event(timestamp, device, task)
+                self.add_event(timestamp, device, task, earliest=timestamp - tolerance)
             elif status == 1:  # device is on / warming up
+                warm = self.powered.get(device, now) + warmup_duration  # Switched on by now at the latest.
                 if not device.split(".")[1] in constants.TASK_SCHEDULER:
-                    data_aquisition_interval = constants.DATA_ACQUISITION_INTERVAL
+                    data_aquisition_interval = energy.interval(constants.DATA_ACQUISITION_INTERVAL)
                     next_acquisition = now - now % data_aquisition_interval + data_aquisition_interval
                     timestamp = next_acquisition - sampling_duration + activation_delay
                     task = "log"
-                    self.add_event(timestamp, device, task)
+                    self.add_event(timestamp, device, task, earliest=max(timestamp - tolerance, warm))
                 else:
                     if not "log" in constants.TASK_SCHEDULER[device.split(".")[1]]:
-                        data_aquisition_interval = constants.DATA_ACQUISITION_INTERVAL
+                        data_aquisition_interval = energy.interval(constants.DATA_ACQUISITION_INTERVAL)
                         next_acquisition = now - now % data_aquisition_interval + data_aquisition_interval
                         timestamp = next_acquisition - sampling_duration + activation_delay
                         task = "log"
-                        self.add_event(timestamp, device, task)
+                        self.add_event(timestamp, device, task, earliest=max(timestamp - tolerance, warm))
                     for event in constants.TASK_SCHEDULER[device.split(".")[1]]:
-                        data_aquisition_interval = int(constants.TASK_SCHEDULER[device.split(".")[1]][event])
+                        data_aquisition_interval = energy.interval(int(constants.TASK_SCHEDULER[device.split(".")[1]][event]))
+                        if event == "sync_rtc":  # Stretched while the rtc drift is under control.
+                            data_aquisition_interval = clock.interval(data_aquisition_interval)
                         next_acquisition = now - now % data_aquisition_interval + data_aquisition_interval
                         timestamp = next_acquisition - sampling_duration + activation_delay
                         task = event
-                        self.add_event(timestamp, device, task)
+                        self.add_event(timestamp, device, task, earliest=max(timestamp - tolerance, warm))
             elif status == 2:  # device is ready / acquiring data
                 timestamp =  next_acquisition + activation_delay
                 '''if data_aquisition_interval - sampling_duration - warmup_duration == 0:
@@ -127,20 +223,26 @@ class SCHEDULER(object):
                 else:
                     task = "off'''
                 task = "off"
-                self.add_event(timestamp, device, task)
+                self.add_event(timestamp, device, task, latest=timestamp + tolerance)
 
-    def add_event(self, timestamp, device, task):
+    def add_event(self, timestamp, device, task, earliest=None, latest=None):
         """Adds an event {timestamp:{device1:[task1, task2,...],...} to the event table.
 
         Params:
             timestamp(int)
             device(str)
             task(str)
+            earliest(int): earliest run time, default timestamp
+            latest(int): latest run time, default timestamp
         """
+        window = (timestamp if earliest is None else min(timestamp, earliest), timestamp if latest is None else max(timestamp, latest))
         if timestamp in self.event_table:
             if device in self.event_table[timestamp]:
                 self.event_table[timestamp][device].append(task)
+                window = (max(window[0], self.windows[timestamp][device][0]), min(window[1], self.windows[timestamp][device][1]))  # Meets both tasks.
             else:
                 self.event_table[timestamp][device]=[task]
         else:
             self.event_table[timestamp] = {device:[task]}
+            self.windows[timestamp] = {}
+        self.windows[timestamp][device] = window
@@ -22,21 +22,39 @@
 
 import pyb
 import sys
-import _thread
 import uselect
 import utime
 import constants
+import tools.utils as utils
 
 class SESSION(object):
+    """Remote session.
+
+    A session ends timeout seconds after the login or idle seconds after the
+    last user activity: the menu keys, the escape to the mode prompt, and the
+    whole file transfer mode, whose ymodem traffic the session doesn't see.
+    The deadlines cost nothing while waiting: the main loop calls
+    :func:`check` on its way, a session found past them on wake up is expired
+    at once.
+
+    Params:
+        board(obj)
+        timeout(int): seconds
+        idle(int): seconds, default SESSION_IDLE
+    """
 
     def __init__(self, **kwargs):
-        self.input = kwargs["board"].input
+        self.board = kwargs["board"]
+        self.input = self.board.input
         self.timeout = kwargs["timeout"]
+        self.idle = kwargs.get("idle", constants.SESSION_IDLE)
         self.logging = False
         self.loggedin = False
         self.loggedout = False
         self.authenticating = False
         self.active = False
+        self.expires = 0  # Login time + timeout.
+        self.touched = 0  # Last user activity.
         self.passwd = constants.PASSWD
 
     def init(self):
@@ -63,9 +81,11 @@ class SESSION(object):
                     byte = r[0].read(1)
                     if  byte == b"\r":
                         if rx[len(rx) - len(self.passwd):] == self.passwd:
-                            _thread.start_new_thread(self._expire, (self.timeout,))
+                            self.touch()
+                            self.expires = self.touched + self.timeout
                             self.loggedin = True
                             print("")
+                            utils.wakeup.set()  # Lets the main loop prompt.
                             return
                         elif i < attempts-1:
                             print("\n\rTRY AGAIN.")
@@ -83,35 +103,53 @@ class SESSION(object):
                     break
         print("")
         self.loggedout = True
+        utils.wakeup.set()
         return
 
-    def _expire(self, timeout):
-        """Timeouts session.
-
-        Params:
-            timeout(int): seconds
-        """
-        t0 = utime.time()
-        while utime.time() - t0 < timeout:
-            pass
+    def _expire(self):
+        """Timeouts session."""
         print("SESSION EXPIRED.")
         self.loggedin = False
         self.loggedout = True
         return
 
-    def check_activity(self):
-        """Starts check_activity method as a thread."""
+    def touch(self):
+        """Records user activity."""
+        self.touched = utime.time()
         self.active = True
-        _thread.start_new_thread(self._check_activity, (self.timeout,))
 
-    def _check_activity(self, timeout):
+    def check_activity(self, now=None):
         """Checks for user activity.
 
         Params:
-            timeout(int): seconds
+            now(int): seconds, default utime.time()
+        Returns:
+            False if idle for longer than idle seconds
+        """
+        if now is None:
+            now = utime.time()
+        self.active = not self.idle or now - self.touched < self.idle
+        return self.active
+
+    def remain(self):
+        """Returns the ms before the session deadlines, None if not logged in."""
+        if not self.loggedin:
+            return None
+        deadline = self.expires
+        if self.idle and not self.board.connected:
+            deadline = min(deadline, self.touched + self.idle)
+        return max(deadline - utime.time(), 0) * 1000
+
+    def check(self):
+        """Expires the session past its deadlines.
+
+        Returns:
+            True while logged in
         """
-        while True:
-            r, w, x = uselect.select(self.input, [], [], timeout)
-            if not r:
-                self.active = False
-                return
+        if self.loggedin:
+            if self.board.connected:  # File transfer mode.
+                self.touch()
+            now = utime.time()
+            if now >= self.expires or not self.check_activity(now):
+                self._expire()
+        return self.loggedin
@@ -0,0 +1,149 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Rtc discipline.
+
+Each gps sync measures the rtc offset from the gps utc, sub-second included
+(rtc subseconds and RMC fraction), over the time elapsed since the previous
+sync, then sets the rtc on the next utc second boundary.
+
+The oscillator drift (ppm, positive runs fast) is the least squares slope,
+through the origin, of the offsets (the calibration share removed) over the
+elapsed times, past syncs weighted by CLOCK_FORGET so that it follows the
+temperature. The drift is cancelled by the rtc smooth calibration, a count
+is 0.954 ppm and positive counts speed the clock up.
+
+The sync interval starts at the scheduler one and doubles at each sync while
+the predicted error (residual drift plus the mean prediction miss, times the
+interval) stays under CLOCK_MAX_ERROR, up to CLOCK_MAX_INTERVAL. Offsets
+beyond OUTLIER ppm (a reboot, a manual set) restart the fit.
+"""
+
+import pyb
+import utime
+import constants
+import tools.utils as utils
+
+PPM = 1000000 / 1048576  # ppm per calibration count.
+CAL_MIN = -511
+CAL_MAX = 512
+OUTLIER = 1000  # ppm. Beyond any crystal error plus calibration.
+
+rtc = pyb.RTC()
+cal = rtc.calibration()  # Kept by the rtc across resets.
+set_at = None  # Rtc seconds of the last set.
+sxx = 0.0  # Weighted sum of elapsed ** 2.
+sxy = 0.0  # Weighted sum of elapsed * offset.
+syncs = 0  # Syncs in the fit.
+drift = 0.0  # ppm. Oscillator drift, calibration excluded.
+miss = 0.0  # ppm. Mean prediction miss.
+offset = 0  # ms. Last measured offset.
+base = None  # sec. Scheduler sync interval.
+period = None  # sec. Current sync interval, None until the drift is known.
+
+def now():
+    """Reads the rtc.
+
+    Returns:
+        (seconds, milliseconds)
+    """
+    dt = rtc.datetime()
+    return utime.mktime((dt[0], dt[1], dt[2], dt[4], dt[5], dt[6], 0, 0)), (255 - dt[7]) * 1000 // 256
+
+def predicted(seconds):
+    """Returns the rtc error expected after seconds from a sync in ms."""
+    return (abs(drift + cal * PPM) + miss) * seconds / 1000
+
+def interval(default):
+    """Returns the sync interval.
+
+    Params:
+        default(int): scheduler interval, the shortest one
+    Returns:
+        (int): seconds
+    """
+    global base
+    base = default
+    if period is None or period < default:
+        return default
+    return period
+
+def _fit(elapsed, measured):
+    """Updates the drift estimate and the calibration.
+
+    Params:
+        elapsed(int): seconds since last set
+        measured(int): ms offset
+    """
+    global sxx, sxy, syncs, drift, miss, cal
+    y = measured * 1000 - cal * PPM * elapsed  # us. Oscillator share of the offset.
+    if syncs:
+        miss = constants.CLOCK_FORGET * miss + (1 - constants.CLOCK_FORGET) * abs(y / elapsed - drift)
+    else:
+        miss = abs(y / elapsed)  # Unknown till the next sync.
+    sxx = constants.CLOCK_FORGET * sxx + elapsed * elapsed
+    sxy = constants.CLOCK_FORGET * sxy + elapsed * y
+    syncs += 1
+    drift = sxy / sxx
+    cal = min(max(int(round(-drift / PPM)), CAL_MIN), CAL_MAX)
+    rtc.calibration(cal)
+
+def sync(utc, ms, received):
+    """Disciplines the rtc to the gps utc.
+
+    Params:
+        utc(int): embedded epoch of the sentence
+        ms(int): sentence milliseconds, latency included
+        received(int): ticks_ms of the sentence end
+    Returns:
+        True if the rtc has been set
+    """
+    global set_at, sxx, sxy, syncs, offset, period
+    rtc_s, rtc_ms = now()
+    ms += utime.ticks_diff(utime.ticks_ms(), received)
+    utc += ms // 1000
+    ms %= 1000
+    offset = (rtc_s - utc) * 1000 + rtc_ms - ms
+    if set_at is not None and rtc_s > set_at:
+        elapsed = rtc_s - set_at
+        if abs(offset) * 1000 > OUTLIER * elapsed:
+            utils.log_file("rtc => offset {} ms over {} s, drift fit restarted".format(offset, elapsed), constants.LOG_LEVEL, level=utils.WARNING)
+            sxx = sxy = 0.0
+            syncs = 0
+            period = None
+        else:
+            _fit(elapsed, offset)
+    utime.sleep_ms(1000 - ms)  # Sets on the next utc second, the rtc restarts its subseconds.
+    t = utime.localtime(utc + 1)
+    try:
+        rtc.datetime((t[0], t[1], t[2], t[6] + 1, t[3], t[4], t[5], 0))
+    except Exception as err:
+        utils.log_file("rtc => {}".format(err), constants.LOG_LEVEL, level=utils.ERROR)
+        return False
+    set_at = utc + 1
+    if syncs > 1 and base:
+        limit = min((period or base) * 2, constants.CLOCK_MAX_INTERVAL)
+        period = base
+        while period * 2 <= limit and predicted(period * 2) <= constants.CLOCK_MAX_ERROR:
+            period *= 2
+    utils.log_file("rtc => offset {} ms, drift {:.2f} ppm, calibration {}, next sync {} s".format(offset, drift, cal, period or base), constants.LOG_LEVEL)
+    return True
@@ -0,0 +1,98 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Energy policy.
+
+The battery level measured by the system health (pyboard.ADC) selects one of
+the ENERGY_TIERS (battery level from, interval stretch, samples divider,
+upload period). A tier holds while the battery stays at or above its level,
+it is left for the upper one once the battery is ENERGY_HYSTERESIS over the
+upper tier level, so that a charging battery doesn't flap between tiers.
+
+The scheduler stretches the device intervals by :func:`interval`, the
+ENERGY_SAMPLED devices take fewer samples (:func:`samples`), the modem
+uploads wait out the tier upload period (:func:`deferred`, hours, 0 sends at
+once and None never).
+"""
+
+import utime
+import constants
+import tools.utils as utils
+
+tier = 0
+battery = None  # V. Last battery level.
+uploaded = None  # Rtc seconds of the last upload.
+
+def update(level):
+    """Selects the tier of the battery level, logs the changes.
+
+    Params:
+        level(float): battery V
+    """
+    global tier, battery
+    battery = level
+    tiers = constants.ENERGY_TIERS
+    new = tier
+    while new + 1 < len(tiers) and level < tiers[new][0]:
+        new += 1
+    while new > 0 and level >= tiers[new - 1][0] + constants.ENERGY_HYSTERESIS:
+        new -= 1
+    if new != tier:
+        tier = new
+        period = tiers[tier][3]
+        utils.log_file("energy => battery {:.2f} V, tier {}: intervals x{}, samples /{}, uploads {}".format(
+            level, tier, tiers[tier][1], tiers[tier][2], "never" if period is None else "every {} h".format(period) if period else "at once"), constants.LOG_LEVEL)
+
+def interval(seconds):
+    """Returns the device interval stretched by the tier.
+
+    Params:
+        seconds(int)
+    Returns:
+        (int)
+    """
+    return seconds * constants.ENERGY_TIERS[tier][1]
+
+def samples(device, count):
+    """Returns the samples of a device reduced by the tier.
+
+    Params:
+        device(str): class_instance, e.g. "ADC_1"
+        count(int): configured samples
+    Returns:
+        (int)
+    """
+    if device in constants.ENERGY_SAMPLED:
+        return max(count // constants.ENERGY_TIERS[tier][2], 1)
+    return count
+
+def deferred():
+    """Returns True if the modem upload must wait for the tier period."""
+    period = constants.ENERGY_TIERS[tier][3]
+    if period is None:
+        return True
+    return bool(period) and uploaded is not None and utime.time() - uploaded < period * 3600
+
+def upload():
+    """Records the upload start."""
+    global uploaded
+    uploaded = utime.time()
@@ -0,0 +1,173 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""CPU clock governor.
+
+Code declares the phase it is running (io-wait, compute, transfer), the cpu
+runs at the highest frequency requested by the active phases, or at the io-wait
+one when no phase is active. UART and I2C baudrates and timer frequencies
+depend on the bus clocks, so every registered bus and timer is reinitialized
+after each switch. A switch is deferred, to the next phase change, while a
+registered UART is receiving, i.e. holds more unread bytes than at the previous
+phase change: its reinitialization would cut the transfer. A buffer that stopped
+filling (a device not reading its stream) does not hold the switch forever.
+
+    with governor.phase("compute"):
+        crunch_numbers()
+"""
+
+import pyb
+import utime
+import constants
+import _thread
+
+lock = _thread.allocate_lock()
+
+"""Active phases {phase:count,...}."""
+active = {}
+
+"""Registered buses and timers {obj:(args, kwargs),...}."""
+buses = {}
+
+"""Time spent at each frequency {freq:ms,...}."""
+residency = {}
+
+switches = 0
+deferred = 0  # Switches put off by a receiving uart.
+_seen = {}  # Unread bytes at the previous phase change {uart:n,...}.
+
+_freq = pyb.freq()[0]
+_since = utime.ticks_ms()
+
+def register(bus, *args, **kwargs):
+    """Registers a uart, i2c or timer to be reinitialized after a frequency
+    switch.
+
+    Params:
+        bus(obj)
+        args, kwargs: bus.init() arguments
+    """
+    with lock:
+        buses[bus] = (args, kwargs)
+
+def unregister(bus):
+    """Unregisters a deinitialized bus or timer.
+
+    Params:
+        bus(obj)
+    """
+    with lock:
+        if bus in buses:
+            del buses[bus]
+        if bus in _seen:
+            del _seen[bus]
+
+def _receiving():
+    """Returns True if a registered uart buffer is filling."""
+    receiving = False
+    for bus in buses:
+        if hasattr(bus, "any"):
+            n = bus.any()
+            if n > _seen.get(bus, 0):
+                receiving = True
+            _seen[bus] = n
+    return receiving
+
+def _target():
+    """Returns the frequency requested by the active phases."""
+    freq = constants.CPU_FREQ["io-wait"]
+    for key in active:
+        if active[key] and constants.CPU_FREQ[key] > freq:
+            freq = constants.CPU_FREQ[key]
+    return freq
+
+def _switch(freq):
+    """Sets the cpu frequency then reinitializes the buses and timers, call
+    with lock held.
+
+    Params:
+        freq(int): Hz
+    """
+    global _freq, _since, switches, deferred
+    now = utime.ticks_ms()
+    residency[_freq] = residency.get(_freq, 0) + utime.ticks_diff(now, _since)
+    _since = now
+    if not constants.CPU_GOVERNOR:
+        return
+    receiving = _receiving()  # Sampled at every phase change.
+    if freq == _freq:
+        return
+    if receiving:
+        deferred += 1
+        return
+    pyb.freq(freq)
+    for bus in buses:
+        bus.init(*buses[bus][0], **buses[bus][1])
+    _freq = freq
+    switches += 1
+
+def enter(phase):
+    """Declares the beginning of a phase.
+
+    Params:
+        phase(str): io-wait, compute, transfer
+    """
+    with lock:
+        active[phase] = active.get(phase, 0) + 1
+        _switch(_target())
+
+def leave(phase):
+    """Declares the end of a phase.
+
+    Params:
+        phase(str): io-wait, compute, transfer
+    """
+    with lock:
+        active[phase] = max(active.get(phase, 0) - 1, 0)
+        _switch(_target())
+
+def stats():
+    """Returns the time spent at each frequency.
+
+    Returns:
+        {freq:ms,...}
+    """
+    with lock:
+        _switch(_freq)
+        return dict(residency)
+
+class phase(object):
+    """Context manager declaring a phase.
+
+    Params:
+        name(str): io-wait, compute, transfer
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        enter(self.name)
+        return self
+
+    def __exit__(self, *args):
+        leave(self.name)
@@ -0,0 +1,111 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Lazy module loader.
+
+Modules needed only on some wake cycles (the menu, the ymodem transfer, the
+device drivers) are imported at first use through :func:`load`, which records
+the import time and the heap the import allocates (the module and its
+compilation):
+
+    MENU = imports.load("menu").MENU
+
+:func:`unload` drops a module after use, its heap is freed at the next gc
+collection as long as nothing else references it.
+"""
+
+import gc
+import sys
+import utime
+import constants
+import _thread
+
+lock = _thread.allocate_lock()
+owner = None  # Thread loading a module, its nested loads don't take the lock again.
+
+"""Import costs {module:(us, heap bytes),...}."""
+costs = {}
+
+"""Recorded modules in import order."""
+order = []
+
+def load(module):
+    """Imports a module, records its cost at the first import.
+
+    Params:
+        module(str): dotted module name
+    Returns:
+        module(obj)
+    """
+    global owner
+    if module in sys.modules:
+        return sys.modules[module]
+    me = _thread.get_ident()
+    nested = owner == me  # Loaded at import time by a module being loaded.
+    if not nested:
+        lock.acquire()
+        owner = me
+    try:
+        if module not in sys.modules:  # Unless loaded by another thread meanwhile.
+            gc.collect()
+            heap = gc.mem_alloc()
+            t0 = utime.ticks_us()
+            __import__(module)
+            us = utime.ticks_diff(utime.ticks_us(), t0)
+            if module not in costs:
+                order.append(module)
+            costs[module] = (us, gc.mem_alloc() - heap)
+    finally:
+        if not nested:
+            owner = None
+            lock.release()
+    return sys.modules[module]
+
+def unload(module):
+    """Drops a module from the imported ones.
+
+    Params:
+        module(str): dotted module name
+    """
+    with lock:
+        sys.modules.pop(module, None)
+        if "." in module:  # Drops the package reference too.
+            package, name = module.rsplit(".", 1)
+            try:
+                delattr(sys.modules[package], name)
+            except:
+                pass
+
+def table():
+    """Returns the import costs.
+
+    Returns:
+        [(module, us, bytes),...]
+    """
+    with lock:
+        return [(module, costs[module][0], costs[module][1]) for module in order]
+
+def log():
+    """Logs the import costs."""
+    import tools.utils as utils
+    for module, us, heap in table():
+        utils.log_file("Import {} => {} ms, {} bytes".format(module, us // 1000, heap), constants.LOG_LEVEL, level=utils.DEBUG)
@@ -0,0 +1,136 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""System log.
+
+Every message is printed, the ones under LOG_THRESHOLD are not saved. The
+lines are stamped with the rtc time, formatted once a second, and the ticks
+ms, the saved ones collected in a LOG_BUF bytes buffer written out to LOG_FILE in one
+go when full, before the board sleeps and on errors. LOG_FILE is rotated to
+Log.1.txt, Log.2.txt... past LOG_FILE_SIZE bytes, the oldest file is dropped
+to keep the files within LOG_BUDGET bytes.
+"""
+
+import _thread
+import uos
+import utime
+import constants
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+buf = bytearray(constants.LOG_BUF)
+mv = memoryview(buf)
+used = 0  # Buffered bytes.
+size = None  # LOG_FILE bytes, read at the first write out.
+second = None  # Rtc second of wall.
+wall = ""
+lock = _thread.allocate_lock()
+
+def enabled(level):
+    """Returns True if the messages of level are kept."""
+    return level >= constants.LOG_THRESHOLD
+
+def stamp():
+    """Returns the line stamp, the rtc time and the ticks ms."""
+    global second, wall
+    now = utime.time()
+    if now != second:
+        wall = "{}-{:02d}-{:02d} {:02d}:{:02d}:{:02d}".format(*utime.localtime(now)[:6])
+        second = now
+    return "{}\t{}".format(wall, utime.ticks_ms())
+
+def name(i):
+    """Returns the name of the i-th log file, LOG_FILE the current one."""
+    if not i:
+        return constants.LOG_FILE
+    base, ext = constants.LOG_FILE.rsplit(".", 1)
+    return "{}.{}.{}".format(base, i, ext)
+
+def _rotate():
+    """Shifts the log files by one, the oldest is dropped."""
+    files = max(constants.LOG_BUDGET // constants.LOG_FILE_SIZE, 1)
+    for i in range(files - 1, -1, -1):
+        try:
+            if i == files - 1:
+                uos.remove(name(i))
+            else:
+                uos.rename(name(i), name(i + 1))
+        except OSError:
+            pass
+
+def _save(data):
+    """Appends data to LOG_FILE, rotated first if it would outgrow
+    LOG_FILE_SIZE, call with lock held.
+
+    Params:
+        data(memoryview)
+    """
+    global size
+    if size is None:
+        try:
+            size = uos.stat(constants.LOG_FILE)[6]
+        except OSError:
+            size = 0
+    if size and size + len(data) > constants.LOG_FILE_SIZE:
+        _rotate()
+        size = 0
+    try:
+        with open(constants.LOG_FILE, "ab") as file_:
+            file_.write(data)
+        size += len(data)
+    except OSError:
+        pass
+
+def _flush():
+    """Writes out the buffer, call with lock held."""
+    global used
+    if used:
+        _save(mv[:used])
+        used = 0
+
+def flush():
+    """Writes out the buffered lines."""
+    with lock:
+        _flush()
+
+def write(line, level=INFO):
+    """Buffers a log line, written out at once from ERROR.
+
+    Params:
+        line(str)
+        level(int)
+    """
+    global used
+    data = line.encode()
+    with lock:
+        if used + len(data) > len(buf):
+            _flush()
+        if len(data) > len(buf):
+            _save(data)
+        else:
+            buf[used:used + len(data)] = data
+            used += len(data)
+        if level >= ERROR:
+            _flush()
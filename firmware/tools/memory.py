@@ -0,0 +1,171 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Heap manager.
+
+Replaces the collection at every main loop pass: the gc threshold is sized on
+the bytes allocated per wake cycle, so automatic collections seldom hit a
+running acquisition, and :func:`safe_point` collects explicitly, with no task
+running (before sleeping and between two tasks), when the largest recent wake
+cycle allocation wouldn't fit below the threshold.
+
+Every GC_PROBE_INTERVAL safe points a GC_LARGEST_MIN bytes buffer is probed,
+if it can't be allocated the registered caches are released before the
+collection.
+"""
+
+import gc
+import utime
+import constants
+import _thread
+
+lock = _thread.allocate_lock()
+
+"""Caches released on fragmentation [(function, args),...]."""
+caches = []
+
+rate = 0  # Bytes allocated per wake cycle, moving average.
+peak = 0  # Largest wake cycle allocation, decaying.
+threshold = -1  # Current gc threshold, -1 if unset.
+baseline = 0  # Heap allocated after the last collection.
+last = None  # Heap allocated at the last safe point.
+safe_points = 0
+collections = 0
+releases = 0
+total_us = 0  # Collections time.
+max_us = 0
+
+def register(function, args=()):
+    """Registers a cache release function.
+
+    Params:
+        function(obj)
+        args(tuple)
+    """
+    with lock:
+        caches.append((function, args))
+
+def release():
+    """Releases the registered caches."""
+    global releases
+    releases += 1
+    for function, args in caches:
+        try:
+            function(*args)
+        except Exception:
+            pass
+
+def collect():
+    """Collects and times the collection."""
+    global collections, total_us, max_us, baseline
+    t0 = utime.ticks_us()
+    gc.collect()
+    us = utime.ticks_diff(utime.ticks_us(), t0)
+    with lock:
+        collections += 1
+        total_us += us
+        max_us = max(max_us, us)
+        baseline = gc.mem_alloc()
+
+def _fits(size):
+    """Checks if a buffer can be allocated.
+
+    Params:
+        size(int): bytes
+    Returns:
+        True or False
+    """
+    try:
+        buf = bytearray(size)
+    except MemoryError:
+        return False
+    buf = None
+    return True
+
+def _tune():
+    """Sizes the gc threshold on the allocation rate and the free heap."""
+    global threshold
+    target = min(rate * constants.GC_CYCLES, gc.mem_free() * 3 // 4)
+    target = max(target, constants.GC_MIN_THRESHOLD)
+    if abs(target - threshold) > threshold // 8:  # Skips negligible changes.
+        gc.threshold(target)
+        threshold = target
+
+def safe_point(cycle=True):
+    """Collects if needed, to call with no task running.
+
+    Params:
+        cycle(bool): True at the end of a wake cycle, False between two
+            tasks, the allocation rate is left to the wake cycles
+    """
+    global rate, peak, last, safe_points
+    if not constants.GC_ADAPTIVE:
+        return
+    alloc = gc.mem_alloc()
+    if not cycle:
+        if threshold >= 0 and alloc - baseline + peak >= threshold:
+            collect()
+        return
+    if last is not None and alloc >= last:  # No automatic collection since.
+        rate = alloc - last if not rate else (3 * rate + alloc - last) // 4
+        peak = max(alloc - last, peak - peak // 8)
+    safe_points += 1
+    risk = safe_points % constants.GC_PROBE_INTERVAL == 0 and not _fits(constants.GC_LARGEST_MIN)
+    if risk:
+        import tools.utils as utils
+        utils.log_file("Heap fragmented, releasing caches", constants.LOG_LEVEL, level=utils.WARNING)
+        release()
+    if risk or threshold < 0 or alloc - baseline + peak >= threshold:
+        collect()
+    _tune()
+    last = gc.mem_alloc()
+
+def largest_block():
+    """Returns the largest allocatable block, probed in 1/8 steps from the
+    free heap down, allocation failures trigger a collection each: for the
+    menu only, with no task running, a probe may leave a task without memory.
+
+    Returns:
+        (int): bytes
+    """
+    collect()
+    size = gc.mem_free()
+    while size > 64 and not _fits(size):
+        size = size * 7 // 8
+    return size
+
+def stats():
+    """Returns the heap figures.
+
+    Returns:
+        (dict)
+    """
+    with lock:
+        return {
+            "free":gc.mem_free(),
+            "alloc":gc.mem_alloc(),
+            "threshold":threshold,
+            "rate":rate,
+            "collections":collections,
+            "total_us":total_us,
+            "max_us":max_us,
+            "releases":releases}
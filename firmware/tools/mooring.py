@@ -0,0 +1,226 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Mooring watch.
+
+Keeps the last MOORING_RING gps fixes in array rings as metres east and north
+of the anchor (the deployment position) and the fix time, and updates the
+drift figures at each fix, so that a breakaway check costs a few float
+operations instead of string parsing.
+
+Coordinates are kept as whole minutes (int) plus the minutes fraction (float),
+single precision floats lose about a metre on ddmm.mmmm values. Distances
+are equirectangular: a minute of latitude is a nautical mile and
+cos(anchor latitude) is computed once per anchor, the error against the
+haversine one stays under 0.1% within a few km of the anchor.
+
+A fix out of the "Watch_Radius" circle counts as outside, "Watch_Fixes"
+outside fixes in a row raise the breakaway alarm.
+
+Without a configured "Anchor" the first fix is the anchor, stored in
+ANCHOR_FILE and loaded from there after a reset, so that a buoy rebooting
+adrift doesn't anchor where it is. Delete the file when redeploying.
+"""
+
+import array
+import math
+import constants
+import tools.utils as utils
+
+NM = 1852.0  # m. A minute of latitude.
+HALF_TURN = 180 * 60  # Minutes of longitude.
+ANCHOR_FILE = constants.CONFIG_DIR + "/anchor.fix"
+
+"""Fix rings: metres east and north of the anchor, unix time."""
+ring_x = array.array("f", [0] * constants.MOORING_RING)
+ring_y = array.array("f", [0] * constants.MOORING_RING)
+ring_t = array.array("L", [0] * constants.MOORING_RING)
+head = 0  # Next slot.
+count = 0  # Fixes in the rings.
+
+configured = False
+anchor = None  # ((lat whole minutes, lat fraction), (lon whole minutes, lon fraction))
+kx = NM  # m per minute of longitude at the anchor.
+radius = 0  # m. Watch circle, 0 disables the alarm.
+radius2 = 0  # radius ** 2
+fixes = 3  # Outside fixes in a row raising the alarm.
+
+"""Drift figures."""
+samples = 0
+mean = 0.0  # m. Mean distance.
+m2 = 0.0  # Sum of squared deviations from the mean distance.
+peak = 0.0  # m. Farthest fix.
+speed_x = 0.0  # m/s. Smoothed drift velocity.
+speed_y = 0.0
+outside = 0  # Outside fixes in a row.
+alarm = False
+
+def parse(value, hemisphere):
+    """Converts a NMEA coordinate to minutes.
+
+    Params:
+        value(str): ddmm.mmmm or dddmm.mmmm
+        hemisphere(str): N, S, E or W
+    Returns:
+        (whole minutes(int), minutes fraction(float)), negative S or W
+    """
+    dot = value.find(".")
+    if dot < 0:
+        dot = len(value)
+    whole = int(value[:dot - 2]) * 60 + int(value[dot - 2:dot])
+    fraction = float("0" + value[dot:]) if dot < len(value) else 0.0
+    if hemisphere in ("S", "W"):
+        return (-whole, -fraction)
+    return (whole, fraction)
+
+def init(config):
+    """Sets the watch up from the gps config, once.
+
+    Params:
+        config(dict): "Anchor" (ddmm.mmmmN dddmm.mmmmE, the first fix if
+            empty), "Watch_Radius" (m, 0 disables the alarm) and "Watch_Fixes"
+    """
+    global configured, radius, radius2, fixes, anchor
+    configured = True
+    radius = float(config.get("Watch_Radius", 0))
+    radius2 = radius * radius
+    fixes = max(int(config.get("Watch_Fixes", 3)), 1)
+    position = config.get("Anchor", "").split()
+    if len(position) == 2:
+        set_anchor(parse(position[0][:-1], position[0][-1]), parse(position[1][:-1], position[1][-1]))
+    else:
+        anchor = None
+        _load()
+
+def _load():
+    """Reads the anchor learned before a reset."""
+    try:
+        with open(ANCHOR_FILE, "r") as file_:
+            fields = file_.read().split(",")
+        set_anchor((int(fields[0]), float(fields[1])), (int(fields[2]), float(fields[3])))
+    except:
+        pass
+
+def _store():
+    """Writes the learned anchor out to ANCHOR_FILE."""
+    try:
+        with open(ANCHOR_FILE, "w") as file_:
+            file_.write("{},{},{},{}".format(anchor[0][0], anchor[0][1], anchor[1][0], anchor[1][1]))
+    except:
+        utils.log_file("mooring => unable to store the anchor", constants.LOG_LEVEL, level=utils.WARNING)
+
+def set_anchor(lat, lon):
+    """Moves the anchor and restarts the watch.
+
+    Params:
+        lat(tuple): see :func:`parse`
+        lon(tuple)
+    """
+    global anchor, kx, head, count, samples, mean, m2, peak, speed_x, speed_y, outside, alarm
+    anchor = (lat, lon)
+    kx = NM * math.cos(math.radians((lat[0] + lat[1]) / 60))
+    head = count = samples = outside = 0
+    mean = m2 = peak = speed_x = speed_y = 0.0
+    alarm = False
+
+def fix(lat, lon, epoch):
+    """Adds a fix to the rings and updates the drift figures.
+
+    Params:
+        lat(tuple): see :func:`parse`
+        lon(tuple)
+        epoch(int): fix time
+    Returns:
+        distance(float): m from the anchor
+    """
+    global head, count, samples, mean, m2, peak, speed_x, speed_y, outside, alarm
+    if anchor is None:
+        set_anchor(lat, lon)
+        _store()
+    y = ((lat[0] - anchor[0][0]) + (lat[1] - anchor[0][1])) * NM
+    dlon = lon[0] - anchor[1][0]
+    if dlon > HALF_TURN:  # Across the antimeridian.
+        dlon -= 2 * HALF_TURN
+    elif dlon < -HALF_TURN:
+        dlon += 2 * HALF_TURN
+    x = (dlon + (lon[1] - anchor[1][1])) * kx
+    d2 = x * x + y * y
+    distance = math.sqrt(d2)
+    if count:
+        last = (head - 1) % len(ring_t)
+        dt = epoch - ring_t[last]
+        if dt > 0:
+            speed_x += ((x - ring_x[last]) / dt - speed_x) * constants.MOORING_ALPHA
+            speed_y += ((y - ring_y[last]) / dt - speed_y) * constants.MOORING_ALPHA
+    ring_x[head] = x
+    ring_y[head] = y
+    ring_t[head] = epoch
+    head = (head + 1) % len(ring_t)
+    count = min(count + 1, len(ring_t))
+    samples += 1
+    delta = distance - mean
+    mean += delta / samples
+    m2 += delta * (distance - mean)
+    if distance > peak:
+        peak = distance
+    if radius and d2 > radius2:
+        outside += 1
+        if outside == fixes:
+            alarm = True
+            utils.log_file("mooring => breakaway, {:.1f} m from the anchor".format(distance), constants.LOG_LEVEL, level=utils.WARNING)
+    else:
+        if alarm:
+            utils.log_file("mooring => back in the watch circle, {:.1f} m from the anchor".format(distance), constants.LOG_LEVEL)
+        outside = 0
+        alarm = False
+    return distance
+
+def last():
+    """Returns the last fix (x m, y m, unix time), None if no fixes."""
+    if not count:
+        return None
+    i = (head - 1) % len(ring_t)
+    return (ring_x[i], ring_y[i], ring_t[i])
+
+def distance():
+    """Returns the last fix distance (m) from the anchor, -1 if no fixes."""
+    item = last()
+    if item is None:
+        return -1
+    return math.sqrt(item[0] * item[0] + item[1] * item[1])
+
+def stats():
+    """Returns the drift figures.
+
+    Returns:
+        (dict): fixes, mean and std distance (m), peak (m), drift speed (m/s)
+        and heading (deg), outside fixes in a row and alarm
+    """
+    return {
+        "fixes":samples,
+        "mean":mean,
+        "std":math.sqrt(m2 / (samples - 1)) if samples > 1 else 0.0,
+        "peak":peak,
+        "speed":math.sqrt(speed_x * speed_x + speed_y * speed_y),
+        "heading":math.degrees(math.atan2(speed_x, speed_y)) % 360,
+        "outside":outside,
+        "alarm":alarm}
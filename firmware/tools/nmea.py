@@ -23,13 +23,24 @@
 import tools.utils as utils
 import constants
 
+"""Longest NMEA sentence, $ and checksum included, <CR><LF> excluded."""
+MAX_LENGTH = 82
+
 class NMEA(object):
+    """NMEA sentence parser.
+
+    The char by char parser collects the sentence in a preallocated buffer and
+    xors the checksum as chars come, the words list is built only once the
+    whole sentence is received.
+    """
 
     def __init__(self, *args, **kwargs):
-        self.new_sentence_flag = False
-        self.checksum_flag = False
+        self.nmea_buf = bytearray(MAX_LENGTH)
+        self.nmea_mv = memoryview(self.nmea_buf)
+        self.nmea_len = -1  # Bytes after $, -1 out of a sentence.
+        self.nmea_star = -1  # Checksum delimiter position, -1 if not yet received.
+        self.nmea_xor = 0
         self.checksum = ""
-        self.word = ""
         self.sentence = []
 
     def verify_checksum(self, checksum, sentence):
@@ -42,43 +53,104 @@ class NMEA(object):
         calculated_checksum = 0
         for char in ",".join(map(str, sentence)):
             calculated_checksum ^= ord(char)
+        return self._check(calculated_checksum, checksum)
+
+    def _check(self, calculated_checksum, checksum):
+        """Compares a calculated checksum with the received one.
+
+        Params:
+            calculated_checksum(int)
+            checksum(str): hex
+        Returns:
+            True or False
+        """
         if "{:02X}".format(calculated_checksum) != checksum:
-            utils.log_file("NMEA invalid checksum calculated: {:02X} got: {}".format(calculated_checksum, checksum), constants.LOG_LEVEL)
+            utils.log_file("NMEA invalid checksum calculated: {:02X} got: {}".format(calculated_checksum, checksum), constants.LOG_LEVEL, level=utils.WARNING)
             return False
-        else:
-            return True
+        return True
 
     def get_sentence(self, char_code, sentence):
         """Gets a single NMEA sentence, each sentence is a list of words itself.
 
         Params:
             char_code(int)
+            sentence(str): the desired sentence type
+        Returns:
+            True if a valid ``sentence`` has been completed, False otherwise
+        """
+        if char_code < 32 or char_code > 125:
+            return False
+        if char_code == 36:  # $
+            self.nmea_len = 0
+            self.nmea_star = -1
+            self.nmea_xor = 0
+            return False
+        if self.nmea_len < 0:
+            return False
+        if self.nmea_len == MAX_LENGTH:  # Drops an overlong sentence.
+            self.nmea_len = -1
+            return False
+        self.nmea_buf[self.nmea_len] = char_code
+        self.nmea_len += 1
+        if self.nmea_star < 0:
+            if char_code == 42:  # *
+                self.nmea_star = self.nmea_len - 1
+            else:
+                self.nmea_xor ^= char_code
+            return False
+        if self.nmea_len - self.nmea_star < 3:
+            return False
+        self.nmea_len = -1
+        try:
+            self.checksum = str(self.nmea_mv[self.nmea_star + 1:self.nmea_star + 3], "utf-8")
+            self.sentence = str(self.nmea_mv[:self.nmea_star], "utf-8").split(",")
+        except UnicodeError:
+            return False
+        if self._check(self.nmea_xor, self.checksum):
+            if sentence and self.sentence[0][-3:] == sentence:
+                return True
+        return False
+
+    def feed(self, data, sentence):
+        """Passes a chunk of bytes to :func:`get_sentence` up to the end of
+        the first valid ``sentence``.
+
+        Params:
+            data(memoryview): e.g. a slice of a burst read buffer
+            sentence(str): the desired sentence type
+        Returns:
+            count(int): bytes consumed by the valid ``sentence``, -1 if the
+            whole chunk has been consumed without completing one
         """
-        if char_code in range(32, 126):
-            ascii_char = chr(char_code)
-            if ascii_char == "$":
-                self.new_sentence_flag = True
-                self.word = ""
-                self.sentence = []
-                self.checksum = ""
-                self.checksum_flag = False
-            elif ascii_char == ",":
-                if self.new_sentence_flag:
-                    self.sentence.append(self.word)
-                    self.word = ""
-            elif ascii_char == "*":
-                if self.new_sentence_flag:
-                    self.sentence.append(self.word)
-                    self.checksum_flag = True
-            elif self.new_sentence_flag:
-                if self.checksum_flag:
-                    self.checksum = self.checksum + ascii_char
-                    if len(self.checksum) == 2:
-                        if self.verify_checksum(self.checksum, self.sentence):
-                            if sentence and self.sentence[0][-3:] == sentence:
-                                return True
-                else:
-                    self.word = self.word + ascii_char
+        for i in range(len(data)):
+            if self.get_sentence(data[i], sentence):
+                return i + 1
+        return -1
+
+    def parse(self, line, sentence=None):
+        """Parses a whole NMEA line, as returned by :func:`device.DEVICE.read_line`.
+
+        Params:
+            line(bytes)
+            sentence(str): the desired sentence type
+        Returns:
+            True if a valid ``sentence`` has been parsed, False otherwise
+        """
+        start = line.find(b"$")
+        end = line.find(b"*", start + 1)
+        if start < 0 or end < 0 or len(line) < end + 3:
+            return False
+        calculated_checksum = 0
+        for i in range(start + 1, end):
+            calculated_checksum ^= line[i]
+        try:
+            self.checksum = line[end + 1:end + 3].decode("utf-8")
+            self.sentence = line[start + 1:end].decode("utf-8").split(",")
+        except UnicodeError:
+            return False
+        if self._check(calculated_checksum, self.checksum):
+            if sentence and self.sentence[0][-3:] == sentence:
+                return True
         return False
 
     def fixed(self):
@@ -0,0 +1,184 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Bounded worker pool, runs the scheduled device tasks."""
+
+import utime
+import constants
+import _thread
+import tools.utils as utils
+import tools.memory as memory
+
+class POOL(object):
+    """Creates a fixed size pool of worker threads fed by a run queue.
+
+    Devices configured with ``"Async":0`` are serialized, only one of them runs
+    at a time, all the others run in parallel up to the pool size.
+
+    A worker stuck in an overrun task is replaced, up to WORKER_SPARES of them
+    at a time, and its device isn't queued again until the task returns.
+
+    Params:
+        size(int): number of worker threads
+        stack_size(int): worker thread stack size (bytes)
+    """
+
+    def __init__(self, size=constants.WORKERS, stack_size=8 * 1024):
+        self.queue = []  # [[device, tasks, queued, deadline], ...]
+        self.running = {}  # {device:serialized,...}
+        self.serialized = False  # A serialized device is running.
+        self.modes = {}  # {device:async,...}
+        self.peak = 0  # Max concurrent jobs.
+        self.max_latency = 0  # Max seconds spent in queue.
+        self.abandoned = {}  # {device:replaced,...} Overrun jobs, replaced workers exit on return.
+        self.spares = 0  # Replacement workers running.
+        self.refused = 0  # Jobs of abandoned devices not queued.
+        self.lock = _thread.allocate_lock()  # Guards queue and running jobs.
+        self.ready = _thread.allocate_lock()  # Released to wake up a worker.
+        self.ready.acquire()
+        _thread.stack_size(stack_size)  # Icreases thread stack size to avoid RuntimeError: maximum recursion depth exceeded
+        for _ in range(size):
+            _thread.start_new_thread(self._worker, ())
+
+    def submit(self, device, tasks, timeout=constants.DATA_ACQUISITION_INTERVAL):
+        """Queues the device tasks.
+
+        Params:
+            device(str)
+            tasks(list)
+            timeout(int): seconds the job may wait in queue before being dropped
+        Returns:
+            False if the device still runs an abandoned job, True otherwise
+        """
+        now = utime.time()
+        with self.lock:
+            if device in self.abandoned:
+                self.refused += 1
+                utils.log_file("{} => still running an overrun task, skipped".format(device), constants.LOG_LEVEL, level=utils.WARNING)
+                return False
+            self.queue.append([device, tasks, now, now + timeout])
+            self._signal()
+        return True
+
+    def idle(self):
+        """Returns True if no jobs are queued or running."""
+        with self.lock:
+            return not self.queue and not self.running
+
+    def abandon(self, device):
+        """Stops waiting for an overrun job, a new worker replaces the one
+        still running it unless WORKER_SPARES are already running.
+
+        Params:
+            device(str)
+        """
+        with self.lock:
+            if device not in self.running:
+                return
+            if self.running.pop(device):
+                self.serialized = False
+            replaced = self.spares < constants.WORKER_SPARES
+            self.abandoned[device] = replaced
+            if replaced:
+                self.spares += 1
+            self._signal()
+        if replaced:
+            _thread.start_new_thread(self._worker, ())
+
+    def _async(self, device):
+        """Returns the device Async config flag, 1 if undefined.
+
+        Params:
+            device(str)
+        """
+        if device not in self.modes:
+            try:
+                module, obj = device.split(".")
+                cls, instance = obj.split("_")
+                self.modes[device] = utils.read_config(module + "." + constants.CONFIG_TYPE)[cls][instance]["Async"]
+            except:
+                self.modes[device] = 1
+        return self.modes[device]
+
+    def _runnable(self, job):
+        """Checks if a queued job may start."""
+        if job[0] in self.running or job[0] in self.abandoned:
+            return False
+        return self._async(job[0]) or not self.serialized
+
+    def _signal(self):
+        """Wakes up a worker if a queued job may start, call with lock held."""
+        if self.ready.locked():
+            for job in self.queue:
+                if self._runnable(job):
+                    self.ready.release()
+                    return
+
+    def _pop(self):
+        """Removes the first runnable job from the queue, drops expired jobs.
+
+        Returns:
+            job(list) or None
+        """
+        now = utime.time()
+        with self.lock:
+            for job in self.queue[:]:
+                if now > job[3]:
+                    self.queue.remove(job)
+                    utils.log_file("{} => dropped, waited {} s".format(job[0], now - job[2]), constants.LOG_LEVEL, level=utils.WARNING)
+                elif self._runnable(job):
+                    self.queue.remove(job)
+                    serialized = not self._async(job[0])
+                    self.running[job[0]] = serialized
+                    self.serialized = self.serialized or serialized
+                    self.peak = max(self.peak, len(self.running))
+                    self.max_latency = max(self.max_latency, now - job[2])
+                    self._signal()
+                    return job
+        return
+
+    def _worker(self):
+        """Runs queued jobs, sleeps on the ready lock in between."""
+        while True:
+            self.ready.acquire()
+            job = self._pop()
+            if not job:
+                continue
+            try:
+                utils.execute(job[0], job[1])
+            except Exception as err:
+                utils.log_file("{} => {}".format(job[0], err), constants.LOG_LEVEL, level=utils.ERROR)
+            with self.lock:
+                if job[0] in self.abandoned:
+                    if self.abandoned.pop(job[0]):  # Replaced by a new worker.
+                        self.spares -= 1
+                        return
+                elif self.running.pop(job[0]):
+                    self.serialized = False
+                idle = not self.running
+                if not idle:
+                    self._signal()
+            if idle:
+                memory.safe_point(cycle=False)  # Collects between tasks, before the next one starts.
+                with self.lock:
+                    self._signal()
+            utils.wakeup.set()  # Lets the main loop check for sleep.
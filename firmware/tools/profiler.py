@@ -0,0 +1,172 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Awake time profiler.
+
+Times code sites with ticks_us, count, total and max time of each site are
+aggregated in a fixed size table, the awake time of each wake cycle goes to
+the "awake" site.
+
+    @profiler.profiled("GPS.main")
+    def main(self):
+        ...
+
+    t0 = profiler.start()
+    ...
+    profiler.stop("site", t0)
+
+Disabled (constants.PROFILER = 0) the decorator returns the function as it
+is and start() returns None, which makes stop() return at once.
+"""
+
+import array
+import utime
+import constants
+import _thread
+
+lock = _thread.allocate_lock()
+
+"""Site names, the table index of each site is its list index."""
+names = ["awake"]
+
+counts = array.array("L", [0] * constants.PROFILER_SITES)
+totals = array.array("Q", [0] * constants.PROFILER_SITES)  # us.
+maxs = array.array("L", [0] * constants.PROFILER_SITES)  # us.
+
+cycle = utime.ticks_us()  # Wake cycle start.
+logged = utime.time()  # Last table log.
+
+def index(site):
+    """Returns the table index of a site, adds the site if missing, sites in
+    excess share the last slot.
+
+    Params:
+        site(str)
+    Returns:
+        (int)
+    """
+    with lock:
+        if site in names:
+            return names.index(site)
+        if len(names) < constants.PROFILER_SITES - 1:
+            names.append(site)
+            return len(names) - 1
+        if len(names) < constants.PROFILER_SITES:
+            names.append("other")
+        return constants.PROFILER_SITES - 1
+
+def record(i, t0):
+    """Adds the time elapsed since t0 to a site.
+
+    Params:
+        i(int): table index
+        t0(int): ticks_us
+    """
+    us = utime.ticks_diff(utime.ticks_us(), t0)
+    with lock:
+        counts[i] += 1
+        totals[i] += us
+        if us > maxs[i]:
+            maxs[i] = us
+
+def profiled(site):
+    """Decorator timing each call of a function.
+
+    Params:
+        site(str)
+    """
+    def decorator(function):
+        if not constants.PROFILER:
+            return function
+        i = index(site)
+        def wrapper(*args, **kwargs):
+            t0 = utime.ticks_us()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(i, t0)
+        return wrapper
+    return decorator
+
+def start():
+    """Returns the ticks_us to pass to :func:`stop`, None if disabled."""
+    if constants.PROFILER:
+        return utime.ticks_us()
+
+def stop(site, t0):
+    """Adds the time elapsed since :func:`start` to a site.
+
+    Params:
+        site(str)
+        t0(int): returned by :func:`start`
+    """
+    if t0 is not None:
+        record(index(site), t0)
+
+def wake():
+    """Opens a wake cycle, to call at wakeup from sleep."""
+    global cycle
+    if constants.PROFILER:
+        cycle = utime.ticks_us()
+
+def sleep(now):
+    """Closes the wake cycle, to call before sleep, logs the table every
+    PROFILER_INTERVAL seconds.
+
+    Params:
+        now(int): timestamp
+    """
+    global logged
+    if not constants.PROFILER:
+        return
+    record(0, cycle)
+    if now - logged >= constants.PROFILER_INTERVAL:
+        logged = now
+        log()
+
+def table():
+    """Returns a copy of the table.
+
+    Returns:
+        [(site, count, total_us, max_us),...]
+    """
+    with lock:
+        return [(names[i], counts[i], totals[i], maxs[i]) for i in range(len(names))]
+
+def log():
+    """Appends the table to the data file, to be sent along with the data.
+
+    $PROF,unix epoch,site,count,total_us,max_us,site,...
+    """
+    import tools.utils as utils
+    row = ["$PROF", utils.unix_epoch(utime.time())]
+    for site in table():
+        row.extend(map(str, site))
+    utils.log_data(constants.DATA_SEPARATOR.join(row))
+
+def reset():
+    """Clears the table."""
+    with lock:
+        for i in range(constants.PROFILER_SITES):
+            counts[i] = 0
+            totals[i] = 0
+            maxs[i] = 0
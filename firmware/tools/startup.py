@@ -0,0 +1,193 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Device start-up orchestrator.
+
+Devices sharing a uart start up one after the other, devices on different
+uarts start up concurrently. Each start-up has a deadline (the device
+"Startup_Timeout" or STARTUP_TIMEOUT), a device failing or missing its
+deadline is marked DEGRADED, the scheduler retries it every STARTUP_RETRY
+seconds. A start-up still running past its deadline can't be killed, its
+:mod:`tools.supervisor` token is cancelled and the device isn't retried until
+it returns.
+"""
+
+import utime
+import uselect
+import constants
+import _thread
+import tools.utils as utils
+import tools.supervisor as supervisor
+
+lock = _thread.allocate_lock()
+
+"""Devices waited for {device:[device, next devices of its group,...],...}."""
+pending = {}
+
+"""Start-up start ticks {device:ticks_ms,...}."""
+started = {}
+
+"""Devices whose start-up hasn't returned yet."""
+busy = []
+
+boot_ms = None  # Boot to scheduler ready time.
+
+def _bus(device):
+    """Returns the uart bus of a device, the device name if it has none.
+
+    Params:
+        device(str)
+    """
+    return constants.UARTS.get(constants.DEVICES.get(device.split(".")[1]), device)
+
+def _timeout(device):
+    """Returns the device start-up deadline (s).
+
+    Params:
+        device(str)
+    """
+    try:
+        module, obj = device.split(".")
+        cls, instance = obj.split("_")
+        return int(utils.read_config(module + "." + constants.CONFIG_TYPE)[cls][instance].get("Startup_Timeout", constants.STARTUP_TIMEOUT))
+    except:
+        return constants.STARTUP_TIMEOUT
+
+def _degrade(device, reason):
+    """Marks a device degraded, call with lock held.
+
+    Params:
+        device(str)
+        reason(str)
+    """
+    pending.pop(device, None)
+    supervisor.cancel(device)  # Stops a hung start-up at its next check.
+    utils.status_table[device] = 3
+    utils.log_file("{} => {} ({})".format(device, constants.DEVICE_STATUS[3], reason), constants.LOG_LEVEL, level=utils.WARNING)
+
+def _start_up(group, done):
+    """Starts up a group of devices sharing a uart.
+
+    Params:
+        group(list)
+        done(obj): :class:`tools.utils.FLAG` set at each start-up end
+    """
+    for device in group:
+        with lock:
+            if device not in pending:  # Given up, a previous device hung.
+                return
+            started[device] = utime.ticks_ms()
+            busy.append(device)
+        result = False
+        token = supervisor.start(device, _timeout(device), False)  # Deadline enforced by run().
+        try:
+            result = utils.create_device(device).start_up()
+        except ImportError:
+            result = None
+        except Exception as err:
+            utils.log_file("{} => {}".format(device, err), constants.LOG_LEVEL, level=utils.ERROR)
+        supervisor.stop(device, token)
+        with lock:
+            busy.remove(device)
+            elapsed = utime.ticks_diff(utime.ticks_ms(), started[device])
+            if result is None:  # Driver unavailable, as if not configured.
+                pending.pop(device, None)
+                utils.status_table.pop(device, None)
+            elif not result:
+                _degrade(device, "start up failed")
+            elif device in pending:
+                pending.pop(device)
+                utils.log_file("{} => started up in {} ms".format(device, elapsed), constants.LOG_LEVEL)
+            else:  # Degraded again, init_power() set its power status, next retry should be quick.
+                utils.status_table[device] = 3
+                utils.log_file("{} => started up late in {} ms".format(device, elapsed), constants.LOG_LEVEL, level=utils.WARNING)
+        done.set()
+
+def run(devices):
+    """Starts up devices, returns when all of them are started up or
+    degraded.
+
+    Params:
+        devices(list)
+    """
+    groups = {}
+    with lock:
+        for device in devices:
+            if device in busy:
+                utils.log_file("{} => start up still running, not retried".format(device), constants.LOG_LEVEL)
+                continue
+            groups.setdefault(_bus(device), []).append(device)
+        for group in groups.values():
+            for i in range(len(group)):
+                pending[group[i]] = group[i:]
+    if not groups:
+        return
+    with utils.processes_access_lock:
+        utils.processes.append(_thread.get_ident())  # Keeps the board awake.
+    timeouts = {}
+    for device in pending:
+        timeouts[device] = _timeout(device) * 1000
+    done = utils.FLAG()
+    poll = uselect.poll()
+    poll.register(done, uselect.POLLIN)
+    _thread.stack_size(8 * 1024)  # Icreases thread stack size to avoid RuntimeError: maximum recursion depth exceeded
+    for group in groups.values():
+        _thread.start_new_thread(_start_up, (group, done))
+    while True:
+        wait = None  # ms. Till the first start-up deadline.
+        with lock:
+            now = utime.ticks_ms()
+            for device in list(pending):
+                if device in pending and device in started and device in busy:
+                    left = timeouts[device] - utime.ticks_diff(now, started[device])
+                    if left < 0:
+                        for queued in pending[device]:
+                            if queued in pending:
+                                _degrade(queued, "start up timeout" if queued == device else "waiting for {}".format(device))
+                    else:
+                        wait = left + 1 if wait is None else min(wait, left + 1)
+            if not [device for device in devices if device in pending]:
+                break
+        if poll.poll(100 if wait is None else wait):  # Blocks until a start-up ends or the first deadline, 100 ms until the threads record their start.
+            done.clear()
+    with utils.processes_access_lock:
+        utils.processes.remove(_thread.get_ident())
+    utils.wakeup.set()
+
+def retry(device):
+    """Retries a degraded device start-up in background.
+
+    Params:
+        device(str)
+    """
+    utils.log_file("{} => retrying start up...".format(device), constants.LOG_LEVEL)
+    _thread.start_new_thread(run, ([device],))
+
+def ready(t0):
+    """Records the boot time, to call once the scheduler is ready.
+
+    Params:
+        t0(int): ticks_ms at boot
+    """
+    global boot_ms
+    boot_ms = utime.ticks_diff(utime.ticks_ms(), t0)
+    utils.log_file("Boot time {} ms".format(boot_ms), constants.LOG_LEVEL)
@@ -0,0 +1,190 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Task supervisor.
+
+Every device task gets a :class:`TOKEN` holding a ticks_ms deadline: the
+device "Task_Timeout" or its sampling window (Samples // Sample_Rate) plus
+TASK_MARGIN, THREAD_TIMEOUT at most. Drivers check
+:func:`device.DEVICE.cancelled` in their loops and the read deadlines given by
+:func:`device.DEVICE.deadline` never go past the task one.
+
+A task still running TASK_GRACE ms past its deadline is overrun:
+:func:`check`, called by the main loop, cancels its token, powers the device
+off, logs and counts the overrun, and stops keeping the board awake for it.
+Threads can't be killed, an overrun task runs on until its next check.
+"""
+
+import utime
+import constants
+import _thread
+
+lock = _thread.allocate_lock()
+
+"""Running tasks {device:token,...}."""
+tokens = {}
+
+"""Task figures {device:[runs, overruns, max ms],...}."""
+stats = {}
+
+class TOKEN(object):
+    """Creates a cancellation token.
+
+    Params:
+        timeout(int): ms
+        enforce(bool): overrun checked by :func:`check`
+    """
+
+    def __init__(self, timeout, enforce=True):
+        self.ident = _thread.get_ident()
+        self.start = utime.ticks_ms()
+        self.deadline = utime.ticks_add(self.start, timeout)
+        self.enforce = enforce
+        self.cancelled = False
+
+    def expired(self):
+        """Returns True if cancelled or past the deadline."""
+        return self.cancelled or utime.ticks_diff(self.deadline, utime.ticks_ms()) <= 0
+
+def timeout(device):
+    """Returns the device task deadline (s).
+
+    Params:
+        device(str)
+    """
+    import tools.utils as utils
+    try:
+        module, obj = device.split(".")
+        cls, instance = obj.split("_")
+        config = utils.read_config(module + "." + constants.CONFIG_TYPE)[cls][instance]
+        if "Task_Timeout" in config:
+            return int(config["Task_Timeout"])
+        return min(config["Samples"] // config["Sample_Rate"] + constants.TASK_MARGIN, constants.THREAD_TIMEOUT)
+    except:
+        return constants.THREAD_TIMEOUT
+
+def start(device, seconds=None, enforce=True):
+    """Starts supervising a task of the calling thread.
+
+    Params:
+        device(str)
+        seconds(int): deadline, default :func:`timeout`
+        enforce(bool): overrun checked by :func:`check`
+    Returns:
+        token(obj)
+    """
+    if seconds is None:
+        seconds = timeout(device)
+    token = TOKEN(seconds * 1000, enforce)
+    with lock:
+        tokens[device] = token
+        stats.setdefault(device, [0, 0, 0])
+    return token
+
+def stop(device, token):
+    """Ends a task supervision, records its figures.
+
+    Params:
+        device(str)
+        token(obj)
+    """
+    with lock:
+        if tokens.get(device) is token:
+            tokens.pop(device)
+        ms = utime.ticks_diff(utime.ticks_ms(), token.start)
+        stats[device][0] += 1
+        stats[device][2] = max(stats[device][2], ms)
+
+def token(device):
+    """Returns the running task token of a device, None if idle.
+
+    Params:
+        device(str)
+    """
+    return tokens.get(device)
+
+def cancelled(device):
+    """Returns True if the device task must return.
+
+    Params:
+        device(str)
+    """
+    token = tokens.get(device)
+    return token is not None and token.expired()
+
+def cancel(device):
+    """Cancels the device task.
+
+    Params:
+        device(str)
+    """
+    token = tokens.get(device)
+    if token:
+        token.cancelled = True
+
+def remain():
+    """Returns the ms before the next overrun check, None if no task is
+    supervised."""
+    with lock:
+        now = utime.ticks_ms()
+        remains = [utime.ticks_diff(token.deadline, now) + constants.TASK_GRACE for token in tokens.values() if token.enforce]
+    if remains:
+        return max(min(remains), 0)
+    return None
+
+def check():
+    """Handles the overrun tasks.
+
+    Returns:
+        [device,...] overrun devices
+    """
+    import tools.utils as utils
+    overrun = []
+    with lock:
+        now = utime.ticks_ms()
+        for device in list(tokens):
+            token = tokens[device]
+            if token.enforce and utime.ticks_diff(now, token.deadline) >= constants.TASK_GRACE:
+                token.cancelled = True
+                tokens.pop(device)
+                stats[device][1] += 1
+                overrun.append((device, token))
+    for device, token in overrun:
+        utils.log_file("{} => overrun by {} ms, powering off".format(device, utime.ticks_diff(utime.ticks_ms(), token.deadline)), constants.LOG_LEVEL, level=utils.ERROR)
+        with utils.processes_access_lock:
+            for process in (token.ident, device):  # Thread or uasyncio task.
+                if process in utils.processes:
+                    utils.processes.remove(process)  # Lets the board sleep.
+        try:
+            utils.create_device(device, tasks=["off"])
+        except Exception as err:
+            utils.log_file("{} => {}".format(device, err), constants.LOG_LEVEL, level=utils.ERROR)
+    return [device for device, token in overrun]
+
+def table():
+    """Returns the task figures.
+
+    Returns:
+        [(device, runs, overruns, max ms),...]
+    """
+    with lock:
+        return [(device, stats[device][0], stats[device][1], stats[device][2]) for device in stats]
@@ -23,9 +23,16 @@
 import pyb
 import ujson
 import uos
+import uio
 import utime
 import constants
 import _thread
+import tools.profiler as profiler
+import tools.imports as imports
+import tools.supervisor as supervisor
+import tools.memory as memory
+import tools.logger as logger
+from tools.logger import DEBUG, INFO, WARNING, ERROR
 
 """Creates a lock to handling data file secure."""
 file_lock = _thread.allocate_lock()
@@ -36,6 +43,27 @@ processes_access_lock = _thread.allocate_lock()
 """List of active processes."""
 processes = []
 
+class FLAG(uio.IOBase):
+    """Pollable flag, as uasyncio.ThreadSafeFlag: set by threads and interrupt
+    handlers, it wakes up a uselect.poll() waiting on it."""
+
+    def __init__(self):
+        self.state = 0
+
+    def ioctl(self, req, flags):
+        if req == 3:  # MP_STREAM_POLL
+            return self.state * flags
+        return None
+
+    def set(self):
+        self.state = 1
+
+    def clear(self):
+        self.state = 0
+
+"""Wakes up the main loop when a task ends."""
+wakeup = FLAG()
+
 """Contains pairs device:status."""
 status_table = {}
 
@@ -54,7 +82,7 @@ def read_config(file, path=constants.CONFIG_DIR):
         with open(path + "/" + file) as file_:
             return ujson.load(file_)
     except:
-        log_file("Unable to read file {}".format(file), constants.LOG_LEVEL)
+        log_file("Unable to read file {}".format(file), constants.LOG_LEVEL, level=ERROR)
         return None
 
 def unix_epoch(epoch):
@@ -115,23 +143,27 @@ def time_display(timestamp):
         timestring.append(str(secs) + """)
     return " ".join(timestring)
 
-def log_file(data_string, mode=0, new_line=True):
+def log_file(data_string, mode=0, new_line=True, level=INFO):
     """Creates a log and prints a messagge on screen.
 
     Params:
         data_string(str): message
         mode(int): 0 print, 1 save, 2 print & save
         new_line(bool): if False overwrites messages
+        level(int): DEBUG, INFO, WARNING or ERROR, not saved under
+            LOG_THRESHOLD, not printed under CONSOLE_THRESHOLD
     """
-    log_string = time_string(utime.time()) + "\t" + data_string
+    saved = constants.LOG_LEVEL != 0 and logger.enabled(level)
+    printed = level >= constants.CONSOLE_THRESHOLD
+    if not saved and not printed:  # Skips the stamp.
+        return
+    log_string = logger.stamp() + "\t" + data_string
     end_char = " "
     if new_line:
         end_char = "\n"
-    if constants.LOG_LEVEL == 0:
-        print(log_string, end=end_char)
-    else:
-        with open("Log.txt", "a") as file_:
-            file_.write(log_string + end_char)
+    if saved:
+        logger.write(log_string + end_char, level)  # Buffered, see tools.logger.
+    if printed:
         print(log_string, end=end_char)
 
 def _make_data_dir(dir):
@@ -148,7 +180,7 @@ def _make_data_dir(dir):
             try:
                 uos.mkdir(dir + sep + dir_list[i+1])  # creates directory
             except:
-                log_file("Unable to create directory {}".format(dir + sep + dir_list[i+1]), constants.LOG_LEVEL)
+                log_file("Unable to create directory {}".format(dir + sep + dir_list[i+1]), constants.LOG_LEVEL, level=ERROR)
                 return False
         dir = dir + sep + dir_list[i+1]  # changes dir
     return True
@@ -199,6 +231,7 @@ def too_old(file):
         return True
     return False
 
+@profiler.profiled("files_to_send")
 def files_to_send():
     """Checks for files to send."""
     global unsent_files
@@ -219,6 +252,7 @@ def files_to_send():
         return True
     return False
 
+@profiler.profiled("log_data")
 def log_data(data):
     """Appends device samples to data log file.
 
@@ -231,10 +265,10 @@ def log_data(data):
     try:
         file = _get_data_dir() + "/" + eval(constants.DATA_FILE_NAME)
         with open(file, "a") as data_file:  # append row to existing file
-            log_file("Writing out to file {} => {}".format(file, data), constants.LOG_LEVEL)
+            log_file("Writing out to file {} => {}".format(file, data), constants.LOG_LEVEL, level=DEBUG)
             data_file.write(data + "\r\n")
     except:
-        log_file("Unable to write out to file {}".format(eval(constants.DATA_FILE_NAME)), constants.LOG_LEVEL)
+        log_file("Unable to write out to file {}".format(eval(constants.DATA_FILE_NAME)), constants.LOG_LEVEL, level=ERROR)
     file_lock.release()
 
 def verbose(msg, enable=True):
@@ -261,7 +295,8 @@ def create_device(*args, **kwargs):
     ls = ",".join(ls)
     if ls:
         ls = "," + ls
-    exec("import " + args[0].split(".")[0] + " as " + args[0].split(".")[0], globals())  # Imports the module.
+    imports.load(args[0].split(".")[0])  # Imports the driver at first use, records its cost.
+    exec("import " + args[0].split(".")[0] + " as " + args[0].split(".")[0], globals())  # Binds the module.
     exec(args[0] + "=" + args[0].split(".")[0] + "." + args[0].split(".")[1].split("_")[0] + "(\"" + args[0].split(".")[1].split("_")[1] + "\"" + ls + ")", globals())  # Creates the object.
     return eval(args[0])
 
@@ -280,8 +315,89 @@ def execute(device, tasks):
     if processes_access_lock.acquire(1, timeout):
         processes.append(_thread.get_ident())
         processes_access_lock.release()
-        create_device(device, tasks=tasks)
+        token = supervisor.start(device)
+        t0 = profiler.start()
+        try:
+            create_device(device, tasks=tasks)
+        finally:  # A failing task mustn't keep the board awake.
+            profiler.stop(device, t0)
+            supervisor.stop(device, token)
+            if processes_access_lock.acquire(1, timeout):
+                if _thread.get_ident() in processes:  # Not if overrun.
+                    processes.remove(_thread.get_ident())
+                processes_access_lock.release()
+            wakeup.set()
+    return
+
+def driver(device):
+    """Returns the driver class of a device, imported at first use.
+
+    Params:
+        device(str): module.CLASS_instance
+    """
+    return getattr(imports.load(device.split(".")[0]), device.split(".")[1].split("_")[0])
+
+async def athread(function, args):
+    """Runs a blocking function in a thread and awaits its end, the event
+    loop runs meanwhile.
+
+    Params:
+        function(obj)
+        args(tuple)
+    """
+    import uasyncio
+    done = uasyncio.ThreadSafeFlag()
+    def run():
+        try:
+            function(*args)
+        finally:
+            done.set()
+    _thread.start_new_thread(run, ())
+    await done.wait()
+
+def _tasks(obj, tasks):
+    """Runs the device tasks after an acquisition."""
+    try:
+        for task in tasks:
+            if hasattr(obj, task):
+                getattr(obj, task)()
+    except Exception as err:
+        log_file("{} => {}".format(obj.name, err), constants.LOG_LEVEL, level=ERROR)
+
+async def aexecute(device, tasks):
+    """Coroutine version of :func:`execute`.
+
+    Awaits the device acquisition coroutine (amain) then runs the device tasks
+    in a thread, they may block (e.g. sync_rtc reads the gps). Devices without
+    an acquisition coroutine are executed by :func:`execute` in a thread.
+
+    Params:
+        device(str)
+        tasks(list)
+    """
+    global processes_access_lock, processes
+    if not hasattr(driver(device), "amain"):
+        await athread(execute, (device, tasks))
+        return
+    timeout = constants.DATA_ACQUISITION_INTERVAL
+    if processes_access_lock.acquire(1, timeout):
+        processes.append(device)
+        processes_access_lock.release()
+        token = supervisor.start(device)
+        t0 = profiler.start()
+        try:
+            obj = create_device(device)
+            if await obj.amain() and tasks:
+                await athread(_tasks, (obj, tasks))
+        except Exception as err:
+            log_file("{} => {}".format(device, err), constants.LOG_LEVEL, level=ERROR)
+        profiler.stop(device, t0)
+        supervisor.stop(device, token)
         if processes_access_lock.acquire(1, timeout):
-            processes.remove(_thread.get_ident())
+            if device in processes:  # Not if overrun.
+                processes.remove(device)
+            idle = not processes
             processes_access_lock.release()
+            if idle:
+                memory.safe_point(cycle=False)  # Collects between tasks.
     return
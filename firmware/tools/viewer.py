@@ -0,0 +1,185 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""File viewer.
+
+Shows files of any size (the log, the configs, the data files) with a
+constant memory use: blocks of VIEW_BLOCK bytes are read into a buffer
+allocated once and the lines are written out as they are found, a file is
+never read whole.
+
+- :func:`tail` reads backwards block by block from the end till it has
+  counted the lines, then writes them out.
+- :class:`PAGER` shows VIEW_LINES lines a page, the start offsets of the
+  last VIEW_INDEX pages are kept to page back, older pages are found by
+  reading backwards.
+- :func:`grep` streams the lines holding a pattern.
+
+Lines longer than a block are cut into block long lines.
+"""
+
+import array
+import constants
+
+buf = bytearray(constants.VIEW_BLOCK)
+mv = memoryview(buf)
+
+def _lines(file, offset, out, count=None, pattern=None):
+    """Writes out the lines from offset.
+
+    Params:
+        file(obj): opened "rb"
+        offset(int): line start
+        out(function): gets each line (memoryview), terminator included
+        count(int): lines to write, None all
+        pattern(bytes): writes only the lines holding it
+    Returns:
+        (offset after the last line read, lines written)
+    """
+    written = 0
+    while count is None or written < count:
+        file.seek(offset)
+        n = file.readinto(mv)
+        if not n:
+            break
+        block = bytes(mv[:n])  # find() is a bytes method.
+        start = 0
+        while count is None or written < count:
+            end = block.find(b"\n", start) + 1
+            if not end:
+                if start and n == len(buf):  # Line across blocks, read again from its start.
+                    break
+                end = n  # Last line, or cut if longer than a block.
+            if pattern is None or block.find(pattern, start, end) >= 0:
+                out(mv[start:end])
+                written += 1
+            start = end
+            if start == n:
+                break
+        offset += start
+    return offset, written
+
+def _back(file, offset, lines):
+    """Returns the start of the line the given lines before the one at offset.
+
+    Params:
+        file(obj): opened "rb"
+        offset(int): line start
+        lines(int)
+    """
+    count = 0
+    end = offset - 1  # The newline just before offset ends the previous line.
+    while end > 0 and count < lines:
+        start = max(end - len(buf), 0)
+        file.seek(start)
+        n = file.readinto(mv[:end - start])
+        block = bytes(mv[:n])
+        i = n
+        while True:
+            i = block.rfind(b"\n", 0, i)
+            if i < 0:
+                break
+            count += 1
+            if count == lines:
+                return start + i + 1
+        end = start
+    return 0 if count < lines else offset
+
+def tail(path, lines, out):
+    """Writes out the last lines of a file.
+
+    Params:
+        path(str)
+        lines(int)
+        out(function): gets each line (memoryview)
+    Returns:
+        lines written
+    """
+    with open(path, "rb") as file:
+        file.seek(0, 2)
+        return _lines(file, _back(file, file.tell(), lines), out)[1]
+
+def grep(path, pattern, out):
+    """Writes out the lines of a file holding pattern.
+
+    Params:
+        path(str)
+        pattern(bytes)
+        out(function): gets each line (memoryview)
+    Returns:
+        lines written
+    """
+    with open(path, "rb") as file:
+        return _lines(file, 0, out, pattern=pattern)[1]
+
+class PAGER(object):
+    """Pages a file forward and back.
+
+    Params:
+        path(str)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index = array.array("L", [0] * constants.VIEW_INDEX)  # Page start offsets ring.
+        self.page = -1  # Current page.
+        self.low = 0  # Oldest page in the index.
+        self.next = 0  # Offset after the current page.
+
+    def forward(self, out):
+        """Writes out the next page.
+
+        Params:
+            out(function): gets each line (memoryview)
+        Returns:
+            False at the end of file
+        """
+        with open(self.path, "rb") as file:
+            start = self.next
+            self.next, written = _lines(file, start, out, constants.VIEW_LINES)
+        if not written:
+            return False
+        self.page += 1
+        self.index[self.page % len(self.index)] = start
+        self.low = max(self.low, self.page - len(self.index) + 1)
+        return True
+
+    def back(self, out):
+        """Writes out the previous page.
+
+        Params:
+            out(function): gets each line (memoryview)
+        Returns:
+            False at the first page
+        """
+        if self.page <= 0:
+            return False
+        with open(self.path, "rb") as file:
+            if self.page - 1 >= self.low:
+                start = self.index[(self.page - 1) % len(self.index)]
+            else:  # Out of the index, found reading backwards.
+                start = _back(file, self.index[self.page % len(self.index)], constants.VIEW_LINES)
+                self.low = self.page - 1
+            self.page -= 1
+            self.index[self.page % len(self.index)] = start
+            self.next = _lines(file, start, out, constants.VIEW_LINES)[0]
+        return True
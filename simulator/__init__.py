@@ -0,0 +1,35 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Host side simulation of the buoy controller board.
+
+Runs the firmware unchanged on CPython: the fake pyb, machine, utime, uos,
+uselect and _thread modules in simulator/fakes run on a virtual clock, so a
+simulated day takes seconds. Scenario files (simulator/scenarios) set the
+start time, the sd card, the adc voltages and the bytes fed to each uart, see
+:mod:`simulator.peers`.
+
+    python3 -m simulator -d 86400 -r report.json
+
+The report gives the awake time, the bytes written to flash/sd and the host
+cpu time of each wake cycle, see :mod:`simulator.report`.
+"""
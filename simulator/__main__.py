@@ -0,0 +1,53 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Command line entry point, python3 -m simulator -h."""
+
+import argparse
+import json
+import os
+import sys
+from simulator.sim import SIM, SCENARIO
+
+def main():
+    parser = argparse.ArgumentParser(prog="python3 -m simulator", description="Runs the firmware on a simulated board.")
+    parser.add_argument("-f", "--firmware", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "firmware"), help="firmware dir")
+    parser.add_argument("-s", "--scenario", default=SCENARIO, help="scenario json file")
+    parser.add_argument("-d", "--duration", type=int, default=None, help="simulated seconds")
+    parser.add_argument("-w", "--workdir", default=None, help="work dir, temporary if omitted")
+    parser.add_argument("-r", "--report", default=None, help="writes summary and cycles to a json file")
+    parser.add_argument("-c", "--constant", action="append", default=[], metavar="NAME=VALUE", help="overrides a firmware constant, VALUE is json")
+    parser.add_argument("-v", "--verbose", action="store_true", help="shows the firmware output")
+    args = parser.parse_args()
+    constants = {}
+    for item in args.constant:
+        name, value = item.split("=", 1)
+        constants[name] = json.loads(value)
+    sim = SIM(args.firmware, os.path.abspath(args.scenario), args.workdir and os.path.abspath(args.workdir), args.duration, constants)
+    report = sim.run(quiet=not args.verbose)
+    report.show(sys.stdout)
+    print("{:<16}{}".format("workdir", sim.workdir))
+    if args.report:
+        report.dump(args.report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Host benchmark of the system health acquisition (firmware pyboard.py ADC).
+
+Runs the polled and the timed acquisitions on the fake adc, the battery
+channel dipping by BROWNOUT V for DIP ms every PERIOD ms as at each modem
+transmission. The acquisitions start STEP ms apart, at all the phases of the
+dips. Shows per acquisition the host cpu time and the virtual time, and over
+the acquisitions the battery mean, lowest and highest reading and the lowest
+in window minimum (timed only).
+
+The fake adc reads the polled samples at one instant, as the board does
+within a few ms, so a polled acquisition gives the level at its start:
+the full one, or the dip level if started in a dip. The timed one averages
+the PERIOD ms waveform, its mean is the true mean and its minimum catches
+the dip:
+
+    python3 -m simulator.adc [-n acquisitions]
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import os
+import time
+from simulator.sim import SIM, SCENARIO
+
+BATTERY = 2.6  # V at the adc pin.
+BROWNOUT = 0.4  # V
+DIP = 10  # ms
+PERIOD = 100  # ms
+STEP = 37  # ms. Between acquisitions, prime to PERIOD.
+
+def run(adc, kernel, timed, acquisitions):
+    """Times the acquisitions.
+
+    Returns:
+        host us, virtual ms per acquisition, [battery V,...], [window min V,...]
+    """
+    adc.config["Adc"]["Timed"] = timed
+    host = virtual = 0
+    levels = []
+    lows = []
+    for i in range(acquisitions):
+        kernel.sleep_us(STEP * 1000)
+        start = time.process_time()
+        us = kernel.us
+        adc.main()
+        host += time.process_time() - start
+        virtual += kernel.us - us
+        levels.append(float(adc.data[4]))
+        if timed:
+            lows.append(float(adc.data[11]))
+    return host * 1e6 / acquisitions, virtual / 1000 / acquisitions, levels, lows
+
+def main():
+    parser = argparse.ArgumentParser(prog="python3 -m simulator.adc", description="Benchmarks the polled and timed adc acquisitions.")
+    parser.add_argument("-f", "--firmware", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "firmware"), help="firmware dir")
+    parser.add_argument("-n", "--acquisitions", type=int, default=50, help="acquisitions per mode")
+    args = parser.parse_args()
+    sim = SIM(os.path.abspath(args.firmware), SCENARIO)
+    sim.adc = dict(sim.adc, Channels=dict(sim.adc.get("Channels", {}), **{"10":[BATTERY - BROWNOUT] * DIP + [BATTERY] * (PERIOD - DIP)}))
+    sim.install()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):  # Drops the logs.
+            adc = importlib.import_module("pyboard").ADC("1")
+        print("{:<8}{:>10}{:>10}{:>10}{:>10}{:>10}{:>10}".format("MODE", "HOST us", "VIRT ms", "MEAN V", "LOW V", "HIGH V", "WIN MIN V"))
+        full = 0
+        for name, timed in (("polled", 0), ("timed", 1)):
+            with contextlib.redirect_stdout(io.StringIO()):
+                us, ms, levels, lows = run(adc, sim.kernel, timed, args.acquisitions)
+            print("{:<8}{:>10.0f}{:>10.0f}{:>10.3f}{:>10.3f}{:>10.3f}{:>10}".format(name, us, ms, sum(levels) / len(levels), min(levels), max(levels),
+                "{:.3f}".format(min(lows)) if lows else "-"))
+            full = max(full, max(levels))
+        print("waveform mean {:.3f} V, in a dip {} ms of {}".format(full * (1 - BROWNOUT / BATTERY * DIP / PERIOD), DIP, PERIOD))
+    finally:
+        sim.uninstall()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Host run of the AQUADOPP start up (firmware dev_nortek.py) against a fake
+instrument.
+
+The instrument answers the break, RC, SC, GC, GA, CC, SD and FO commands at
+BAUD, keeps the deployment config uploaded by CC and accepts SD only if its
+ClockDeploy is in the future. BOOTS runs the start up on a new board, again
+after PAUSE s with the same deployment config, then after a deployment config
+change, and shows the bytes exchanged, the seconds taken, the commands sent and
+the measurement start:
+
+    python3 -m simulator.adcp [-f firmware]
+
+Exits with 1 if a measurement is not started at a future ClockDeploy.
+"""
+
+import argparse
+import calendar
+import contextlib
+import importlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from simulator.sim import SIM, SCENARIO
+from simulator.peers import SOURCE
+from simulator.kernel import INF
+
+BUS = 6  # configs/_dev_nortek.json
+BAUD = 9600
+ACK = b"\x06\x06"
+NAK = b"\x15\x15"
+PAUSE = 3600  # s between boots.
+"""(name, deployment config changed before the start up)."""
+BOOTS = (("first", False), ("same cfg", False), ("new cfg", True))
+
+def _checksum(data):
+    """Returns the structure checksum, as the firmware _calc_checksum."""
+    total = 0xb58c
+    for i in range(0, len(data) - 2, 2):
+        total += int.from_bytes(data[i:i+2], "little")
+    return (total % 65536).to_bytes(2, "little")
+
+def _struct(kind, size):
+    """Returns an empty config structure with its header and checksum."""
+    data = bytearray(size)
+    data[0:4] = bytes((0xa5, kind)) + (size // 2).to_bytes(2, "little")
+    data[-2:] = _checksum(data)
+    return bytes(data)
+
+def _bcd(epoch):
+    """Returns the mm ss DD hh YY MM clock words of an epoch."""
+    t = time.gmtime(epoch)
+    return bytes.fromhex("{:02d}{:02d}{:02d}{:02d}{:02d}{:02d}".format(t.tm_min, t.tm_sec, t.tm_mday, t.tm_hour, t.tm_year % 100, t.tm_mon))
+
+def _epoch(words):
+    """Returns the epoch of mm ss DD hh YY MM clock words, None if invalid."""
+    text = words.hex()
+    try:
+        return calendar.timegm(time.strptime("20{} {} {} {} {} {}".format(text[8:10], text[10:12], text[4:6], text[6:8], text[0:2], text[2:4]), "%Y %m %d %H %M %S"))
+    except ValueError:
+        return
+
+class INSTRUMENT(SOURCE):
+    """Fake AQUADOPP on its uart.
+
+    Params:
+        usr(bytes): deployment config in use
+    """
+
+    LENGTHS = {b"SC":8, b"CC":514, b"FO":6}  # Command bytes with parameters.
+
+    def __init__(self, usr):
+        SOURCE.__init__(self)
+        self.hw = _struct(0x05, 48)
+        self.head = _struct(0x04, 224)
+        self.usr = usr
+        self.buffer = b""
+        self.queue = []  # [[us, data],...]
+        self.tx = self.rx = 0  # Bytes written by the board, sent to the board.
+        self.commands = []
+        self.started = None  # (ClockDeploy epoch, SD epoch).
+
+    def received(self, data, now):
+        self.tx += len(data)
+        self.buffer += data
+        while self.buffer:
+            if self.buffer[:1] == b"@":
+                self.buffer = self.buffer[1:]
+                continue
+            if self.buffer.startswith(b"K1W%!Q"):
+                self.buffer = self.buffer[6:]
+                self._reply(ACK, now)
+                continue
+            command = self.buffer[:2]
+            size = self.LENGTHS.get(command, 2)
+            if len(self.buffer) < size:
+                break
+            params, self.buffer = self.buffer[2:size], self.buffer[size:]
+            self.commands.append(command.decode("latin-1"))
+            self._command(command, params, now)
+
+    def _command(self, command, params, now):
+        if command == b"RC":
+            self._reply(_bcd(self.epoch(now)) + ACK, now)
+        elif command == b"GC":
+            self._reply(self.usr + ACK, now)
+        elif command == b"GA":
+            self._reply(self.hw + self.head + self.usr + ACK, now)
+        elif command == b"CC":
+            if params[-2:] == _checksum(params):
+                self.usr = params
+                self._reply(ACK, now)
+            else:
+                self._reply(NAK, now)
+        elif command == b"SD":
+            deploy = _epoch(self.usr[48:54])
+            if deploy and deploy > self.epoch(now):
+                self.started = (deploy, self.epoch(now))
+                self._reply(ACK, now)
+            else:
+                self._reply(NAK, now)
+        elif command in (b"SC", b"FO"):
+            self._reply(ACK, now)
+        else:
+            self._reply(NAK, now)
+
+    def _reply(self, data, now):
+        """Queues a reply, sent at BAUD after 10 ms."""
+        self.rx += len(data)
+        self.queue.append([now + 10000 + len(data) * 10000000 // BAUD, data])
+
+    def pending(self, now):
+        chunks = []
+        while self.queue and self.queue[0][0] <= now:
+            chunks.append(self.queue.pop(0)[1])
+        return chunks
+
+    def next_at(self, now):
+        return max(self.queue[0][0], now) if self.queue else INF
+
+def boot(sim, instrument, rows):
+    """Runs the start ups in a simulated thread."""
+    utime = importlib.import_module("utime")
+    for name, changed in BOOTS:
+        pdc = os.path.join(sim.flash, "config", "adcp.pdc")
+        if changed:
+            with io.open(pdc, "r+b") as file_:
+                file_.seek(6)
+                blanking = int.from_bytes(file_.read(2), "little")
+                file_.seek(6)
+                file_.write((blanking + 1).to_bytes(2, "little"))
+        sys.modules.pop("dev_nortek", None)  # A new board run.
+        with contextlib.redirect_stdout(io.StringIO()):
+            cls = importlib.import_module("dev_nortek").AQUADOPP
+            dev = cls("1")
+        instrument.tx = instrument.rx = 0
+        instrument.started = None
+        del instrument.commands[:]
+        start = sim.kernel.us
+        with contextlib.redirect_stdout(io.StringIO()):
+            dev.start_up()
+        started = instrument.started
+        rows.append((name, instrument.tx, instrument.rx, (sim.kernel.us - start) / 1000000, " ".join(instrument.commands), started and started[0] - started[1]))
+        utime.sleep(PAUSE)
+
+def main():
+    parser = argparse.ArgumentParser(prog="python3 -m simulator.adcp", description="Runs the AQUADOPP start up against a fake instrument.")
+    parser.add_argument("-f", "--firmware", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "firmware"), help="firmware dir")
+    args = parser.parse_args()
+    with open(SCENARIO) as file_:
+        scenario = json.load(file_)
+    scenario["Configs"] = {"dev_nortek.json":"_dev_nortek.json"}
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as file_:
+        json.dump(scenario, file_)
+    sim = SIM(os.path.abspath(args.firmware), file_.name, duration=30 * 86400)
+    os.unlink(file_.name)
+    sim.install()
+    os.makedirs(os.path.join(sim.flash, "config"), exist_ok=True)
+    with io.open(os.path.join(sim.flash, "configs", "_dev_nortek.pdc"), "rb") as file_:
+        usr = file_.read()
+    with io.open(os.path.join(sim.flash, "config", "adcp.pdc"), "wb") as file_:
+        file_.write(usr)
+    instrument = INSTRUMENT(usr[:-2] + _checksum(usr))
+    instrument.attach(sim)
+    sim.sources[BUS] = [instrument]
+    rows = []
+    try:
+        sim.kernel.start(boot, (sim, instrument, rows)).join()
+    finally:
+        sim.uninstall()
+    print("{:<10}{:>8}{:>8}{:>8}{:>10}  {}".format("BOOT", "TX", "RX", "S", "START IN", "COMMANDS"))
+    for name, tx, rx, secs, commands, ahead in rows:
+        print("{:<10}{:>8}{:>8}{:>8.1f}{:>10}  {}".format(name, tx, rx, secs, "NO" if ahead is None else ahead, commands))
+    sys.exit(0 if len(rows) == len(BOOTS) and all(row[5] is not None for row in rows) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Solar charged battery feeding the simulated buoy.
+
+The charge is integrated over the virtual time: the solar current follows a
+half sine between "Sunrise_H" and "Sunset_H" utc, scaled by the "Solar_Days"
+factor of the day (cycled, e.g. a winter month), the load is the board
+current, "Awake_A" or "Sleep_A" in stop mode, plus the "Pins" currents of
+the devices powered. The battery voltage is linear in the state of charge
+from "V_Empty" to "V_Full", minus the load drop on "Ohm", and is read by the
+firmware adc on "Channel" through the "Divider". An empty battery browns out
+the board, halting the simulation.
+"""
+
+import math
+import os
+
+STEP = 300000000  # us. Longest integration step, the solar current changes slowly.
+
+class BATTERY(object):
+    """Params:
+        sim(obj): :class:`simulator.sim.SIM`
+        config(dict): scenario "Battery" section
+    """
+
+    def __init__(self, sim, config):
+        self.sim = sim
+        self.capacity = float(config.get("Capacity_Ah", 10))
+        self.soc = float(config.get("Soc", 1))
+        self.v_empty = float(config.get("V_Empty", 11.4))
+        self.v_full = float(config.get("V_Full", 12.8))
+        self.ohm = float(config.get("Ohm", 0.1))
+        self.channel = str(config.get("Channel", "10"))
+        self.divider = float(config.get("Divider", 4.75))
+        self.sleep_a = float(config.get("Sleep_A", 0.002))
+        self.awake_a = float(config.get("Awake_A", 0.06))
+        self.pins = config.get("Pins", {})  # {pin:A,...}
+        self.solar_a = float(config.get("Solar_A", 0.5))
+        self.sunrise = float(config.get("Sunrise_H", 7)) * 3600
+        self.sunset = float(config.get("Sunset_H", 17)) * 3600
+        self.days = config.get("Solar_Days", [1])
+        self.at = 0  # Integrated up to, us since boot.
+        self.soc_min = self.soc
+        self.v_min = self.volts()
+        self.solar_ah = self.load_ah = 0.0
+        self.brownout = None  # us since boot.
+
+    def load(self):
+        """Returns the current drawn now (A)."""
+        current = self.sleep_a if self.sim.report.sleeping else self.awake_a
+        for pin, amps in self.pins.items():
+            if self.sim.pins.get(pin, 0):
+                current += float(amps)
+        return current
+
+    def solar(self, us):
+        """Returns the solar current at the given time (A)."""
+        day = (self.sim.kernel.utc + us // 1000000) % 86400
+        if not self.sunrise < day < self.sunset:
+            return 0.0
+        factor = float(self.days[int(us // 86400000000) % len(self.days)])
+        return self.solar_a * factor * math.sin(math.pi * (day - self.sunrise) / (self.sunset - self.sunrise))
+
+    def volts(self):
+        """Returns the battery voltage."""
+        return self.v_empty + (self.v_full - self.v_empty) * self.soc - self.load() * self.ohm
+
+    def update(self, now=None):
+        """Integrates the charge up to now, with the load drawn since the last
+        update, call it before the load changes.
+
+        Params:
+            now(int): microseconds since boot, default the kernel time
+        """
+        kernel = self.sim.kernel
+        with kernel.cond:
+            if now is None:
+                now = kernel.us
+            if self.brownout is not None:
+                return
+            load = self.load()
+            while self.at < now:
+                step = min(now - self.at, STEP)
+                solar = self.solar(self.at + step // 2)
+                ah = step / 3600000000
+                soc = self.soc + (solar - load) * ah / self.capacity
+                if soc <= 0:
+                    step = int(step * self.soc / (self.soc - soc))
+                    self.solar_ah += solar * step / 3600000000
+                    self.load_ah += load * step / 3600000000
+                    self.at += step
+                    self.soc = self.soc_min = 0.0
+                    self.brownout = self.at
+                    kernel.halt("brownout")
+                    return
+                self.solar_ah += solar * ah
+                self.load_ah += load * ah
+                self.soc = min(soc, 1.0)
+                self.soc_min = min(self.soc_min, self.soc)
+                self.at += step
+            self.v_min = min(self.v_min, self.volts())
+
+    def read(self):
+        """Returns the adc pin voltage."""
+        self.update()
+        return self.volts() / self.divider
+
+    def _records(self):
+        """Counts the data records written to the sd."""
+        records = 0
+        path = os.path.join(self.sim.sd, "data")
+        for name in os.listdir(path) if os.path.isdir(path) else ():
+            with open(os.path.join(path, name), "rb") as file_:
+                records += sum(1 for line in file_ if line.strip())
+        return records
+
+    def summary(self):
+        """Returns the battery figures, the uptime and the data yield."""
+        self.update()
+        up = self.sim.kernel.us if self.brownout is None else self.brownout
+        return {
+            "battery_soc_end":round(self.soc, 3),
+            "battery_soc_min":round(self.soc_min, 3),
+            "battery_v_min":round(self.v_min, 2),
+            "solar_ah":round(self.solar_ah, 2),
+            "load_ah":round(self.load_ah, 2),
+            "brownout_s":None if self.brownout is None else self.brownout // 1000000,
+            "uptime_pct":round(100 * up / self.sim.kernel.until, 2),
+            "data_records":self._records()}
@@ -0,0 +1,201 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Host throughput test of the menu transparent mode (firmware menu.py
+MENU._pass_through) on fake streams.
+
+Moves a binary dump from the device uart to the console, text commands and
+a binary upload from the console to the device, checks every byte gets
+through and the [BACKSPACE] escape, and shows the host throughput:
+
+    python3 -m simulator.bridge [-n kbytes] [-f firmware]
+
+A firmware without the binary mode (-f of an older tree) runs the text tests
+only. Exits with 1 if a byte is lost or the escape fails.
+"""
+
+import argparse
+import contextlib
+import importlib
+import inspect
+import io
+import os
+import random
+import sys
+import time
+from simulator.sim import SIM, SCENARIO
+from simulator.kernel import INF
+
+POLLIN = 0x0001
+POLLOUT = 0x0004
+
+class STREAM(object):
+    """In memory usb vcp or uart.
+
+    Params:
+        kernel(obj): :class:`simulator.kernel.KERNEL`
+        chunks(list): [(us, bytes),...] readable us after the creation
+    """
+
+    def __init__(self, kernel, chunks=()):
+        self.kernel = kernel
+        self.chunks = [(kernel.us + us, data) for us, data in chunks]
+        self.pending = bytearray()
+        self.written = bytearray()
+
+    def _release(self):
+        while self.chunks and self.chunks[0][0] <= self.kernel.us:
+            self.pending += self.chunks.pop(0)[1]
+
+    def _ready(self, mask):
+        self._release()
+        return (mask & POLLIN if self.pending else 0) | (mask & POLLOUT)
+
+    def _arrival(self):
+        return self.chunks[0][0] if self.chunks else INF
+
+    def drained(self):
+        self._release()
+        return not self.chunks and not self.pending
+
+    def isconnected(self):
+        return True
+
+    def any(self):
+        self._release()
+        return len(self.pending)
+
+    def read(self, nbytes=None):
+        self._release()
+        if not self.pending:
+            return None
+        nbytes = len(self.pending) if nbytes is None else min(nbytes, len(self.pending))
+        data = bytes(self.pending[:nbytes])
+        del self.pending[:nbytes]
+        return data
+
+    def readinto(self, buf, nbytes=None):
+        data = self.read(len(buf) if nbytes is None else min(nbytes, len(buf)))
+        if not data:
+            return None
+        buf[:len(data)] = data
+        return len(data)
+
+    def readchar(self):
+        data = self.read(1)
+        return data[0] if data else -1
+
+    def write(self, buf):
+        if isinstance(buf, str):
+            buf = buf.encode("latin-1")
+        self.written += bytes(buf)
+        return len(buf)
+
+class DEVICE(object):
+
+    def __init__(self, uart):
+        self.uart = uart
+        self.name = "fake"
+
+    def init_uart(self):
+        pass
+
+    def deinit_uart(self):
+        pass
+
+class BOARD(object):
+    """Leaves the interactive mode once the streams are drained."""
+
+    def __init__(self, usb, uart, device):
+        self.usb = usb
+        self.uart = uart
+        self.device = device
+
+    @property
+    def interactive(self):
+        return not (self.usb.drained() and self.device.uart.drained())
+
+class SINK(object):
+    """Counts the printed characters."""
+
+    def __init__(self):
+        self.data = []
+
+    def write(self, text):
+        self.data.append(text)
+
+    def flush(self):
+        pass
+
+def run(menu_class, kernel, console, device, raw=None):
+    """Runs the transparent mode till drained or escaped.
+
+    Returns:
+        result, seconds, bytes reaching the console
+    """
+    board = BOARD(STREAM(kernel) if console is None else console, STREAM(kernel), DEVICE(device))
+    menu = menu_class(board, None)
+    sink = SINK()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sink):
+        result = menu._pass_through(board.device) if raw is None else menu._pass_through(board.device, raw=raw)
+    seconds = time.perf_counter() - start
+    return result, seconds, bytes(board.usb.written) + "".join(sink.data).encode("latin-1")
+
+def main():
+    parser = argparse.ArgumentParser(prog="python3 -m simulator.bridge", description="Tests the menu transparent mode throughput.")
+    parser.add_argument("-f", "--firmware", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "firmware"), help="firmware dir")
+    parser.add_argument("-n", "--kbytes", type=int, default=256, help="kbytes per transfer")
+    args = parser.parse_args()
+    sim = SIM(os.path.abspath(args.firmware), SCENARIO)
+    sim.install()
+    failed = False
+    try:
+        kernel = sim.kernel
+        with contextlib.redirect_stdout(io.StringIO()):
+            menu_class = importlib.import_module("menu").MENU
+        binary = "raw" in inspect.signature(menu_class._pass_through).parameters
+        constants = importlib.import_module("constants")
+        guard = getattr(constants, "BRIDGE_GUARD", 0) * 1000 + 100000
+        random.seed(1)
+        dump = bytes(random.getrandbits(8) for i in range(args.kbytes * 1024))
+        commands = b"".join(b"CMD%05d\r" % i for i in range(args.kbytes * 1024 // 9))
+        print("{:<24}{:>10}{:>10}{:>10}{:>8}".format("TRANSFER", "BYTES", "s", "KB/s", "OK"))
+        tests = [("dump to console", None, None, [(0, dump)], lambda result, console, device: console == dump)]
+        tests.append(("commands to device", None, [(0, commands), (guard, b"\x08")], (), lambda result, console, device: result is True and device == commands))
+        if binary:
+            tests.append(("binary dump to console", True, None, [(0, dump)], lambda result, console, device: console == dump))
+            tests.append(("binary upload", True, [(0, dump), (guard, b"\x08")], (), lambda result, console, device: result is True and device == dump))
+        for name, raw, typed, output, check in tests:
+            console = None if typed is None else STREAM(kernel, typed)
+            device = STREAM(kernel, output)
+            result, seconds, received = run(menu_class, kernel, console, device, raw)
+            moved = len(received) if output else len(device.written)
+            ok = check(result, received, bytes(device.written))
+            failed |= not ok
+            print("{:<24}{:>10}{:>10.3f}{:>10.0f}{:>8}".format(name, moved, seconds, moved / 1024 / seconds, "yes" if ok else "NO"))
+    finally:
+        sim.uninstall()
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Fake _thread module, threads and locks parked on the simulator virtual clock."""
+
+import threading as _threading
+from simulator import sim as _sim
+from simulator.kernel import INF as _INF
+
+_stack_size = 0
+
+class LockType(object):
+
+    def __init__(self):
+        self._locked = False
+
+    def acquire(self, waitflag=1, timeout=-1):
+        kernel = _sim.current.kernel
+        with kernel.cond:
+            if not self._locked:
+                self._locked = True
+                return True
+            if not waitflag:
+                kernel.spin()
+                return False
+            wakeup = _INF if timeout < 0 else kernel.us + int(timeout * 1000000)
+            while self._locked:
+                if kernel.us >= wakeup:
+                    return False
+                kernel.park(wakeup, (self,))
+            self._locked = True
+            return True
+
+    def release(self):
+        kernel = _sim.current.kernel
+        with kernel.cond:
+            if not self._locked:
+                raise RuntimeError("release unlocked lock")
+            self._locked = False
+            kernel.wake(self)
+
+    def locked(self):
+        _sim.current.kernel.spin()
+        return self._locked
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *args):
+        self.release()
+
+def allocate_lock():
+    return LockType()
+
+def start_new_thread(function, args, kwargs={}):
+    _sim.current.kernel.start(function, args, kwargs)
+
+def get_ident():
+    return _threading.get_ident()
+
+def stack_size(size=0):
+    global _stack_size
+    previous = _stack_size
+    _stack_size = size
+    return previous
+
+def exit():
+    raise SystemExit
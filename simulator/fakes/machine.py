@@ -0,0 +1,76 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Fake machine module of the simulated pyboard v1.1."""
+
+import pyb
+from simulator import sim as _sim
+
+PWRON_RESET = 1
+HARD_RESET = 2
+WDT_RESET = 3
+DEEPSLEEP_RESET = 4
+SOFT_RESET = 5
+
+Pin = pyb.Pin
+RTC = pyb.RTC
+UART = pyb.UART
+ADC = pyb.ADC
+
+def reset_cause():
+    return _sim.current.reset_cause
+
+def reset():
+    pyb.hard_reset()
+
+soft_reset = reset
+
+def freq(*args):
+    if not args:
+        return pyb.freq()[0]
+    pyb.freq(*args)
+
+def unique_id():
+    return pyb.unique_id()
+
+def idle():
+    pyb.wfi()
+
+def lightsleep(time_ms=None):
+    _sim.current.wakeup_ms = time_ms
+    pyb.stop()
+
+deepsleep = lightsleep
+
+def disable_irq():
+    return pyb.disable_irq()
+
+def enable_irq(state=True):
+    pyb.enable_irq(state)
+
+class WDT(object):
+
+    def __init__(self, id=0, timeout=5000):
+        self.timeout = timeout
+
+    def feed(self):
+        pass
@@ -0,0 +1,613 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Fake pyb module of the simulated pyboard v1.1."""
+
+import calendar as _calendar
+import time as _time
+from simulator import sim as _sim
+from simulator.kernel import INF as _INF
+
+_OFFSET = 946684800  # Seconds from 1970-01-01 to 2000-01-01.
+
+def _kernel():
+    return _sim.current.kernel
+
+def freq(sysclk=None, hclk=None, pclk1=None, pclk2=None):
+    sim = _sim.current
+    if sysclk is None:
+        return (sim.freq, sim.freq, sim.freq // 4, sim.freq // 2)
+    if sysclk != sim.freq:
+        sim.report.freq_switches += 1
+        sim.report.clock(sysclk)
+    sim.freq = sysclk
+
+def delay(ms):
+    _kernel().sleep_us(ms * 1000)
+
+def udelay(us):
+    _kernel().sleep_us(us)
+
+def millis():
+    kernel = _kernel()
+    kernel.spin()
+    return kernel.ticks_us() // 1000
+
+def micros():
+    kernel = _kernel()
+    kernel.spin()
+    return kernel.ticks_us()
+
+def elapsed_millis(start):
+    return millis() - start
+
+def elapsed_micros(start):
+    return micros() - start
+
+def wfi():
+    _kernel().sleep_us(1000)  # Systick wakes up the cpu every ms.
+
+def stop():
+    """Parks the board until the rtc wakeup, the sleep is recorded."""
+    sim = _sim.current
+    kernel = sim.kernel
+    sim.heap.allocated()  # Counts the automatic collections of the cycle.
+    if sim.battery:
+        sim.battery.update()
+    sim.report.stop()
+    # The wakeup timer counts the rtc clock, drift included.
+    slept = kernel.stop(_INF if sim.wakeup_ms is None else kernel.us + int(sim.wakeup_ms * 1000 / (1 + (kernel.drift + kernel.trim) / 1000000)), (sim,))
+    if sim.battery:
+        sim.battery.update()
+    sim.report.wake(slept)
+
+def standby():
+    _kernel().halt("standby")
+    _kernel().park(_INF)
+
+def hard_reset():
+    _kernel().halt("hard reset")
+    _kernel().park(_INF)
+
+soft_reset = hard_reset
+
+def repl_uart(uart=None):
+    sim = _sim.current
+    if uart is None:
+        return sim.repl
+    sim.repl = uart
+
+def usb_mode(modestr=None, **kwargs):
+    return "VCP"
+
+def have_cdc():
+    return _sim.current.usb
+
+def info(dump_alloc_table=None):
+    print("simulated pyboard v1.1")
+
+def unique_id():
+    return b"SIMULATOR000"
+
+def disable_irq():
+    return True
+
+def enable_irq(state=True):
+    pass
+
+def fault_debug(value):
+    pass
+
+class LED(object):
+
+    def __init__(self, id):
+        self.id = id
+
+    def on(self):
+        _sim.current.leds[self.id] = 255
+
+    def off(self):
+        _sim.current.leds[self.id] = 0
+
+    def toggle(self):
+        sim = _sim.current
+        sim.leds[self.id] = 0 if sim.leds.get(self.id, 0) else 255
+
+    def intensity(self, value=None):
+        sim = _sim.current
+        if value is None:
+            return sim.leds.get(self.id, 0)
+        sim.leds[self.id] = value
+
+class Pin(object):
+
+    IN = 0
+    OUT = 1
+    OUT_PP = 1
+    OUT_OD = 17
+    AF_PP = 2
+    AF_OD = 18
+    ANALOG = 3
+    PULL_NONE = 0
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_RISING = 0x10110000
+    IRQ_FALLING = 0x10210000
+
+    def __init__(self, id, mode=-1, pull=-1, af=-1, value=None):
+        self.id = str(id)
+        self.init(mode, pull, af, value)
+
+    def init(self, mode=-1, pull=-1, af=-1, value=None):
+        if mode != -1:
+            self._mode = mode
+        if pull != -1:
+            self._pull = pull
+        if value is not None:
+            self.value(value)
+
+    def value(self, value=None):
+        sim = _sim.current
+        if value is None:
+            return sim.pins.get(self.id, 0)
+        value = 1 if value else 0
+        if sim.pins.get(self.id, 0) != value:
+            if sim.battery:
+                sim.battery.update()  # Before the load changes.
+            sim.pins[self.id] = value
+            with sim.kernel.cond:
+                for sources in sim.sources.values():
+                    for source in sources:
+                        source.switched(self.id, value, sim.kernel.us)
+            for uart in sim.uarts.values():  # Powered sources may start talking.
+                sim.kernel.wake(uart)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    high = on
+    low = off
+
+    def name(self):
+        return self.id
+
+    def mode(self):
+        return getattr(self, "_mode", self.IN)
+
+    def pull(self):
+        return getattr(self, "_pull", self.PULL_NONE)
+
+    __call__ = value
+
+class ExtInt(object):
+
+    IRQ_RISING = 0x10110000
+    IRQ_FALLING = 0x10210000
+    IRQ_RISING_FALLING = 0x10310000
+    EVT_RISING = 0x10120000
+    EVT_FALLING = 0x10220000
+    EVT_RISING_FALLING = 0x10320000
+
+    _lines = 0
+
+    def __init__(self, pin, mode, pull, callback):
+        self.pin = pin
+        self.callback = callback
+        self.enabled = True
+        self._line = ExtInt._lines
+        ExtInt._lines += 1
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def line(self):
+        return self._line
+
+    def swint(self):
+        if self.enabled:
+            self.callback(self._line)
+            _kernel().wake(_sim.current)  # Wakes up the board from stop mode.
+
+class RTC(object):
+
+    def __new__(cls):
+        sim = _sim.current
+        if not hasattr(sim, "rtc"):
+            sim.rtc = object.__new__(cls)
+            sim.rtc._calibration = 0
+        return sim.rtc
+
+    def datetime(self, datetimetuple=None):
+        kernel = _kernel()
+        if datetimetuple is None:
+            us = kernel.rtc_us()
+            t = _time.gmtime(us // 1000000 + _OFFSET)
+            return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_wday + 1, t.tm_hour, t.tm_min, t.tm_sec, 255 - us % 1000000 * 256 // 1000000)
+        y, m, d, wd, hh, mm, ss = datetimetuple[:7]
+        kernel.set_time(_calendar.timegm((int(y), int(m), int(d), int(hh), int(mm), int(ss))) - _OFFSET)
+
+    def wakeup(self, timeout, callback=None):
+        _sim.current.wakeup_ms = None if timeout is None else max(int(timeout), 0)
+
+    def calibration(self, cal=None):
+        if cal is None:
+            return self._calibration
+        if not -511 <= cal <= 512:
+            raise ValueError("calibration value out of range")
+        self._calibration = cal
+        _kernel().calibrate(cal * 1000000 / 1048576)
+
+    def info(self):
+        return 0
+
+    def init(self):
+        pass
+
+class SDCard(object):
+
+    def present(self):
+        return _sim.current.sdcard
+
+    def power(self, state=None):
+        return _sim.current.sdcard
+
+class USB_VCP(object):
+
+    def __init__(self, id=0):
+        self.id = id
+
+    def isconnected(self):
+        return _sim.current.usb
+
+    def setinterrupt(self, chr):
+        pass
+
+    def any(self):
+        _kernel().spin()
+        return False
+
+    def read(self, nbytes=None):
+        return None
+
+    def readinto(self, buf, maxlen=None):
+        return None
+
+    def readline(self):
+        return None
+
+    def recv(self, data, timeout=5000):
+        return 0
+
+    def write(self, buf):
+        return len(buf)
+
+    def send(self, data, timeout=5000):
+        return len(data)
+
+    def _ready(self, mask):
+        return mask & 0x0004  # POLLOUT
+
+class UART(object):
+    """Uart fed by the scenario sources of its bus, see :mod:`simulator.peers`."""
+
+    RTS = 256
+    CTS = 512
+
+    def __new__(cls, bus, *args, **kwargs):
+        sim = _sim.current
+        if bus not in sim.uarts:
+            uart = object.__new__(cls)
+            uart.bus = bus
+            uart._rx = bytearray()
+            uart._baudrate = 0
+            uart._timeout = 0
+            uart._timeout_char = 0
+            uart._read_buf_len = 64
+            uart.overruns = 0
+            sim.uarts[bus] = uart
+        return sim.uarts[bus]
+
+    def __init__(self, bus, baudrate=None, *args, **kwargs):
+        if baudrate:
+            self.init(baudrate, *args, **kwargs)
+
+    def init(self, baudrate=9600, bits=8, parity=None, stop=1, timeout=0, flow=0, timeout_char=0, read_buf_len=64, **kwargs):
+        self._baudrate = baudrate
+        self._timeout = timeout
+        self._timeout_char = timeout_char
+        self._read_buf_len = max(read_buf_len, 1)
+
+    def deinit(self):
+        self._baudrate = 0
+
+    def _sources(self):
+        return _sim.current.sources.get(self.bus, [])
+
+    def _pump(self):
+        """Moves the due chunks into the receive buffer, drops the overflow."""
+        sim = _sim.current
+        for source in self._sources():
+            for chunk in source.pending(sim.kernel.us):
+                if not self._baudrate:
+                    continue
+                free = self._read_buf_len - len(self._rx)
+                if len(chunk) > free:
+                    self.overruns += len(chunk) - max(free, 0)
+                    chunk = chunk[:max(free, 0)]
+                self._rx += chunk
+                sim.report.uart(rx=len(chunk))
+
+    def _arrival(self):
+        now = _kernel().us
+        return min([_INF] + [source.next_at(now) for source in self._sources()])
+
+    def _ready(self, mask):
+        self._pump()
+        events = 0
+        if self._rx and mask & 0x0001:  # POLLIN
+            events |= 0x0001
+        if mask & 0x0004:  # POLLOUT
+            events |= 0x0004
+        return events
+
+    def _wait(self, deadline):
+        """Parks until data or deadline, call with the kernel condition held."""
+        kernel = _kernel()
+        self._pump()
+        while not self._rx and kernel.us < deadline:
+            kernel.park(min(deadline, self._arrival()), (self,))
+            self._pump()
+
+    def _take(self, nbytes):
+        if nbytes is None or nbytes > len(self._rx):
+            nbytes = len(self._rx)
+        data = bytes(self._rx[:nbytes])
+        del self._rx[:nbytes]
+        return data
+
+    def any(self):
+        kernel = _kernel()
+        with kernel.cond:
+            self._pump()
+            if not self._rx:
+                kernel.spin()
+            return len(self._rx)
+
+    def read(self, nbytes=None):
+        kernel = _kernel()
+        with kernel.cond:
+            self._wait(kernel.us + self._timeout * 1000)
+            if not self._rx:
+                kernel.spin()
+                return None
+            data = self._take(nbytes)
+            while nbytes is None or len(data) < nbytes:
+                self._wait(kernel.us + self._timeout_char * 1000)
+                if not self._rx:
+                    break
+                data += self._take(None if nbytes is None else nbytes - len(data))
+            return data
+
+    def readinto(self, buf, nbytes=None):
+        if nbytes is None:
+            nbytes = len(buf)
+        data = self.read(nbytes)
+        if not data:
+            return None
+        buf[:len(data)] = data
+        return len(data)
+
+    def readline(self):
+        kernel = _kernel()
+        with kernel.cond:
+            self._wait(kernel.us + self._timeout * 1000)
+            if not self._rx:
+                kernel.spin()
+                return None
+            data = b""
+            while True:
+                end = self._rx.find(b"\n")
+                if end >= 0:
+                    return data + self._take(end + 1)
+                data += self._take(None)
+                self._wait(kernel.us + self._timeout_char * 1000)
+                if not self._rx:
+                    return data
+
+    def readchar(self):
+        data = self.read(1)
+        if not data:
+            return -1
+        return data[0]
+
+    def write(self, buf):
+        sim = _sim.current
+        if isinstance(buf, str):
+            buf = buf.encode()
+        buf = bytes(buf)
+        with sim.kernel.cond:
+            for source in self._sources():
+                source.received(buf, sim.kernel.us)
+            sim.report.uart(tx=len(buf))
+            sim.kernel.wake(self, self._arrival())
+        return len(buf)
+
+    def writechar(self, char):
+        self.write(bytes([char]))
+
+    def sendbreak(self):
+        pass
+
+def _volts(channel, us=None):
+    """Returns a scenario "Adc" "Channels" voltage.
+
+    A channel may be a list of voltages, one per ms of virtual time, cycled
+    (e.g. a battery dipping at each modem transmission).
+
+    Params:
+        channel(str)
+        us(int): microseconds since boot, default now
+    """
+    sim = _sim.current
+    if sim.battery and channel == sim.battery.channel:
+        return sim.battery.read()
+    volts = sim.adc.get("Channels", {}).get(channel, 0)
+    if isinstance(volts, list):
+        volts = volts[(_kernel().us if us is None else us) // 1000 % len(volts)]
+    return float(volts)
+
+class ADCAll(object):
+    """Reads the scenario "Adc" voltages."""
+
+    def __init__(self, resolution, mask=0xffffffff):
+        self.resolution = resolution
+
+    def _adc(self, key, default):
+        return float(_sim.current.adc.get(key, default))
+
+    def read_core_temp(self):
+        return self._adc("Core_Temp", 25.0)
+
+    def read_core_vbat(self):
+        return self._adc("Core_Vbat", 3.3)
+
+    def read_core_vref(self):
+        return self._adc("Core_Vref", 1.21)
+
+    def read_vref(self):
+        return self._adc("Vref", 3.3)
+
+    def read_channel(self, channel):
+        volts = _volts(str(channel))
+        return min(int(volts / self.read_vref() * ((1 << self.resolution) - 1)), (1 << self.resolution) - 1)
+
+class ADC(object):
+    """Reads a scenario "Adc" "Channels" voltage, by pin name or channel."""
+
+    def __init__(self, pin):
+        self.pin = pin.name() if isinstance(pin, Pin) else str(pin)
+
+    def read(self, us=None):
+        return min(int(_volts(self.pin, us) / float(_sim.current.adc.get("Vref", 3.3)) * 4095), 4095)
+
+    def read_timed(self, buf, timer):
+        return ADC.read_timed_multi((self,), (buf,), timer)
+
+    @staticmethod
+    def read_timed_multi(adcs, bufs, timer):
+        """Samples each adc at every timer tick, the board waits meanwhile."""
+        if len(adcs) != len(bufs) or len(set(len(buf) for buf in bufs)) > 1:
+            raise ValueError("need as many buffers as adcs, all the same length")
+        kernel = _kernel()
+        rate = max(timer.freq() if isinstance(timer, Timer) else timer, 1)
+        start = kernel.us
+        for i in range(len(bufs[0])):
+            for adc, buf in zip(adcs, bufs):
+                buf[i] = adc.read(start + i * 1000000 // rate)
+        kernel.sleep_us(len(bufs[0]) * 1000000 // rate)
+        return True
+
+class Timer(object):
+
+    def __init__(self, id, freq=None, **kwargs):
+        self.id = id
+        self._freq = freq
+        self._callback = None
+
+    def init(self, freq=None, **kwargs):
+        self._freq = freq
+
+    def freq(self, value=None):
+        if value is None:
+            return self._freq
+        self._freq = value
+
+    def callback(self, fun):
+        self._callback = fun
+
+    def deinit(self):
+        self._callback = None
+
+class I2C(object):
+    """Answers with the scenario "I2c" devices of its bus, see
+    :class:`simulator.peers.DDC`, register reads only."""
+
+    MASTER = 0
+    SLAVE = 1
+
+    def __new__(cls, bus, *args, **kwargs):
+        sim = _sim.current
+        if bus not in sim.i2cs:  # One object per bus, as on the board.
+            i2c = object.__new__(cls)
+            i2c.bus = bus
+            i2c._baudrate = 0
+            sim.i2cs[bus] = i2c
+        return sim.i2cs[bus]
+
+    def __init__(self, bus, mode=None, addr=0x12, baudrate=400000, **kwargs):
+        self._baudrate = baudrate
+
+    def init(self, mode=None, baudrate=400000, **kwargs):
+        self._baudrate = baudrate
+
+    def deinit(self):
+        pass
+
+    def _devices(self):
+        return _sim.current.i2c.get(self.bus, {})
+
+    def _device(self, addr):
+        device = self._devices().get(addr)
+        if not device or not device.powered():
+            raise OSError(5)  # EIO, not acknowledged.
+        return device
+
+    def scan(self):
+        return sorted(addr for addr, device in self._devices().items() if device.powered())
+
+    def is_ready(self, addr):
+        device = self._devices().get(addr)
+        return bool(device and device.powered())
+
+    def mem_read(self, data, addr, memaddr, timeout=5000, addr_size=8):
+        sim = _sim.current
+        device = self._device(addr)
+        nbytes = data if isinstance(data, int) else len(data)
+        with sim.kernel.cond:
+            read = device.read(memaddr, nbytes, sim.kernel.us)
+            sim.report.i2c(rx=nbytes)
+        _kernel().sleep_us((nbytes + 4) * 9 * 1000000 // self._baudrate)  # Address, register, restart, address and data bytes.
+        if isinstance(data, int):
+            return read
+        data[:nbytes] = read
+        return data
+
+    def _nodev(self, *args, **kwargs):
+        raise OSError(5)  # EIO
+
+    recv = send = mem_write = readfrom = writeto = readfrom_mem = readfrom_mem_into = writeto_mem = _nodev
@@ -0,0 +1,152 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Fake uasyncio module, the host asyncio on the simulator virtual clock.
+
+The event loop reads the ticks of the virtual kernel and waits in the fake
+uselect poll, on the streams awaited by StreamReader, so a task waiting for
+uart bytes or a ThreadSafeFlag set by a thread wakes up at once and the board
+thread parks in between.
+"""
+
+import asyncio as _asyncio
+import math as _math
+import selectors as _selectors
+import uio as _uio
+import uselect as _uselect
+from simulator import sim as _sim
+
+TimeoutError = _asyncio.TimeoutError
+CancelledError = _asyncio.CancelledError
+Event = _asyncio.Event
+Lock = _asyncio.Lock
+Task = _asyncio.Task
+create_task = _asyncio.create_task
+current_task = _asyncio.current_task
+gather = _asyncio.gather
+
+stall_us = 0  # Longest event loop pass in ticks (stop mode excluded), a blocking call holds every task.
+
+class _SELECTOR(_selectors.SelectSelector):
+    """Waits on the virtual clock and the awaited streams, then polls the
+    loop host file descriptors (its self pipe) without blocking."""
+
+    def __init__(self):
+        _selectors.SelectSelector.__init__(self)
+        self.streams = {}  # {stream:[future,...],...}
+        self.left = None  # Last wait end, us.
+
+    def select(self, timeout=None):
+        global stall_us
+        kernel = _sim.current.kernel
+        if self.left is not None:
+            stall_us = max(stall_us, kernel.ticks_us() - self.left)
+        for stream in list(self.streams):
+            self.streams[stream] = [future for future in self.streams[stream] if not future.done()]
+            if not self.streams[stream]:
+                del self.streams[stream]
+        poller = _uselect.poll()
+        for stream in self.streams:
+            poller.register(stream, _uselect.POLLIN)
+        for stream, events in poller.poll(-1 if timeout is None else _math.ceil(timeout * 1000)):
+            for future in self.streams.pop(stream):
+                future.set_result(events)
+        self.left = kernel.ticks_us()
+        return _selectors.SelectSelector.select(self, 0)
+
+class _LOOP(_asyncio.SelectorEventLoop):
+    """Event loop timed by the virtual ticks, as uasyncio by ticks_ms."""
+
+    def __init__(self):
+        _asyncio.SelectorEventLoop.__init__(self, _SELECTOR())
+        self._clock_resolution = 0.000001
+
+    def time(self):
+        return _sim.current.kernel.ticks_us() / 1000000
+
+async def _readable(stream):
+    """Awaits incoming bytes on a stream."""
+    future = _asyncio.get_running_loop().create_future()
+    _asyncio.get_running_loop()._selector.streams.setdefault(stream, []).append(future)
+    await future
+
+class ThreadSafeFlag(_uio.IOBase):
+    """Set by threads, its state change wakes up the loop polling it."""
+
+    def __init__(self):
+        self.state = 0
+
+    def _ready(self, mask):
+        return self.state and mask & _uselect.POLLIN
+
+    def set(self):
+        self.state = 1
+
+    def clear(self):
+        self.state = 0
+
+    async def wait(self):
+        if not self.state:
+            await _readable(self)
+        self.state = 0
+
+class StreamReader(object):
+
+    def __init__(self, stream):
+        self.s = stream
+
+    async def read(self, n=-1):
+        await _readable(self.s)
+        return self.s.read(None if n < 0 else n)
+
+    async def readline(self):
+        line = b""
+        while not line.endswith(b"\n"):
+            await _readable(self.s)
+            line += self.s.readline() or b""
+        return line
+
+Stream = StreamReader
+
+def run(coro):
+    loop = _LOOP()
+    _asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        _asyncio.set_event_loop(None)
+        loop.close()
+
+def get_event_loop():
+    return _asyncio.get_event_loop()
+
+async def sleep(t):
+    await _asyncio.sleep(t)
+
+async def sleep_ms(t):
+    await _asyncio.sleep(t / 1000)
+
+async def wait_for(aw, timeout):
+    return await _asyncio.wait_for(aw, timeout)
+
+async def wait_for_ms(aw, timeout):
+    return await _asyncio.wait_for(aw, timeout / 1000)
@@ -0,0 +1,101 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Fake uos module, board paths are mapped to the simulator work dir."""
+
+import os as _os
+import errno as _errno
+from simulator import sim as _sim
+
+sep = "/"
+
+def _path(path):
+    return _sim.current.path(path)
+
+def listdir(path=None):
+    if path is None:
+        path = _sim.current.cwd
+    if path.rstrip("/") == "":
+        return [media[1:] for media in _sim.current.mounts]
+    return sorted(_os.listdir(_path(path)))
+
+def ilistdir(path=None):
+    for name in listdir(path):
+        full = _os.path.join(_path(path or _sim.current.cwd), name)
+        yield (name, 0x4000 if _os.path.isdir(full) else 0x8000, 0, _os.path.getsize(full))
+
+def mkdir(path):
+    _os.mkdir(_path(path))
+
+def rmdir(path):
+    _os.rmdir(_path(path))
+
+def remove(path):
+    _os.remove(_path(path))
+
+def rename(old_path, new_path):
+    _os.rename(_path(old_path), _path(new_path))
+
+def stat(path):
+    if path.rstrip("/") == "":
+        return (0x4000, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+    st = _os.stat(_path(path))
+    return (0x4000 if _os.path.isdir(_path(path)) else 0x8000, 0, 0, 0, 0, 0, st.st_size, int(st.st_atime), int(st.st_mtime), int(st.st_ctime))
+
+def statvfs(path):
+    st = _os.statvfs(_path(path))
+    return (st.f_bsize, st.f_frsize, st.f_blocks, st.f_bfree, st.f_bavail, 0, 0, 0, 0, st.f_namemax)
+
+def getcwd():
+    return _sim.current.cwd
+
+def chdir(path):
+    sim = _sim.current
+    if not _os.path.isdir(_path(path)):
+        raise OSError(_errno.ENOENT)
+    if not path.startswith("/"):
+        path = sim.cwd.rstrip("/") + "/" + path
+    sim.cwd = path.rstrip("/") or "/"
+
+def mount(fsobj, mount_point, readonly=False):
+    sim = _sim.current
+    if mount_point == "/sd":
+        if not sim.sdcard:
+            raise OSError(_errno.ENODEV)
+        sim.mounts["/sd"] = sim.sd
+    else:
+        raise OSError(_errno.EPERM)
+
+def umount(mount_point):
+    _sim.current.mounts.pop(mount_point, None)
+
+def sync():
+    pass
+
+def uname():
+    return ("pyboard", "pyboard", "1.x", "simulator", "PYBv1.1 with STM32F405RG")
+
+def urandom(n):
+    return _os.urandom(n)
+
+def dupterm(stream_object=None, index=0):
+    return None
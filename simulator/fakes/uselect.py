@@ -0,0 +1,99 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Fake uselect module, waits on the simulator virtual clock.
+
+Streams implement _ready(mask), returning the ready events, and _arrival(),
+returning the time of their next incoming data; uio.IOBase objects answer
+ioctl(MP_STREAM_POLL, mask); other objects are always ready.
+"""
+
+import threading
+from simulator import sim as _sim
+from simulator.kernel import INF as _INF
+
+POLLIN = 0x0001
+POLLOUT = 0x0004
+POLLERR = 0x0008
+POLLHUP = 0x0010
+
+def _events(obj, mask):
+    if hasattr(obj, "_ready"):
+        return obj._ready(mask)
+    if hasattr(obj, "ioctl"):
+        return obj.ioctl(3, mask) or 0  # MP_STREAM_POLL
+    return mask & (POLLIN | POLLOUT)
+
+def _arrival(obj):
+    if hasattr(obj, "_arrival"):
+        return obj._arrival()
+    return _INF
+
+class poll(object):
+
+    def __init__(self):
+        self._objs = {}
+
+    def register(self, obj, eventmask=POLLIN | POLLOUT):
+        self._objs[obj] = eventmask
+
+    def unregister(self, obj):
+        self._objs.pop(obj, None)
+
+    def modify(self, obj, eventmask):
+        if obj not in self._objs:
+            raise OSError(2)
+        self._objs[obj] = eventmask
+
+    def _wait(self, timeout):
+        kernel = _sim.current.kernel
+        if threading.current_thread() is _sim.current.main:  # Main loop passes.
+            _sim.current.report.loop_polls += 1
+        with kernel.cond:
+            deadline = _INF if timeout is None or timeout < 0 else kernel.us + int(timeout) * 1000
+            while True:
+                ready = []
+                for obj in self._objs:
+                    events = _events(obj, self._objs[obj])
+                    if events:
+                        ready.append((obj, events))
+                if ready:
+                    return ready
+                if kernel.us >= deadline:
+                    kernel.spin()
+                    return ready
+                kernel.park(min([deadline] + [_arrival(obj) for obj in self._objs]), tuple(self._objs))
+
+    def poll(self, timeout=-1):
+        return self._wait(timeout)
+
+    def ipoll(self, timeout=-1, flags=0):
+        return iter(self._wait(timeout))
+
+def select(rlist, wlist, xlist, timeout=None):
+    poller = poll()
+    for obj in rlist:
+        poller.register(obj, POLLIN)
+    for obj in wlist:
+        poller._objs[obj] = poller._objs.get(obj, 0) | POLLOUT
+    ready = poller._wait(None if timeout is None else int(timeout * 1000))
+    return ([obj for obj, events in ready if events & POLLIN], [obj for obj, events in ready if events & POLLOUT], [])
@@ -0,0 +1,83 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Fake utime module running on the simulator virtual clock."""
+
+import calendar
+import time as _time
+from simulator import sim as _sim
+
+_OFFSET = 946684800  # Seconds from 1970-01-01 to 2000-01-01.
+_PERIOD = 1 << 30  # Ticks wrap around period.
+
+def _kernel():
+    return _sim.current.kernel
+
+def time():
+    kernel = _kernel()
+    kernel.spin()
+    return kernel.time()
+
+def time_ns():
+    kernel = _kernel()
+    kernel.spin()
+    return kernel.rtc_us() * 1000
+
+def localtime(secs=None):
+    if secs is None:
+        secs = time()
+    t = _time.gmtime(int(secs) + _OFFSET)
+    return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec, t.tm_wday, t.tm_yday)
+
+gmtime = localtime
+
+def mktime(t):
+    year = t[0] + (t[1] - 1) // 12
+    month = (t[1] - 1) % 12 + 1
+    return calendar.timegm((year, month, 1, 0, 0, 0)) + (t[2] - 1) * 86400 + t[3] * 3600 + t[4] * 60 + t[5] - _OFFSET
+
+def sleep(seconds):
+    _kernel().sleep_us(seconds * 1000000)
+
+def sleep_ms(ms):
+    _kernel().sleep_us(ms * 1000)
+
+def sleep_us(us):
+    _kernel().sleep_us(us)
+
+def ticks_us():
+    kernel = _kernel()
+    kernel.spin()
+    return kernel.ticks_us() & (_PERIOD - 1)
+
+def ticks_ms():
+    kernel = _kernel()
+    kernel.spin()
+    return (kernel.ticks_us() // 1000) & (_PERIOD - 1)
+
+ticks_cpu = ticks_us
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & (_PERIOD - 1)
+
+def ticks_diff(ticks1, ticks2):
+    return ((ticks1 - ticks2 + _PERIOD // 2) & (_PERIOD - 1)) - _PERIOD // 2
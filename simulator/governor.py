@@ -0,0 +1,136 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Host run of the cpu clock governor (firmware tools/governor.py).
+
+Registers a uart, an i2c bus and a timer, then steps through the phase
+changes of STEPS, recording the pyb.freq() and bus init() calls:
+
+    python3 -m simulator.governor [-f firmware]
+
+Checks that every switch sets the clock first and then reinitializes every
+registered bus with its own arguments, that no switch cuts a transfer (bytes
+arrived on the uart since the previous phase change) and that a phase left by
+an exception is closed. Exits with 1 on a failed check.
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import os
+import sys
+from simulator.sim import SIM, SCENARIO
+
+"""Phase changes (enter/leave, phase, uart bytes arriving before it)."""
+STEPS = (
+    ("enter", "transfer", 0),  # Quiet bus, switches.
+    ("leave", "transfer", 0),
+    ("enter", "transfer", 40),  # Receiving, a switch would cut the transfer.
+    ("leave", "transfer", 40),
+    ("enter", "transfer", 0),  # Stale unread bytes, switches.
+    ("leave", "transfer", 0))
+
+def run(sim, figures):
+    """Runs the governor in a simulated thread."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        constants = importlib.import_module("constants")
+        governor = importlib.import_module("tools.governor")
+    pyb = importlib.import_module("pyb")
+    calls = []
+    freq = pyb.freq
+    def record(sysclk=None, *args):
+        if sysclk is not None:
+            calls.append(("freq", sysclk))
+        return freq(sysclk, *args)
+    pyb.freq = record
+    uart = pyb.UART(5, 115200, read_buf_len=512)
+    i2c = pyb.I2C(2, pyb.I2C.MASTER, baudrate=100000)
+    timer = pyb.Timer(6, freq=1000)
+    registered = {"uart":(uart, (115200,), {"read_buf_len":512}), "i2c":(i2c, (pyb.I2C.MASTER,), {"baudrate":100000}), "timer":(timer, (), {"freq":1000})}
+    for name, (bus, args, kwargs) in registered.items():
+        init = bus.init
+        def hook(*args, name=name, init=init, **kwargs):
+            calls.append((name, args, kwargs))
+            return init(*args, **kwargs)
+        bus.init = hook
+        try:
+            governor.register(bus, *args, **kwargs)
+        except TypeError:  # Uarts only.
+            figures.setdefault("unregistered", []).append(name)
+    governor.enter("io-wait")  # Settles on the io-wait clock.
+    governor.leave("io-wait")
+    switches = order = cuts = 0
+    reinit = set()
+    for action, phase, arriving in STEPS:
+        uart._rx += b"x" * arriving
+        del calls[:]
+        getattr(governor, action)(phase)
+        if not calls:
+            continue
+        switches += 1
+        if calls[0][0] != "freq":
+            order += 1
+        for call in calls[1:]:
+            if call[0] == "freq":
+                order += 1
+                continue
+            reinit.add(call[0])
+            if (call[1], call[2]) != registered[call[0]][1:]:
+                order += 1
+        if arriving:
+            cuts += 1
+    uart.read()
+    try:
+        with governor.phase("compute"):
+            raise ValueError("acquisition failed")
+    except ValueError:
+        pass
+    pyb.freq = freq
+    figures.update({
+        "switches":switches,
+        "reinit":" ".join(sorted(reinit)),
+        "unregistered":" ".join(figures.get("unregistered", [])) or "-",
+        "misordered":order,
+        "deferred":getattr(governor, "deferred", "-"),
+        "cut_transfers":cuts,
+        "phase_leaks":sum(governor.active.values()),
+        "freq_after":governor._freq,
+        "io_wait":constants.CPU_FREQ["io-wait"]})
+
+def main():
+    parser = argparse.ArgumentParser(prog="python3 -m simulator.governor", description="Runs the cpu clock governor through bus transfers.")
+    parser.add_argument("-f", "--firmware", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "firmware"), help="firmware dir")
+    args = parser.parse_args()
+    sim = SIM(os.path.abspath(args.firmware), SCENARIO, duration=3600)
+    sim.install()
+    figures = {}
+    try:
+        sim.kernel.start(run, (sim, figures)).join()
+    finally:
+        sim.uninstall()
+    for key in ("switches", "reinit", "unregistered", "misordered", "deferred", "cut_transfers", "phase_leaks", "freq_after"):
+        print("{:<16}{}".format(key, figures.get(key)))
+    sys.exit(0 if figures and figures["reinit"] == "i2c timer uart" and not figures["misordered"] and not figures["cut_transfers"] and not figures["phase_leaks"] and figures["freq_after"] == figures["io_wait"] else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Host report of the driver heap usage.
+
+Creates each driver against the fake MicroPython modules and measures with
+tracemalloc the heap its object keeps, then runs an acquisition window and
+measures the peak and the heap still held at the end. Run it on two firmware
+trees to compare them:
+
+    python3 -m simulator.heap [-f firmware] [-n samples]
+
+Host object sizes are CPython's, larger than MicroPython's, compare trees
+rather than reading the figures as board bytes.
+"""
+
+import argparse
+import contextlib
+from gc import collect  # The host one, the firmware gets the heap model.
+import importlib
+import io
+import json
+import os
+import tempfile
+import tracemalloc
+from simulator.sim import SIM, SCENARIO
+
+"""Disabled configs enabled for the report."""
+CONFIGS = {"dev_aml.json":"_dev_aml.json", "dev_meteo.json":"_dev_meteo.json", "dev_nortek.json":"_dev_nortek.json"}
+
+def _nmea(body):
+    """Returns an NMEA line out of its body."""
+    checksum = 0
+    for char in body:
+        checksum ^= char
+    return b"$" + body + b"*" + "{:02X}".format(checksum).encode() + b"\r\n"
+
+RMC = _nmea(b"GPRMC,120000.00,A,4538.4125,N,01345.1208,E,0.12,181.30,010126,,,A")
+
+METEO = b"0100 2700 3000 2500 1800 0500 1800"
+
+def _gps(obj, samples):
+    """Parses samples RMC sentences, as lines and char by char."""
+    for _ in range(samples):
+        obj.parse(RMC, "RMC")
+        for char in RMC:
+            obj.get_sentence(char, "RMC")
+
+def _meteo(obj, samples):
+    """Acquires a window of samples STRING lines."""
+    lines = [METEO] * (samples + 1)  # The first one is skipped.
+    obj.config["Samples"] = samples
+    obj.status = lambda status=None: "READY"
+    obj.read_line = lambda deadline: lines.pop() if lines else None
+    obj.main()
+
+def _adcp(obj, samples):
+    """Loads the instrument config."""
+    obj._parse_cfg()
+
+"""(module, class, instance, acquisition)."""
+DRIVERS = (
+    ("dev_quectel", "L80M39", "1", _gps),
+    ("dev_meteo", "Y32500", "1", _meteo),
+    ("dev_nortek", "AQUADOPP", "1", _adcp),
+    ("dev_aml", "METRECX", "1", None),
+    ("dev_aml", "UVXCHANGE", "1", None),
+    )
+
+def _adcp_cfg(flash):
+    """Writes an instrument config, 3 beams and 3 cells, to the flash copy."""
+    cfg = bytearray(784)
+    cfg[272 + 18] = 3  # NBeams
+    cfg[272 + 34] = 3  # Nbins
+    os.makedirs(os.path.join(flash, "config"), exist_ok=True)
+    with io.open(os.path.join(flash, "config", "adcp.cfg"), "wb") as file_:
+        file_.write(cfg)
+
+def _traced():
+    collect()
+    return tracemalloc.get_traced_memory()[0]
+
+def measure(module, cls, instance, acquisition, samples):
+    """Measures a driver heap usage.
+
+    Params:
+        module(str)
+        cls(str)
+        instance(str)
+        acquisition(function): runs a window on the object, None if no window
+        samples(int)
+    Returns:
+        object bytes(int), window peak bytes(int), held bytes(int)
+    """
+    module = importlib.import_module(module)
+    base = _traced()
+    obj = getattr(module, cls)(instance)
+    created = _traced() - base
+    peak = held = created
+    if acquisition:
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        acquisition(obj, samples)
+        peak = created + tracemalloc.get_traced_memory()[1] - start
+        held = _traced() - base
+    del obj
+    return created, peak, held
+
+def main():
+    parser = argparse.ArgumentParser(prog="python3 -m simulator.heap", description="Shows the driver heap usage.")
+    parser.add_argument("-f", "--firmware", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "firmware"), help="firmware dir")
+    parser.add_argument("-n", "--samples", type=int, default=60, help="acquisition window samples")
+    args = parser.parse_args()
+    with open(SCENARIO) as file_:
+        scenario = json.load(file_)
+    scenario["Configs"] = CONFIGS
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as file_:
+        json.dump(scenario, file_)
+    sim = SIM(os.path.abspath(args.firmware), file_.name)
+    os.unlink(file_.name)
+    sim.install()
+    _adcp_cfg(sim.flash)
+    tracemalloc.start()
+    try:
+        print("{:<28}{:>12}{:>12}{:>12}".format("DRIVER", "OBJECT", "PEAK", "HELD"))
+        for module, cls, instance, acquisition in DRIVERS:
+            with contextlib.redirect_stdout(io.StringIO()):  # Drops the driver logs.
+                result = measure(module, cls, instance, acquisition, args.samples)
+            print("{:<28}{:>12}{:>12}{:>12}".format(module + "." + cls + "_" + instance, *result))
+    finally:
+        tracemalloc.stop()
+        sim.uninstall()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Host report of the firmware import costs.
+
+Imports each firmware module on a clean module table, against the fake
+MicroPython modules, and prints its import time and the heap it takes
+(tracemalloc) including the firmware modules it pulls in. Modules loaded at
+boot by main.py are marked, the others load at first use through
+tools/imports.py. The board logs its own costs at boot ("Import ..." lines)
+and shows them in the menu [5] PROFILE page.
+
+    python3 -m simulator.imports
+"""
+
+import argparse
+from gc import collect  # The host one, the firmware gets the heap model.
+import importlib
+import os
+import sys
+import time
+import tracemalloc
+from simulator.sim import SIM, SCENARIO
+
+"""Modules main.py imports at boot."""
+BOOT = ("pyboard", "scheduler", "session", "tools.utils", "tools.startup", "tools.imports")
+
+def modules(firmware):
+    """Lists the firmware modules, boot.py and main.py excluded.
+
+    Params:
+        firmware(str): firmware dir
+    Returns:
+        [module,...]
+    """
+    names = []
+    for dir_, package in ((firmware, ""), (os.path.join(firmware, "tools"), "tools.")):
+        for name in sorted(os.listdir(dir_)):
+            if name.endswith(".py") and name not in ("boot.py", "main.py"):
+                names.append(package + name[:-3])
+    return names
+
+def _loaded(flash):
+    """Returns the loaded firmware modules, the tools namespace package included."""
+    return [name for name in sys.modules if name == "tools" or (getattr(sys.modules[name], "__file__", None) or "").startswith(flash)]
+
+def cost(module, flash):
+    """Imports a module on a clean module table.
+
+    Params:
+        module(str)
+        flash(str): firmware copy dir
+    Returns:
+        ms(float), heap bytes(int), [firmware modules pulled in,...] or
+        None if the module can't be imported on the host
+    """
+    for name in _loaded(flash):
+        del sys.modules[name]
+    collect()
+    heap = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    try:
+        importlib.import_module(module)
+    except ImportError:
+        return None
+    ms = (time.perf_counter() - t0) * 1000
+    collect()
+    return ms, tracemalloc.get_traced_memory()[0] - heap, [name for name in _loaded(flash) if name not in (module, "tools")]
+
+def main():
+    parser = argparse.ArgumentParser(prog="python3 -m simulator.imports", description="Shows the firmware import costs.")
+    parser.add_argument("-f", "--firmware", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "firmware"), help="firmware dir")
+    parser.add_argument("-s", "--scenario", default=SCENARIO, help="scenario json file")
+    args = parser.parse_args()
+    sim = SIM(args.firmware, os.path.abspath(args.scenario))
+    sim.install()
+    tracemalloc.start()
+    try:
+        for module in modules(sim.flash) * 2:  # Loads the fakes and the host modules the firmware needs, fills the host caches.
+            cost(module, sim.flash)
+        results = [(module, cost(module, sim.flash)) for module in modules(sim.flash)]
+        boot = set(BOOT)
+        for module, result in results:
+            if module in BOOT and result:
+                boot.update(result[2])
+        print("{:<24}{:>6}{:>10}{:>12}  {}".format("MODULE", "BOOT", "ms", "HEAP bytes", "PULLS IN"))
+        for module, result in results:
+            if result is None:
+                print("{:<24}{:>6}{:>10}".format(module, "", "n/a"))
+                continue
+            ms, heap, deps = result
+            print("{:<24}{:>6}{:>10.2f}{:>12}  {}".format(module, "*" if module in boot else "", ms, heap, " ".join(sorted(deps))))
+    finally:
+        tracemalloc.stop()
+        sim.uninstall()
+
+if __name__ == "__main__":
+    main()
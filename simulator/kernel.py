@@ -0,0 +1,267 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Virtual clock shared by the fake MicroPython modules.
+
+Simulated threads never wait in real time: a thread that sleeps, or blocks on
+a lock or a stream, parks itself with a wakeup time and, when every simulated
+thread is parked, the clock jumps to the earliest wakeup. A day of firmware
+time elapses in the time the host takes to run the awake periods.
+"""
+
+import sys
+import threading
+import traceback
+
+INF = float("inf")
+
+class KERNEL(object):
+    """Creates the virtual clock and the simulated threads table.
+
+    Params:
+        epoch(int): embedded epoch (seconds since 2000-01-01) at boot
+        duration(int): seconds of simulated time before halting
+        drift(float): rtc oscillator error in ppm, positive runs fast
+        spin(int): clock reads allowed to a thread between two parks, busy
+            waiting threads are parked past this limit, 1 ms at first then
+            doubling up to 16 ms
+    """
+
+    def __init__(self, epoch=0, duration=86400, spin=100, drift=0.0):
+        self.cond = threading.Condition(threading.RLock())
+        self.us = 0  # Microseconds since boot.
+        self.stopped_us = 0  # Microseconds spent in stop mode, ticks don't run.
+        self.utc = epoch  # True embedded epoch at boot, the gps time.
+        self.epoch = epoch  # Rtc seconds when last set.
+        self.rtc_at = 0  # Microseconds since boot when the rtc was last set or trimmed.
+        self.rtc_base = 0  # Rtc microseconds counted since last set at rtc_at.
+        self.drift = drift
+        self.trim = 0.0  # Rtc smooth calibration in ppm.
+        self.until = duration * 1000000
+        self.spin_limit = spin
+        self.threads = {}  # {thread:wakeup_us or None if running,...}
+        self.channels = {}  # {thread:(obj1, obj2,...),...}
+        self.spins = {}  # {thread:clock reads since last park,...}
+        self.backoff = {}  # {thread:last busy wait park us,...}
+        self.stopper = None  # Thread holding the board in stop mode.
+        self.reason = None  # Why the simulation halted.
+        self.done = threading.Event()
+
+    def rtc_us(self):
+        """Returns the rtc embedded epoch in microseconds, drift included."""
+        return self.epoch * 1000000 + self.rtc_base + int((self.us - self.rtc_at) * (1 + (self.drift + self.trim) / 1000000))
+
+    def time(self):
+        """Returns the embedded epoch."""
+        return self.rtc_us() // 1000000
+
+    def set_time(self, epoch):
+        """Sets the embedded epoch, as the rtc does, restarting the subseconds.
+
+        Params:
+            epoch(int)
+        """
+        with self.cond:
+            self.epoch = epoch
+            self.rtc_base = 0
+            self.rtc_at = self.us
+
+    def calibrate(self, ppm):
+        """Trims the rtc rate, as the smooth calibration does.
+
+        Params:
+            ppm(float)
+        """
+        with self.cond:
+            self.rtc_base = self.rtc_us() - self.epoch * 1000000
+            self.rtc_at = self.us
+            self.trim = ppm
+
+    def rtc_error(self):
+        """Returns the rtc error from the true time in microseconds."""
+        return self.rtc_us() - self.utc * 1000000 - self.us
+
+    def ticks_us(self):
+        """Returns the microseconds counted by the systick, stopped in stop mode."""
+        return self.us - self.stopped_us
+
+    def start(self, func, args=(), kwargs={}):
+        """Starts a simulated thread.
+
+        Params:
+            func(obj)
+            args(tuple)
+            kwargs(dict)
+        Returns:
+            thread(obj)
+        """
+        thread = threading.Thread(target=self._run, args=(func, args, kwargs), daemon=True)
+        with self.cond:
+            self.threads[thread] = None
+            self.spins[thread] = 0
+        thread.start()
+        return thread
+
+    def _run(self, func, args, kwargs):
+        """Runs a simulated thread, unregisters it at exit."""
+        me = threading.current_thread()
+        try:
+            func(*args, **kwargs)
+        except SystemExit:
+            pass
+        except BaseException:
+            if not self.reason:
+                print("Unhandled exception in thread started by {}".format(func), file=sys.__stderr__)
+                traceback.print_exc(file=sys.__stderr__)
+        with self.cond:
+            self.threads.pop(me, None)
+            self.channels.pop(me, None)
+            self.spins.pop(me, None)
+            self.backoff.pop(me, None)
+            self._advance()
+
+    def halt(self, reason):
+        """Stops the simulation, parked threads never wake up again.
+
+        Params:
+            reason(str)
+        """
+        with self.cond:
+            if not self.reason:
+                self.reason = reason
+            self.cond.notify_all()
+        self.done.set()
+
+    def park(self, wakeup, channels=(), spinning=False):
+        """Parks the calling thread until wakeup or until one of channels is
+        signalled, call :func:`wake` to signal a channel.
+
+        Params:
+            wakeup(int): microseconds since boot, INF to wait for a signal
+            channels(tuple): objects whose signal wakes up the thread
+            spinning(bool): parked by :func:`spin`
+        """
+        me = threading.current_thread()
+        with self.cond:
+            self.threads[me] = wakeup
+            self.channels[me] = channels
+            self.spins[me] = 0
+            if not spinning:
+                self.backoff[me] = 0
+            self._advance()
+            while self.threads.get(me, None) is not None or self.reason:
+                if self.reason:
+                    self._freeze()
+                self.cond.wait()
+            self.channels[me] = ()
+
+    def _freeze(self):
+        """Blocks forever the threads of a halted simulation."""
+        while True:
+            self.cond.wait()
+
+    def sleep_us(self, us):
+        """Parks the calling thread for us microseconds.
+
+        Params:
+            us(int)
+        """
+        with self.cond:
+            self.park(self.us + max(int(us), 0))
+
+    def spin(self):
+        """Counts a clock read, parks a busy waiting thread."""
+        me = threading.current_thread()
+        count = self.spins.get(me, 0) + 1
+        self.spins[me] = count
+        if count > self.spin_limit:
+            with self.cond:
+                self.backoff[me] = min(max(self.backoff.get(me, 0) * 2, 1000), 16000)
+                self.park(self.us + self.backoff[me], spinning=True)
+
+    def stop(self, wakeup, channels=()):
+        """Parks the calling thread in stop mode: the other threads are frozen
+        and their tick based wakeups are delayed by the time spent stopped.
+
+        Params:
+            wakeup(int): microseconds since boot, INF to wait for a signal
+            channels(tuple): objects whose signal wakes up the board
+        Returns:
+            (int): microseconds spent stopped
+        """
+        me = threading.current_thread()
+        with self.cond:
+            start = self.us
+            self.stopper = me
+            try:
+                self.park(wakeup, channels)
+            finally:
+                self.stopper = None
+            slept = self.us - start
+            self.stopped_us += slept
+            for thread in self.threads:
+                if thread is not me and self.threads[thread] is not None:
+                    self.threads[thread] += slept
+            return slept
+
+    def wake(self, channel, at=None):
+        """Signals a channel, threads parked on it wake up at the given time.
+
+        Params:
+            channel(obj)
+            at(int): microseconds since boot, default now
+        """
+        with self.cond:
+            if at is None or at < self.us:
+                at = self.us
+            for thread in self.threads:
+                if self.threads[thread] is not None and channel in self.channels.get(thread, ()):
+                    self.threads[thread] = min(self.threads[thread], at)
+            self._advance()
+            self.cond.notify_all()
+
+    def _advance(self):
+        """Moves the clock to the earliest wakeup if every thread is parked,
+        call with the condition held."""
+        if self.reason:
+            return
+        wakeups = self.threads.values()
+        if not wakeups or None in wakeups:
+            return
+        if self.stopper in self.threads:  # Only the stopped board may wake up.
+            wakeups = [self.threads[self.stopper]]
+        wakeup = min(wakeups)
+        if wakeup == INF:
+            self.halt("deadlock, every thread waits for a signal")
+            return
+        if wakeup > self.until:
+            self.us = self.until
+            self.halt("end of simulation")
+            return
+        self.us = max(self.us, wakeup)
+        if self.stopper in self.threads:
+            self.threads[self.stopper] = None
+        else:
+            for thread in self.threads:
+                if self.threads[thread] <= self.us:
+                    self.threads[thread] = None
+        self.cond.notify_all()
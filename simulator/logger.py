@@ -0,0 +1,147 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Host test of the system log (firmware tools/logger.py).
+
+Runs the firmware with LOG_LEVEL 1 and checks the log buffer is written out
+each time the board enters stop mode, then logs many times LOG_BUDGET bytes
+and checks the rotated files: their count and sizes, the total within the
+budget, and the kept lines being the last ones, in order. Also checks the
+ERROR lines are written out at once, the lines under LOG_THRESHOLD are
+printed, not saved, and the lines under both LOG_THRESHOLD and
+CONSOLE_THRESHOLD are dropped before their time stamp:
+
+    python3 -m simulator.logger [-d seconds] [-f firmware]
+
+Exits with 1 if a check fails.
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import os
+import sys
+from simulator.sim import SIM, SCENARIO
+
+BUDGETS = 10  # LOG_BUDGET bytes logged by the rotation test.
+
+def sleeps(firmware, duration):
+    """Runs the firmware, reads the log buffer as the board enters stop mode.
+
+    Returns:
+        (stops, stops with buffered lines, log bytes)
+    """
+    sim = SIM(firmware, SCENARIO, duration=duration, constants={"LOG_LEVEL":1})
+    buffered = []
+    stop = sim.report.stop
+    def check():
+        buffered.append(sys.modules["tools.logger"].used)
+        stop()
+    sim.report.stop = check
+    sim.run()
+    log = os.path.join(sim.flash, "Log.txt")
+    for name in [name for name in sys.modules if getattr(sys.modules[name], "__file__", None) and sys.modules[name].__file__.startswith(sim.flash)]:
+        del sys.modules[name]  # The next simulation imports its own copy.
+    return len(buffered), sum(1 for used in buffered if used), os.path.getsize(log) if os.path.exists(log) else 0
+
+def files(sim, logger):
+    """Returns the log files contents, oldest first."""
+    contents = []
+    i = 0
+    while os.path.exists(sim.path(logger.name(i))):
+        with io.open(sim.path(logger.name(i)), "rb") as file_:
+            contents.insert(0, file_.read())
+        i += 1
+    return contents
+
+def units(sim, results):
+    """Runs the rotation, error and threshold tests in a simulated thread."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        utils = importlib.import_module("tools.utils")
+        logger = importlib.import_module("tools.logger")
+        constants = importlib.import_module("constants")
+    constants.LOG_LEVEL = 1
+    opens = sim.report.opens
+    count = 0
+    logged = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        while logged < BUDGETS * constants.LOG_BUDGET:
+            message = "device => message {:07d}".format(count)
+            utils.log_file(message, constants.LOG_LEVEL)
+            logged += len(logger.stamp()) + len(message) + 2
+            count += 1
+        logger.flush()
+    contents = files(sim, logger)
+    numbers = [int(line.rsplit(b" ", 1)[1]) for content in contents for line in content.splitlines()]
+    allowed = constants.LOG_BUDGET // constants.LOG_FILE_SIZE
+    ok = len(contents) == allowed and all(len(content) <= constants.LOG_FILE_SIZE for content in contents)
+    ok &= numbers == list(range(count - len(numbers), count))
+    results.append(("rotation", "{} files, {} bytes".format(len(contents), sum(len(content) for content in contents)),
+        "{} files, {} bytes".format(allowed, constants.LOG_BUDGET), ok))
+    results.append(("opens per line", "{:.3f}".format((sim.report.opens - opens) / count), "< 1", sim.report.opens - opens < count))
+    with contextlib.redirect_stdout(io.StringIO()):
+        utils.log_file("buffered", constants.LOG_LEVEL)
+        buffered = files(sim, logger)[-1].endswith(b"buffered\n")
+        utils.log_file("failed", constants.LOG_LEVEL, level=utils.ERROR)
+        lines = files(sim, logger)[-1].splitlines()[-2:]
+        flushed = lines[0].endswith(b"\tbuffered") and lines[-1].endswith(b"\tfailed")
+    results.append(("error written out", "yes" if flushed else "no", "yes", flushed and not buffered))
+    printed = io.StringIO()
+    threshold = constants.CONSOLE_THRESHOLD
+    constants.CONSOLE_THRESHOLD = utils.DEBUG
+    with contextlib.redirect_stdout(printed):
+        utils.log_file("printed only", constants.LOG_LEVEL, level=utils.DEBUG)
+    constants.CONSOLE_THRESHOLD = threshold
+    dropped = printed.getvalue().endswith("\tprinted only\n") and not logger.used
+    results.append(("debug printed only", "yes" if dropped else "no", "yes", dropped))
+    printed = io.StringIO()
+    stamps = []
+    stamp = logger.stamp
+    logger.stamp = lambda: stamps.append(1) or stamp()
+    with contextlib.redirect_stdout(printed):
+        utils.log_file("dropped", constants.LOG_LEVEL, level=utils.DEBUG)
+    logger.stamp = stamp
+    dropped = not printed.getvalue() and not stamps and not logger.used
+    results.append(("debug dropped", "yes" if dropped else "no", "yes", dropped))
+
+def main():
+    parser = argparse.ArgumentParser(prog="python3 -m simulator.logger", description="Tests the system log buffer and rotation.")
+    parser.add_argument("-f", "--firmware", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "firmware"), help="firmware dir")
+    parser.add_argument("-d", "--duration", type=int, default=3600, help="simulated seconds of the sleep test")
+    args = parser.parse_args()
+    firmware = os.path.abspath(args.firmware)
+    stops, dirty, size = sleeps(firmware, args.duration)
+    results = [("flush on sleep", "{} of {} stops".format(stops - dirty, stops), "all, log {} bytes".format(size), stops and not dirty and size)]
+    sim = SIM(firmware, SCENARIO)
+    sim.install()
+    try:
+        sim.kernel.start(units, (sim, results)).join()
+    finally:
+        sim.uninstall()
+    print("{:<20}{:>24}{:>24}{:>6}".format("TEST", "RESULT", "EXPECTED", "OK"))
+    for name, result, expected, ok in results:
+        print("{:<20}{:>24}{:>24}{:>6}".format(name, result, expected, "yes" if ok else "NO"))
+    sys.exit(0 if len(results) == 6 and all(result[3] for result in results) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Host check of the mooring watch (firmware tools/mooring.py).
+
+Feeds synthetic tracks, one fix every 30 s around the anchor, and shows per
+track the fix raising the breakaway alarm against the one expected from the
+haversine distances, the largest distance error against the haversine one,
+and the host cost per fix of parsing the fix to minutes and updating the
+watch against parsing it to degrees and computing its haversine distance.
+The "dateline" track swings across the antimeridian, "reboot adrift" learns
+its anchor from the first fix, breaks away and resets while adrift, the
+alarm must follow the reset:
+
+    python3 -m simulator.mooring [-n fixes]
+
+Exits with 1 if an alarm is missed or raised at the wrong fix.
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import math
+import os
+import random
+import sys
+import time
+from simulator.sim import SIM, SCENARIO
+
+ANCHOR = (45.640208, 13.752013)  # deg. 4538.4125N 01345.1208E
+RADIUS = 150  # m
+FIXES = 3
+EVERY = 30  # s
+R = 6371008.8  # m. Earth mean radius.
+
+def _moored(i):
+    """Swings on a 60 m rode with a few metres of gps noise."""
+    angle = i * 0.05
+    return 60 * math.sin(angle) + random.gauss(0, 3), 60 * math.cos(angle) + random.gauss(0, 3)
+
+def _drag(i):
+    """Drags east at 2 cm/s."""
+    return 0.02 * i * EVERY + random.gauss(0, 3), random.gauss(0, 3)
+
+def _breakaway(i):
+    """Moored, then adrift north-east at 0.5 m/s from the 100th fix."""
+    x, y = _moored(i)
+    if i >= 100:
+        x += 0.35 * (i - 100) * EVERY
+        y += 0.35 * (i - 100) * EVERY
+    return x, y
+
+def _far(i):
+    """Wanders 5 km away, to show the approximation error."""
+    return 5000 * math.sin(i * 0.01), 5000 * math.cos(i * 0.01)
+
+TRACKS = (("moored", _moored, ANCHOR), ("drag", _drag, ANCHOR), ("breakaway", _breakaway, ANCHOR), ("far", _far, ANCHOR),
+    ("dateline", _moored, (-17.7, 179.9997)))
+REBOOT = 150  # Fix of the reset of the reboot adrift track, after the breakaway.
+
+def _nmea(value, positive, negative, digits):
+    """Formats degrees as a NMEA coordinate and hemisphere."""
+    hemisphere = positive if value >= 0 else negative
+    value = abs(value)
+    degrees = int(value)
+    return "{:0{}d}{:07.4f}".format(degrees, digits, (value - degrees) * 60), hemisphere
+
+def _track(function, fixes, anchor=ANCHOR):
+    """Returns the track fixes [(lat, ns, lon, ew, epoch),...]."""
+    track = []
+    for i in range(fixes):
+        x, y = function(i)
+        lat = anchor[0] + math.degrees(y / R)
+        lon = (anchor[1] + math.degrees(x / (R * math.cos(math.radians(anchor[0])))) + 180) % 360 - 180
+        track.append(_nmea(lat, "N", "S", 2) + _nmea(lon, "E", "W", 3) + (1767225600 + i * EVERY,))
+    return track
+
+def _degrees(value, hemisphere):
+    """Parses a NMEA coordinate as degrees, the string way."""
+    dot = value.find(".")
+    degrees = float(value[:dot - 2]) + float(value[dot - 2:]) / 60
+    return -degrees if hemisphere in ("S", "W") else degrees
+
+def _haversine(lat1, lon1, lat2, lon2):
+    """Returns the great circle distance (m) between two positions (deg)."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * R * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+def _reference(track, anchor):
+    """Returns the haversine distances and the expected alarm fix, None if none."""
+    distances = [_haversine(anchor[0], anchor[1], _degrees(lat, ns), _degrees(lon, ew)) for lat, ns, lon, ew, epoch in track]
+    outside = 0
+    for i, distance in enumerate(distances):
+        outside = outside + 1 if distance > RADIUS else 0
+        if outside == FIXES:
+            return distances, i
+    return distances, None
+
+def check(mooring, name, function, fixes, anchor=ANCHOR):
+    """Runs a track through the watch.
+
+    Returns:
+        alarm fix, expected alarm fix, max error (m) and us per fix of
+        :func:`tools.mooring.parse`, :func:`tools.mooring.fix`, degrees
+        parsing and haversine distance
+    """
+    random.seed(name)
+    track = _track(function, fixes, anchor)
+    lat, ns, lon, ew, epoch = track[0]
+    mooring.init({"Anchor":"{}{} {}{}".format(lat, ns, lon, ew), "Watch_Radius":RADIUS, "Watch_Fixes":FIXES})
+    anchor = (_degrees(lat, ns), _degrees(lon, ew))
+    distances, expected = _reference(track, anchor)
+    start = time.perf_counter()
+    minutes = [(mooring.parse(lat, ns), mooring.parse(lon, ew), epoch) for lat, ns, lon, ew, epoch in track]
+    parse = time.perf_counter() - start
+    watched = []
+    alarm = None
+    start = time.perf_counter()
+    for i, (lat, lon, epoch) in enumerate(minutes):
+        watched.append(mooring.fix(lat, lon, epoch))
+        if alarm is None and mooring.alarm:
+            alarm = i
+    watch = time.perf_counter() - start
+    error = max(abs(watched[i] - distances[i]) for i in range(fixes))
+    start = time.perf_counter()
+    degrees = [(_degrees(lat, ns), _degrees(lon, ew)) for lat, ns, lon, ew, epoch in track]
+    parse_degrees = time.perf_counter() - start
+    start = time.perf_counter()
+    for lat, lon in degrees:
+        _haversine(anchor[0], anchor[1], lat, lon)
+    haversine = time.perf_counter() - start
+    return (alarm, expected, error) + tuple(value * 1e6 / fixes for value in (parse, watch, parse_degrees, haversine))
+
+def reboot(mooring, fixes):
+    """Runs the breakaway track with a learned anchor, resets the board at
+    the REBOOT fix.
+
+    Returns:
+        first alarm fix after the reset, expected one
+    """
+    random.seed("reboot")
+    track = _track(_breakaway, fixes)
+    lat, ns, lon, ew, epoch = track[0]
+    anchor = (_degrees(lat, ns), _degrees(lon, ew))
+    distances, expected = _reference(track[REBOOT:], anchor)
+    config = {"Anchor":"", "Watch_Radius":RADIUS, "Watch_Fixes":FIXES}
+    try:
+        os.remove(sys.modules["simulator.sim"].current.path(mooring.ANCHOR_FILE))
+    except (AttributeError, OSError):
+        pass
+    mooring.init(config)
+    for lat, ns, lon, ew, epoch in track[:REBOOT]:
+        mooring.fix(mooring.parse(lat, ns), mooring.parse(lon, ew), epoch)
+    mooring = importlib.reload(mooring)  # The reset, the watch restarts from its config.
+    mooring.init(config)
+    for i, (lat, ns, lon, ew, epoch) in enumerate(track[REBOOT:]):
+        mooring.fix(mooring.parse(lat, ns), mooring.parse(lon, ew), epoch)
+        if mooring.alarm:
+            return REBOOT + i, REBOOT + expected
+    return None, None if expected is None else REBOOT + expected
+
+def main():
+    parser = argparse.ArgumentParser(prog="python3 -m simulator.mooring", description="Checks the mooring watch on synthetic tracks.")
+    parser.add_argument("-f", "--firmware", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "firmware"), help="firmware dir")
+    parser.add_argument("-n", "--fixes", type=int, default=2880, help="fixes per track")
+    args = parser.parse_args()
+    sim = SIM(os.path.abspath(args.firmware), SCENARIO)
+    sim.install()
+    failed = False
+    try:
+        mooring = importlib.import_module("tools.mooring")
+        print("{:<12}{:>8}{:>10}{:>10}{:>10}{:>10}{:>10}{:>10}".format("TRACK", "ALARM", "EXPECTED", "ERROR m", "PARSE us", "WATCH us", "DEG us", "HAV us"))
+        for name, function, anchor in TRACKS:
+            with contextlib.redirect_stdout(io.StringIO()):  # Drops the alarm logs.
+                result = check(mooring, name, function, args.fixes, anchor)
+            failed |= result[0] != result[1]
+            print("{:<12}{:>8}{:>10}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}".format(name, str(result[0]), str(result[1]), *result[2:]))
+        stats = mooring.stats()
+        with contextlib.redirect_stdout(io.StringIO()):
+            alarm, expected = reboot(mooring, args.fixes)
+        failed |= alarm != expected
+        print("{:<12}{:>8}{:>10}".format("reboot adrift", str(alarm), str(expected)))
+        print("last track: {} fixes, mean {:.1f} m, std {:.1f} m, peak {:.1f} m, drift {:.2f} m/s {:.0f} deg".format(
+            stats["fixes"], stats["mean"], stats["std"], stats["peak"], stats["speed"], stats["heading"]))
+    finally:
+        sim.uninstall()
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
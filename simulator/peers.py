@@ -0,0 +1,486 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Byte sources feeding the simulated uarts and i2c devices.
+
+Sources are built from the scenario "Uarts" and "I2c" sections, a source
+gated by a "Pin" only talks while the pin is high, as a device powered by the
+board.
+
+Data templates may contain the {hhmmss}, {ddmmyy}, {date} and {time} fields,
+filled with the virtual utc time, and the {cs} field, filled with the NMEA
+checksum of the text between the "$" and "*" before it.
+"""
+
+import re
+import time
+from simulator.kernel import INF
+
+BACKLOG = 16  # Max chunks generated at once by a periodic source.
+
+def fill(template, epoch):
+    """Fills a data template.
+
+    Params:
+        template(str)
+        epoch(int): unix epoch
+    Returns:
+        (bytes)
+    """
+    t = time.gmtime(epoch)
+    data = template.replace(
+        "{hhmmss}", "{:02d}{:02d}{:02d}".format(t.tm_hour, t.tm_min, t.tm_sec)).replace(
+        "{ddmmyy}", "{:02d}{:02d}{:02d}".format(t.tm_mday, t.tm_mon, t.tm_year % 100)).replace(
+        "{date}", "{:04d}-{:02d}-{:02d}".format(t.tm_year, t.tm_mon, t.tm_mday)).replace(
+        "{time}", "{:02d}:{:02d}:{:02d}".format(t.tm_hour, t.tm_min, t.tm_sec))
+    parts = data.split("{cs}")
+    for i in range(len(parts) - 1):  # Each checksum of the sentence before it.
+        body = parts[i][parts[i].rindex("$") + 1:parts[i].rindex("*")]
+        checksum = 0
+        for char in body:
+            checksum ^= ord(char)
+        parts[i] += "{:02X}".format(checksum)
+    data = "".join(parts)
+    return data.encode("latin-1")
+
+class SOURCE(object):
+    """Base byte source.
+
+    Params:
+        pin(str): power pin name, None if always powered
+    """
+
+    def __init__(self, pin=None):
+        self.pin = pin
+        self.sim = None
+
+    def attach(self, sim):
+        """Binds the source to the simulation.
+
+        Params:
+            sim(obj): :class:`simulator.sim.SIM`
+        """
+        self.sim = sim
+
+    def powered(self):
+        """Returns True if the source may talk."""
+        return not self.pin or bool(self.sim.pins.get(self.pin, 0))
+
+    def epoch(self, us):
+        """Returns the unix epoch at the given time.
+
+        Params:
+            us(int): microseconds since boot
+        """
+        return 946684800 + self.sim.kernel.utc + us // 1000000
+
+    def pending(self, now):
+        """Returns the chunks due by now.
+
+        Params:
+            now(int): microseconds since boot
+        Returns:
+            [bytes,...]
+        """
+        return []
+
+    def next_at(self, now):
+        """Returns the time of the next chunk, INF if unknown.
+
+        Params:
+            now(int): microseconds since boot
+        """
+        return INF
+
+    def received(self, data, now):
+        """Handles bytes written by the board.
+
+        Params:
+            data(bytes)
+            now(int): microseconds since boot
+        """
+        return
+
+    def switched(self, pin, value, now):
+        """Handles a board pin change.
+
+        Params:
+            pin(str)
+            value(int)
+            now(int): microseconds since boot
+        """
+        return
+
+class PERIODIC(SOURCE):
+    """Sends a data template at a fixed rate.
+
+    Params:
+        every_ms(int)
+        data(str): template
+        offset_ms(int): first chunk time
+        pin(str)
+    """
+
+    def __init__(self, every_ms, data, offset_ms=0, pin=None):
+        SOURCE.__init__(self, pin)
+        self.every = every_ms * 1000
+        self.data = data
+        self.next = offset_ms * 1000
+
+    def pending(self, now):
+        chunks = []
+        if self.next <= now:
+            skip = max((now - self.next) // self.every + 1 - BACKLOG, 0)
+            self.next += skip * self.every
+            while self.next <= now:
+                if self.powered():
+                    chunks.append(fill(self.data, self.epoch(self.next)))
+                self.next += self.every
+        return chunks
+
+    def next_at(self, now):
+        if not self.powered():
+            return INF
+        return max(self.next, now)
+
+class RECORDED(SOURCE):
+    """Replays a recorded stream.
+
+    Params:
+        stream(list): [[ms since boot, data],...]
+        pin(str)
+    """
+
+    def __init__(self, stream, pin=None):
+        SOURCE.__init__(self, pin)
+        self.stream = sorted([[int(item[0]) * 1000, item[1]] for item in stream])
+
+    def pending(self, now):
+        chunks = []
+        while self.stream and self.stream[0][0] <= now:
+            item = self.stream.pop(0)
+            if self.powered():
+                chunks.append(fill(item[1], self.epoch(item[0])))
+        return chunks
+
+    def next_at(self, now):
+        if not self.stream or not self.powered():
+            return INF
+        return max(self.stream[0][0], now)
+
+class RESPONDER(SOURCE):
+    """Replies to the commands written by the board.
+
+    Params:
+        rules(list): [[regex, reply template, delay ms],...]
+        pin(str)
+    """
+
+    def __init__(self, rules, pin=None):
+        SOURCE.__init__(self, pin)
+        self.rules = [(re.compile(rule[0].encode("latin-1")), rule[1], int(rule[2]) * 1000) for rule in rules]
+        self.buffer = b""
+        self.queue = []  # [[us, data],...]
+
+    def received(self, data, now):
+        if not self.powered():
+            return
+        self.buffer = (self.buffer + data)[-1024:]
+        matched = True
+        while matched:
+            matched = False
+            for rule in self.rules:
+                match = rule[0].search(self.buffer)
+                if match:
+                    self.queue.append([now + rule[2], rule[1]])
+                    self.buffer = self.buffer[match.end():]
+                    matched = True
+                    break
+        self.queue.sort(key=lambda item: item[0])
+
+    def pending(self, now):
+        chunks = []
+        while self.queue and self.queue[0][0] <= now:
+            item = self.queue.pop(0)
+            if self.powered():
+                chunks.append(fill(item[1], self.epoch(item[0])))
+        return chunks
+
+    def next_at(self, now):
+        if not self.queue:
+            return INF
+        return max(self.queue[0][0], now)
+
+class DDC(object):
+    """I2c receiver holding its sources output until read, as the u-blox DDC
+    interface: registers 0xFD-0xFE give the bytes available (big endian), 0xFF
+    streams them (0xFF once empty).
+
+    Params:
+        sources(list): [source,...]
+        size(int): receiver buffer length, newer bytes are dropped once full
+    """
+
+    def __init__(self, sources, size=4096):
+        self.sources = sources
+        self.size = size
+        self.buffer = bytearray()
+        self.dropped = 0
+
+    def powered(self):
+        """Returns True if the device answers on the bus."""
+        return all(source.powered() for source in self.sources)
+
+    def _pump(self, now):
+        """Moves the due chunks into the receiver buffer."""
+        if not self.powered():
+            del self.buffer[:]
+            return
+        for source in self.sources:
+            for chunk in source.pending(now):
+                free = self.size - len(self.buffer)
+                if len(chunk) > free:
+                    self.dropped += len(chunk) - free
+                    chunk = chunk[:free]
+                self.buffer += chunk
+
+    def read(self, register, nbytes, now):
+        """Reads from a register on.
+
+        Params:
+            register(int)
+            nbytes(int)
+            now(int): microseconds since boot
+        Returns:
+            (bytes)
+        """
+        self._pump(now)
+        count = min(len(self.buffer), 0xFFFF)
+        data = bytearray()
+        while len(data) < nbytes:
+            if register == 0xFD:
+                data.append(count >> 8)
+            elif register == 0xFE:
+                data.append(count & 0xFF)
+            elif register == 0xFF:
+                take = min(nbytes - len(data), len(self.buffer))
+                data += self.buffer[:take]
+                del self.buffer[:take]
+                data += b"\xff" * (nbytes - len(data))
+                break
+            else:
+                data.append(0)
+            register += 1
+        return bytes(data)
+
+class GNSS(SOURCE):
+    """Gps receiver with a time to first fix, as a MTK one (Quectel L80).
+
+    A start is hot (ephemeris younger than "Ephemeris_S", time and position
+    known), warm (time and position known) or cold. The receiver keeps them
+    through power cycles if "Backup" (V_BCKP supplied) and in standby
+    (PMTK161, left at the next byte received), PMTK740 gives the time and
+    PMTK741 the position. At each fix it sends the "Data" templates, their
+    {status} field filled with A once fixed, V before, and {quality} with 1
+    or 0. PMTK314 selects the sentences and PMTK220 the fix interval, both
+    kept as the ephemeris, and rejected (PMTK001 flag 1) if "Pmtk" is 0.
+    The receiver boots in "Boot_Ms" from power on, then sends PMTK010,001,
+    commands received before are lost.
+
+    Params:
+        config(dict): {"Data", "Hot_S", "Warm_S", "Cold_S", "Ephemeris_S",
+            "Backup", "Pmtk", "Boot_Ms"}
+        pin(str)
+    """
+
+    FIELDS = ("GLL", "RMC", "VTG", "GGA", "GSA", "GSV")  # PMTK314 order.
+
+    def __init__(self, config, pin=None):
+        SOURCE.__init__(self, pin)
+        self.data = config["Data"]
+        self.ttffs = {kind:int(float(config.get(kind.capitalize() + "_S", default)) * 1000000) for kind, default in (("hot", 1), ("warm", 30), ("cold", 35))}
+        self.ephemeris_us = int(config.get("Ephemeris_S", 7200)) * 1000000
+        self.backup = bool(config.get("Backup", 0))
+        self.pmtk = bool(config.get("Pmtk", 1))
+        self.boot_us = int(config.get("Boot_Ms", 0)) * 1000
+        self.booted = 0  # Power on time + boot.
+        self.lost = 0  # Commands lost while booting.
+        self.enabled = None  # Sentences sent, None all.
+        self.interval = 1000000  # Fix interval.
+        self.replies = []  # [[us, data],...]
+        self.on = self.standby = False
+        self.time = self.position = False
+        self.ephemeris = None  # Last tracking time.
+        self.start = 0  # Acquisition start.
+        self.kind = "cold"  # Acquisition start kind.
+        self.fix_at = INF
+        self.fixed = False
+        self.next = INF  # Next output.
+        self.since = 0  # Last accounting time.
+        self.active_us = self.standby_us = 0
+        self.starts = {"hot":0, "warm":0, "cold":0}
+        self.ttff = []  # s
+
+    def _kind(self, now):
+        if self.time and self.position and self.ephemeris is not None and now - self.ephemeris < self.ephemeris_us:
+            return "hot"
+        if self.time and self.position:
+            return "warm"
+        return "cold"
+
+    def _account(self, now):
+        """Counts the receiver time, tracking refreshes the ephemeris."""
+        if self.on:
+            if self.standby:
+                self.standby_us += now - self.since
+            else:
+                self.active_us += now - self.since
+                if self.fixed:
+                    self.ephemeris = now
+        self.since = now
+
+    def _acquire(self, now):
+        """Starts an acquisition."""
+        self.start = now
+        self.fixed = False
+        self.kind = self._kind(now)
+        self.fix_at = now + self.ttffs[self.kind]
+        at = max(now, self.booted)  # Silent while booting.
+        self.next = at - at % self.interval + self.interval
+
+    def switched(self, pin, value, now):
+        if pin != self.pin:
+            return
+        self._account(now)
+        if value and not self.on:
+            self.on = True
+            self.booted = now + self.boot_us
+            self.replies.append([self.booted, "$PMTK010,001*{cs}\r\n"])
+            self._acquire(now)
+        elif not value and self.on:
+            self.on = self.standby = self.fixed = False
+            self.next = self.fix_at = INF
+            self.replies = []
+            if not self.backup:
+                self.time = self.position = False
+                self.ephemeris = None
+                self.enabled = None
+                self.interval = 1000000
+
+    def received(self, data, now):
+        if not self.on:
+            return
+        if now < self.booted:
+            self.lost += data.count(b"$PMTK")
+            return
+        self._account(now)
+        if self.standby:
+            self.standby = False
+            self._acquire(now)
+        if b"PMTK740," in data:
+            self.time = True
+        if b"PMTK741," in data:
+            self.position = True
+        kind = self._kind(now)
+        if not self.fixed and self.ttffs[kind] < self.ttffs[self.kind]:  # Aiding speeds up the running acquisition.
+            self.kind = kind
+            self.fix_at = self.start + self.ttffs[kind]
+        for match in re.finditer(rb"\$PMTK(\d+),?([^*]*)\*", data):
+            command, body = match.group(1).decode(), match.group(2).decode()
+            flag = 3
+            if command == "314" or command == "220":
+                if not self.pmtk:
+                    flag = 1
+                elif command == "314":
+                    self.enabled = [field for field, value in zip(self.FIELDS, body.split(",")) if value != "0"]
+                else:
+                    self.interval = int(body) * 1000
+            self.replies.append([now + 10000, "$PMTK001,{},{}*{{cs}}\r\n".format(command, flag)])
+        if b"PMTK161,0" in data:
+            self.standby = True
+            self.next = self.fix_at = INF
+
+    def pending(self, now):
+        chunks = []
+        while self.replies and self.replies[0][0] <= now:
+            chunks.append(fill(self.replies.pop(0)[1], 0))
+        if not self.on or self.standby:
+            return chunks
+        self._account(now)
+        self.next += max((now - self.next) // self.interval + 1 - BACKLOG, 0) * self.interval
+        while self.next <= now:
+            if not self.fixed and self.next >= self.fix_at:
+                self.fixed = True
+                self.time = self.position = True
+                self.ephemeris = self.next
+                self.starts[self.kind] += 1
+                self.ttff.append((self.fix_at - self.start) / 1000000)
+            status, quality = ("A", "1") if self.fixed else ("V", "0")
+            for template in self.data:
+                if self.enabled is None or template[3:6] in self.enabled:
+                    chunks.append(fill(template.replace("{status}", status).replace("{quality}", quality), self.epoch(self.next)))
+            self.next += self.interval
+        return chunks
+
+    def next_at(self, now):
+        reply = self.replies[0][0] if self.replies else INF
+        if not self.on or self.standby:
+            return max(reply, now) if self.replies else INF
+        return max(min(self.next, reply), now)
+
+    def summary(self):
+        """Returns the receiver figures for the report."""
+        self._account(self.sim.kernel.us)
+        return {
+            "gnss_active_s":self.active_us // 1000000,
+            "gnss_standby_s":self.standby_us // 1000000,
+            "gnss_fixes":len(self.ttff),
+            "gnss_ttff_mean_s":round(sum(self.ttff) / len(self.ttff), 2) if self.ttff else 0,
+            "gnss_hot":self.starts["hot"],
+            "gnss_warm":self.starts["warm"],
+            "gnss_cold":self.starts["cold"],
+            "gnss_lost_cmds":self.lost}
+
+def build(config):
+    """Creates the sources of a scenario uart or i2c device section.
+
+    Params:
+        config(dict): {"Pin", "Periodic", "Recorded", "Responses", "Gnss"}
+    Returns:
+        [source,...]
+    """
+    pin = config.get("Pin")
+    sources = []
+    for item in config.get("Periodic", []):
+        sources.append(PERIODIC(item["Every_Ms"], item["Data"], item.get("Offset_Ms", 0), pin))
+    if "Recorded" in config:
+        stream = config["Recorded"]
+        if isinstance(stream, str):  # Json lines file [ms, data].
+            import json
+            with open(stream) as file_:
+                stream = [json.loads(line) for line in file_ if line.strip()]
+        sources.append(RECORDED(stream, pin))
+    if "Gnss" in config:
+        sources.append(GNSS(config["Gnss"], pin))
+    if "Responses" in config:
+        sources.append(RESPONDER([[item["Expect"], item["Reply"], item.get("Delay_Ms", 0)] for item in config["Responses"]], pin))
+    return sources
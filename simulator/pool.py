@@ -0,0 +1,113 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Host run of the device task pool (firmware tools/pool.py POOL) with hung
+devices.
+
+Queues DEVICES tasks every INTERVAL s for DURATION s of virtual time, as the
+scheduler does, and checks the overruns every second, as the main loop does.
+The HUNG devices never return from their tasks before HANG s, as a driver
+stuck in a loop that ignores its deadline. Shows the pool peak concurrency
+and max queue latency, the worker threads started at most, the jobs refused,
+and the runs started while a previous run of the same device was still
+going:
+
+    python3 -m simulator.pool [-f firmware]
+
+Exits with 1 if the workers exceed WORKERS + WORKER_SPARES or a device runs
+twice at a time.
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import os
+import sys
+from simulator.sim import SIM, SCENARIO
+
+DURATION = 1800  # s
+INTERVAL = 10  # s
+HANG = 600  # s
+"""Task seconds {device:s,...}."""
+DEVICES = {"dev_a.FAST_1":2, "dev_a.SLOW_1":8, "dev_b.HUNG_1":HANG, "dev_b.HUNG_2":HANG, "dev_b.HUNG_3":HANG}
+
+def run(sim, figures):
+    """Runs the pool in a simulated thread."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        utils = importlib.import_module("tools.utils")
+        supervisor = importlib.import_module("tools.supervisor")
+        constants = importlib.import_module("constants")
+        pool = importlib.import_module("tools.pool")
+    utime = importlib.import_module("utime")
+    running = {}  # {device:runs,...}
+    overlaps = [0]
+    def create_device(device, tasks=[]):
+        if tasks == ["off"]:
+            return
+        running[device] = running.get(device, 0) + 1
+        if running[device] > 1:
+            overlaps[0] += 1
+        try:
+            utime.sleep(DEVICES[device])
+        finally:
+            running[device] -= 1
+    utils.create_device = create_device
+    base = len(sim.kernel.threads)
+    workers = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        jobs = pool.POOL(constants.WORKERS)
+        for second in range(DURATION):
+            if second % INTERVAL == 0:
+                for device in DEVICES:
+                    jobs.submit(device, ["log"])
+            for device in supervisor.check():
+                jobs.abandon(device)
+            workers = max(workers, len(sim.kernel.threads) - base)
+            utime.sleep(1)
+    figures.update({
+        "limit":constants.WORKERS + getattr(constants, "WORKER_SPARES", 0),
+        "workers":workers,
+        "peak":jobs.peak,
+        "max_latency":jobs.max_latency,
+        "refused":getattr(jobs, "refused", "-"),
+        "overlaps":overlaps[0],
+        "runs":sum(stat[0] for device, stat in supervisor.stats.items() if device in DEVICES),
+        "overruns":sum(stat[1] for device, stat in supervisor.stats.items() if device in DEVICES)})
+
+def main():
+    parser = argparse.ArgumentParser(prog="python3 -m simulator.pool", description="Runs the device task pool with hung devices.")
+    parser.add_argument("-f", "--firmware", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "firmware"), help="firmware dir")
+    args = parser.parse_args()
+    sim = SIM(os.path.abspath(args.firmware), SCENARIO, duration=30 * 86400)
+    sim.install()
+    figures = {}
+    try:
+        sim.kernel.start(run, (sim, figures)).join()
+    finally:
+        sim.uninstall()
+    for key in ("workers", "limit", "peak", "max_latency", "runs", "overruns", "refused", "overlaps"):
+        print("{:<16}{}".format(key, figures.get(key)))
+    sys.exit(0 if figures and figures["workers"] <= figures["limit"] and not figures["overlaps"] else 1)
+
+if __name__ == "__main__":
+    main()
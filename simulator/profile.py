@@ -0,0 +1,103 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Host report of the firmware profiler tables.
+
+Reads the $PROF rows logged by tools/profiler.py to the data files, sent by
+the buoy or written by the simulator, and prints the last table of each file
+sorted by total time.
+
+    python3 -m simulator.profile /path/to/data [more files or dirs]
+"""
+
+import argparse
+import os
+import sys
+
+def parse(row):
+    """Parses a $PROF row.
+
+    Params:
+        row(str): $PROF,unix epoch,site,count,total_us,max_us,site,...
+    Returns:
+        epoch(int), [(site, count, total_us, max_us),...]
+    """
+    fields = row.strip().split(",")
+    sites = []
+    for i in range(2, len(fields) - 3, 4):
+        sites.append((fields[i], int(fields[i + 1]), int(fields[i + 2]), int(fields[i + 3])))
+    return int(fields[1]), sites
+
+def tables(paths):
+    """Yields the last profiler table of each data file.
+
+    Params:
+        paths(list): files or dirs
+    Yields:
+        file(str), epoch(int), [(site, count, total_us, max_us),...]
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path)))
+        else:
+            files.append(path)
+    for file in files:
+        last = None
+        with open(file, errors="replace") as file_:
+            for row in file_:
+                if row.startswith("$PROF,"):
+                    last = row
+        if last:
+            yield (file,) + parse(last)
+
+def show(epoch, sites, stream=sys.stdout):
+    """Prints out a profiler table sorted by total time.
+
+    Params:
+        epoch(int)
+        sites(list)
+        stream(obj)
+    """
+    awake = [site[2] for site in sites if site[0] == "awake"]
+    awake = awake[0] if awake else 0
+    print("{:<32}{:>8}{:>12}{:>10}{:>10}{:>8}".format("SITE", "COUNT", "TOTAL ms", "MEAN ms", "MAX ms", "AWAKE%"), file=stream)
+    for site in sorted(sites, key=lambda site: -site[2]):
+        print("{:<32}{:>8}{:>12.1f}{:>10.2f}{:>10.1f}{:>8}".format(
+            site[0],
+            site[1],
+            site[2] / 1000,
+            site[2] / 1000 / site[1] if site[1] else 0,
+            site[3] / 1000,
+            "{:.1f}".format(100 * site[2] / awake) if awake else "-"), file=stream)
+
+def main():
+    parser = argparse.ArgumentParser(prog="python3 -m simulator.profile", description="Shows the firmware profiler tables.")
+    parser.add_argument("paths", nargs="+", help="data files or dirs")
+    args = parser.parse_args()
+    for file, epoch, sites in tables(args.paths):
+        print("{} ({})".format(file, epoch))
+        show(epoch, sites)
+        print("")
+
+if __name__ == "__main__":
+    main()
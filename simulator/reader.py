@@ -0,0 +1,250 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Host test of the uart reader (firmware device.py DEVICE read methods) on a
+fake uart, and its throughput.
+
+Feeds timed chunks to a fake uart and checks lines split across chunks, a
+frame after noise, a read longer than the receive buffer, reply bursts split
+by "Timeout_Char" gaps and the deadlines: a running one parks the thread, an
+expired one returns at once, a Y32500 task past its deadline returns instead
+of polling a silent station, the METRECX and AQUADOPP replies are waited for
+without polling the uart and a GSMQ2403 reply after line noise is read. Then
+streams NMEA lines at BAUD and shows the host bytes/s of read_line and
+read_frame and the clock reads per kbyte:
+
+    python3 -m simulator.reader [-n kbytes] [-f firmware]
+
+Exits with 1 if a test fails.
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import os
+import sys
+import threading
+import time
+from simulator.sim import SIM, SCENARIO
+from simulator.kernel import INF
+from simulator.peers import SOURCE
+
+BUS = 6  # Not in the default scenario.
+BAUD = 115200
+CHUNK = 64  # Bytes per uart arrival.
+LINE = b"$GPRMC,120000.00,A,4538.4125,N,01345.1208,E,0.12,181.30,010126,,,A*6E\r\n"
+FRAME = b"\xa5\x01\x18\x00" + bytes(range(20))  # Sync, id, whole length, payload.
+
+class CHUNKS(SOURCE):
+    """Replays bytes at given times.
+
+    Params:
+        chunks(list): [(us since boot, bytes),...]
+    """
+
+    def __init__(self, chunks):
+        SOURCE.__init__(self)
+        self.chunks = list(chunks)
+
+    def pending(self, now):
+        data = []
+        while self.chunks and self.chunks[0][0] <= now:
+            data.append(self.chunks.pop(0)[1])
+        return data
+
+    def next_at(self, now):
+        return max(self.chunks[0][0], now) if self.chunks else INF
+
+    def received(self, data, now):
+        pass
+
+def reader(sim, chunks, size=64, gap=10, cls=None):
+    """Returns a device reading chunks, us from now, on the fake uart.
+
+    Params:
+        size(int): receive buffer bytes
+        gap(int): "Timeout_Char" ms
+        cls(obj): device class, default device.DEVICE
+    """
+    if cls is None:
+        cls = sys.modules["device"].DEVICE
+    device = cls.__new__(cls)
+    device.name = "reader"
+    device.config = {"Uart":{"Timeout_Char":gap}}
+    device.uart = sys.modules["pyb"].UART(BUS, BAUD, timeout_char=gap, read_buf_len=4096)
+    device.init_buffer(size)
+    sim.sources[BUS] = [CHUNKS([(sim.kernel.us + us, data) for us, data in chunks])]
+    return device
+
+def _length(mv):
+    """Returns the FRAME length, None if not yet known."""
+    if len(mv) < 3:
+        return
+    return mv[2]
+
+def stream(kbytes, data):
+    """Returns the chunks of kbytes of repeated data at BAUD."""
+    payload = data * (kbytes * 1024 // len(data) + 1)
+    us = CHUNK * 10 * 1000000 // BAUD
+    return [(i // CHUNK * us, payload[i:i + CHUNK]) for i in range(0, len(payload), CHUNK)], len(payload) // len(data)
+
+def units(sim, results, reads):
+    """Runs the tests in a simulated thread."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        device = importlib.import_module("device")
+    utime = importlib.import_module("utime")
+    deadline = lambda ms: utime.ticks_add(utime.ticks_ms(), ms)
+    me = threading.current_thread()
+
+    dev = reader(sim, [(0, b"$A,1*00\r\n$B,"), (5000, b"2*00\r"), (6000, b"\n$C,3*00\r\n")])
+    lines = [dev.read_line(deadline(100)) for _ in range(3)]
+    results.append(("lines across chunks", lines == [b"$A,1*00", b"$B,2*00", b"$C,3*00"]))
+
+    dev = reader(sim, [(0, b"\x00junk\xa5"), (1000, FRAME[1:10]), (2000, FRAME[10:] + FRAME[:5])])
+    results.append(("frame after noise", dev.read_frame(b"\xa5", _length, deadline(100)) == FRAME))
+
+    data = bytes(i % 251 for i in range(300))
+    dev = reader(sim, [(i * 1000, data[i * 50:i * 50 + 50]) for i in range(6)])
+    results.append(("300 bytes, 64 byte buffer", dev.read_bytes(len(data), deadline(100)) == data))
+
+    if hasattr(device.DEVICE, "read_reply"):
+        dev = reader(sim, [(0, b"AB"), (5000, b"CD"), (100000, b"EF")])
+        replies = [dev.read_reply(deadline(1000)) for _ in range(3)]
+        results.append(("replies split by gaps", replies == [b"ABCD", b"EF", None]))
+
+    dev = reader(sim, [])
+    reads[me] = 0
+    start = sim.kernel.us
+    line = dev.read_line(deadline(1000))
+    results.append(("silent 1 s: {} ms, {} reads".format((sim.kernel.us - start) // 1000, reads[me]),
+        line is None and sim.kernel.us - start >= 1000000 and reads[me] < 10))
+    start = sim.kernel.us
+    line = dev.read_line(deadline(-1))
+    results.append(("expired deadline: {} ms".format((sim.kernel.us - start) // 1000), line is None and sim.kernel.us == start))
+
+def meteo(sim, results, reads):
+    """Runs a Y32500 acquisition of a silent station past its 2 s deadline, the
+    scheduler switching it off after OFF s."""
+    OFF = 10
+    with contextlib.redirect_stdout(io.StringIO()):
+        utils = importlib.import_module("tools.utils")
+        supervisor = importlib.import_module("tools.supervisor")
+        cls = importlib.import_module("dev_meteo").Y32500
+    dev = reader(sim, [], cls=cls)
+    dev.name = "dev_meteo.Y32500_1"
+    dev.config.update({"Samples":5, "Data_Format":"STRING"})
+    dev.led = sys.modules["pyb"].LED(1)
+    utils.status_table[dev.name] = 2
+    def off():
+        importlib.import_module("utime").sleep(OFF)
+        utils.status_table[dev.name] = 0
+    switch = sim.kernel.start(off)
+    me = threading.current_thread()
+    reads[me] = 0
+    start = sim.kernel.us
+    token = supervisor.start(dev.name, 2)
+    with contextlib.redirect_stdout(io.StringIO()):
+        dev.main()
+    supervisor.stop(dev.name, token)
+    ms = (sim.kernel.us - start) // 1000
+    results.append(("Y32500 past deadline: {} ms, {} reads".format(ms, reads[me]), ms < 2100))
+    while switch.is_alive():  # A blocking join would stop the virtual clock.
+        importlib.import_module("utime").sleep(1)
+
+def replies(sim, results, reads):
+    """Times the METRECX and AQUADOPP replies, 500 ms after the command."""
+    me = threading.current_thread()
+    for module, cls, reply, expected in (
+            ("dev_aml", "METRECX", b"DISPLAY\r\n>\r\n", ">"),
+            ("dev_nortek", "AQUADOPP", b"\x06\x06", b"\x06\x06")):
+        with contextlib.redirect_stdout(io.StringIO()):
+            dev = reader(sim, [(500000, reply)], cls=getattr(importlib.import_module(module), cls))
+        dev.name = module + "." + cls + "_1"
+        dev.timeout = 10
+        reads[me] = 0
+        start = sim.kernel.us
+        got = dev._get_reply()
+        results.append(("{} reply: {} ms, {} reads".format(cls, (sim.kernel.us - start) // 1000, reads[me]), got == expected and reads[me] < 10))
+    utime = importlib.import_module("utime")
+    with contextlib.redirect_stdout(io.StringIO()):
+        dev = reader(sim, [(0, b"\xff\xfe\r\n"), (500000, b"\r\nOK\r\n")], cls=importlib.import_module("dev_quasar").GSMQ2403)
+    try:
+        got = dev._get_line(utime.ticks_add(utime.ticks_ms(), 1000))
+    except UnicodeError:
+        got = "UnicodeError"
+    results.append(("GSMQ2403 reply after noise: {}".format(got), got == "OK"))
+
+def bench(sim, kbytes, rows, reads):
+    """Times read_line and read_frame on kbytes streams."""
+    utime = importlib.import_module("utime")
+    me = threading.current_thread()
+    for name, data, read in (
+            ("read_line", LINE, lambda dev: dev.read_line(utime.ticks_add(utime.ticks_ms(), 100))),
+            ("read_frame", FRAME, lambda dev: dev.read_frame(b"\xa5", _length, utime.ticks_add(utime.ticks_ms(), 100)))):
+        chunks, count = stream(kbytes, data)
+        dev = reader(sim, chunks, size=512)
+        reads[me] = 0
+        got = 0
+        start = time.process_time()
+        us = sim.kernel.us
+        while got < count and read(dev) is not None:
+            got += 1
+        host = time.process_time() - start
+        rows.append((name, got == count, got * len(data) / host, got * len(data) * 1000000 / max(sim.kernel.us - us, 1), reads[me] * 1024 / (got * len(data))))
+
+def main():
+    parser = argparse.ArgumentParser(prog="python3 -m simulator.reader", description="Tests the uart reader on a fake uart.")
+    parser.add_argument("-f", "--firmware", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "firmware"), help="firmware dir")
+    parser.add_argument("-n", "--kbytes", type=int, default=256, help="kbytes streamed per reader")
+    args = parser.parse_args()
+    sim = SIM(os.path.abspath(args.firmware), SCENARIO, duration=30 * 86400)
+    sim.install()
+    results = []
+    rows = []
+    reads = {}
+    spin = sim.kernel.spin
+    def counted():
+        thread = threading.current_thread()
+        if thread in reads:
+            reads[thread] += 1
+        spin()
+    sim.kernel.spin = counted
+    def tests():
+        units(sim, results, reads)
+        meteo(sim, results, reads)
+        replies(sim, results, reads)
+        bench(sim, args.kbytes, rows, reads)
+    try:
+        sim.kernel.start(tests).join()
+    finally:
+        sim.uninstall()
+    print("{:<44}{:>6}".format("TEST", "OK"))
+    for name, ok in results:
+        print("{:<44}{:>6}".format(name, "yes" if ok else "NO"))
+    print("{:<12}{:>6}{:>14}{:>14}{:>14}".format("READER", "OK", "HOST B/s", "UART B/s", "READS/kB"))
+    for name, ok, host, uart, per_kb in rows:
+        print("{:<12}{:>6}{:>14.0f}{:>14.0f}{:>14.2f}".format(name, "yes" if ok else "NO", host, uart, per_kb))
+    sys.exit(0 if results and all(result[1] for result in results + rows) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Awake time, written bytes and cpu time per wake cycle.
+
+A cycle starts at boot or at wakeup from stop mode and ends when the board
+enters stop mode again. Cpu time is the host process time, meaningful to
+compare runs of the same host, not as an absolute board figure.
+
+The awake time is also split by cpu frequency, its charge (mcu_mah) is
+estimated from MCU_MA, each frequency switch costing SWITCH_US at the new
+frequency.
+"""
+
+import json
+import time
+
+MCU_MA = (4.0, 0.25)  # mA awake at 0 Hz and per MHz, STM32F405 running with its peripherals clocked.
+SWITCH_US = 150  # Pll relock, flash wait states and bus reinitializations per frequency switch.
+
+class REPORT(object):
+    """Collects the per cycle figures.
+
+    Params:
+        kernel(obj): :class:`simulator.kernel.KERNEL`
+    """
+
+    def __init__(self, kernel):
+        self.kernel = kernel
+        self.cycles = []  # [{start, awake_ms, sleep_ms, cpu_ms, written, opens, uart_tx, uart_rx, i2c_reads, i2c_rx, gc, gc_auto, gc_us},...]
+        self.written = 0
+        self.opens = 0
+        self.uart_tx = 0
+        self.uart_rx = 0
+        self.i2c_reads = 0
+        self.i2c_rx = 0
+        self.freq_switches = 0
+        self.freq = 0  # Cpu Hz.
+        self.freq_us = {}  # {Hz:awake us,...}
+        self._freq_at = 0  # Awake time at freq counted up to, us since boot.
+        self._switch_maus = 0  # Charge of the frequency switches, mA us.
+        self.loop_polls = 0
+        self.gc = 0
+        self.gc_auto = 0
+        self.gc_us = 0
+        self.rtc_error_max = 0  # Largest rtc error seen entering stop mode, us.
+        self.probes = []  # Functions returning extra summary figures.
+        self.wall = time.time()
+        self.sleeping = False
+        self._open()
+
+    def _open(self):
+        """Opens a new cycle."""
+        self.cycle = {
+            "start":self.kernel.us // 1000,
+            "awake_ms":0,
+            "sleep_ms":0,
+            "cpu_ms":0,
+            "written":0,
+            "opens":0,
+            "uart_tx":0,
+            "uart_rx":0,
+            "i2c_reads":0,
+            "i2c_rx":0,
+            "gc":0,
+            "gc_auto":0,
+            "gc_us":0}
+        self._cpu = time.process_time()
+
+    def _close(self):
+        """Closes the current cycle."""
+        self.cycle["awake_ms"] = self.kernel.us // 1000 - self.cycle["start"]
+        self.cycle["cpu_ms"] = round((time.process_time() - self._cpu) * 1000, 3)
+        self.cycles.append(self.cycle)
+
+    def write(self, count):
+        """Counts bytes written to flash or sd.
+
+        Params:
+            count(int)
+        """
+        self.written += count
+        self.cycle["written"] += count
+
+    def open(self):
+        """Counts a file opened for writing on flash or sd."""
+        self.opens += 1
+        self.cycle["opens"] += 1
+
+    def uart(self, tx=0, rx=0):
+        """Counts bytes moved through the uarts.
+
+        Params:
+            tx(int)
+            rx(int)
+        """
+        self.uart_tx += tx
+        self.uart_rx += rx
+        self.cycle["uart_tx"] += tx
+        self.cycle["uart_rx"] += rx
+
+    def i2c(self, rx=0):
+        """Counts an i2c read transfer.
+
+        Params:
+            rx(int): bytes read
+        """
+        self.i2c_reads += 1
+        self.i2c_rx += rx
+        self.cycle["i2c_reads"] += 1
+        self.cycle["i2c_rx"] += rx
+
+    def collect(self, us, auto=False):
+        """Counts a garbage collection.
+
+        Params:
+            us(int): collection time
+            auto(bool): triggered by the threshold
+        """
+        self.gc += 1
+        self.gc_us += us
+        self.cycle["gc"] += 1
+        self.cycle["gc_us"] += us
+        if auto:
+            self.gc_auto += 1
+            self.cycle["gc_auto"] += 1
+
+    def _residency(self):
+        """Counts the awake time at the current frequency."""
+        if self.freq and not self.sleeping:
+            self.freq_us[self.freq] = self.freq_us.get(self.freq, 0) + self.kernel.us - self._freq_at
+        self._freq_at = self.kernel.us
+
+    def clock(self, freq):
+        """Counts a cpu frequency switch.
+
+        Params:
+            freq(int): new Hz
+        """
+        self._residency()
+        if self.freq:
+            self._switch_maus += SWITCH_US * (MCU_MA[0] + MCU_MA[1] * freq / 1000000)
+        self.freq = freq
+
+    def stop(self):
+        """Closes the current cycle as the board enters stop mode."""
+        self._residency()
+        self._close()
+        self.rtc_error_max = max(self.rtc_error_max, abs(self.kernel.rtc_error()))
+        self.sleeping = True
+
+    def wake(self, sleep_us):
+        """Opens a new cycle as the board wakes up from stop mode.
+
+        Params:
+            sleep_us(int): time spent in stop mode
+        """
+        self.cycles[-1]["sleep_ms"] = sleep_us // 1000
+        self.sleeping = False
+        self._freq_at = self.kernel.us
+        self._open()
+
+    def summary(self):
+        """Returns the run totals.
+
+        Returns:
+            (dict)
+        """
+        cycles = self.cycles
+        if not self.sleeping:
+            cycles = cycles + [dict(self.cycle, awake_ms=self.kernel.us // 1000 - self.cycle["start"], cpu_ms=round((time.process_time() - self._cpu) * 1000, 3))]
+        simulated = self.kernel.us // 1000
+        awake = sum(cycle["awake_ms"] for cycle in cycles)
+        cpu = [cycle["cpu_ms"] for cycle in cycles] or [0]
+        summary = {
+            "halt":self.kernel.reason,
+            "simulated_s":simulated / 1000,
+            "wall_s":round(time.time() - self.wall, 3),
+            "cycles":len(cycles),
+            "awake_s":awake / 1000,
+            "awake_pct":round(100 * awake / simulated, 3) if simulated else 0,
+            "written":self.written,
+            "file_opens":self.opens,
+            "file_opens_per_cycle":round(self.opens / len(cycles), 2) if cycles else 0,
+            "uart_tx":self.uart_tx,
+            "uart_rx":self.uart_rx,
+            "i2c_reads":self.i2c_reads,
+            "i2c_rx":self.i2c_rx,
+            "freq_switches":self.freq_switches,
+            "mcu_mah":round(self._charge() / 3600, 3),
+            "gc_collections":self.gc,
+            "gc_auto":self.gc_auto,
+            "gc_ms":self.gc_us // 1000,
+            "loop_polls":self.loop_polls,
+            "loop_polls_per_h":round(self.loop_polls * 3600000 / simulated, 1) if simulated else 0,
+            "cpu_ms_total":round(sum(cpu), 3),
+            "cpu_ms_mean":round(sum(cpu) / len(cpu), 3),
+            "cpu_ms_max":max(cpu),
+            "cpu_ms_per_h":round(sum(cpu) * 3600000 / simulated, 1) if simulated else 0,
+            "rtc_error_ms":self.kernel.rtc_error() // 1000,
+            "rtc_error_max_ms":self.rtc_error_max // 1000}
+        for freq in sorted(self.freq_us):
+            if self.freq_us[freq] >= 50000:
+                summary["freq_{}mhz_s".format(freq // 1000000)] = round(self.freq_us[freq] / 1000000, 1)
+        for probe in self.probes:
+            summary.update(probe())
+        return summary
+
+    def _charge(self):
+        """Returns the mcu charge (mA s) drawn awake, switches included."""
+        self._residency()
+        charge = self._switch_maus
+        for freq, us in self.freq_us.items():
+            charge += us * (MCU_MA[0] + MCU_MA[1] * freq / 1000000)
+        return charge / 1000000
+
+    def dump(self, file):
+        """Writes summary and cycles out to a json file.
+
+        Params:
+            file(str)
+        """
+        with open(file, "w") as file_:
+            json.dump({"summary":self.summary(), "cycles":self.cycles}, file_, indent=1)
+
+    def show(self, stream):
+        """Prints out the summary.
+
+        Params:
+            stream(obj)
+        """
+        summary = self.summary()
+        for key in summary:
+            print("{:<16}{}".format(key, summary[key]), file=stream)
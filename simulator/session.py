@@ -0,0 +1,190 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Host test of the remote session expiry (firmware session.py) on the
+virtual clock.
+
+Logs in through a fake console, then counts the clock reads of the firmware
+threads while the session waits (a busy waiting thread reads the clock
+without end) and checks the session ends at its deadlines, as the main loop
+finds it: idle after SESSION_IDLE s, active till SESSION_TIMEOUT s, idle
+after a file transfer longer than SESSION_IDLE s, and at once when the board
+wakes up past them. Then boots the firmware, logs in from the console at
+LOGIN s into the interactive mode and counts the main loop passes per hour
+while the user idles in the menu, LOOP_MAX at most:
+
+    python3 -m simulator.session [-f firmware]
+
+A firmware without the deadlines (-f of an older tree) runs the first test
+only. Exits with 1 if a thread busy waits, a session ends at the wrong time
+or the main loop spins.
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+from simulator.sim import SIM, SCENARIO
+from simulator.bridge import STREAM
+
+WAIT = 60  # s. Clock reads counted.
+STEP = 10  # s. Main loop checks.
+LOGIN = 60  # s since boot.
+MENU = 300  # s. Menu time counted.
+LOOP_MAX = 4000  # Main loop passes per hour, a SESSION_POLL wait each and a few wakeups.
+
+class BOARD(object):
+
+    def __init__(self, console):
+        self.input = [console]
+        self.connected = False  # File transfer mode.
+
+def login(sim, session_class, constants):
+    """Logs in a new session.
+
+    Returns:
+        session, login time
+    """
+    session = session_class(board=BOARD(STREAM(sim.kernel, [(0, (constants.PASSWD + "\r").encode())])), timeout=constants.SESSION_TIMEOUT)
+    with contextlib.redirect_stdout(io.StringIO()):
+        session.login(1)
+    return session, sim.kernel.time()
+
+def expiry(sim, session, touch=None, step=STEP, transfer=0):
+    """Sleeps step seconds between checks till the session ends, touching it
+    every touch seconds, in file transfer mode the first transfer seconds.
+
+    Returns:
+        expiry time
+    """
+    utime = sys.modules["utime"]
+    touched = sim.kernel.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        while session.check():
+            if hasattr(session, "board"):  # Not seen by older firmwares.
+                session.board.connected = sim.kernel.time() - touched < transfer
+            utime.sleep(step)
+            if touch and sim.kernel.time() - touched >= touch:
+                session.touch()
+                touched = sim.kernel.time()
+    return sim.kernel.time()
+
+def tests(sim, results):
+    """Runs the tests in a simulated thread."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        module = importlib.import_module("session")
+        constants = importlib.import_module("constants")
+    reads = {}
+    me = threading.current_thread()
+    spin = sim.kernel.spin
+    def counted():
+        thread = threading.current_thread()
+        if thread is not me:
+            reads[thread] = reads.get(thread, 0) + 1
+        spin()
+    sim.kernel.spin = counted
+    session, start = login(sim, module.SESSION, constants)
+    sys.modules["utime"].sleep(WAIT)
+    results.append(("waiting {} s".format(WAIT), "-", "-", sum(reads.values()), session.loggedin and not sum(reads.values())))
+    if not hasattr(module.SESSION, "check"):
+        return
+    idle = constants.SESSION_IDLE
+    session, start = login(sim, module.SESSION, constants)
+    end = expiry(sim, session, step=1)
+    results.append(("idle", end - start, idle, "-", end - start == idle))
+    session, start = login(sim, module.SESSION, constants)
+    end = expiry(sim, session, touch=idle // 2, step=STEP)
+    results.append(("active", end - start, constants.SESSION_TIMEOUT, "-", 0 <= end - start - constants.SESSION_TIMEOUT < STEP))
+    session, start = login(sim, module.SESSION, constants)
+    end = expiry(sim, session, step=STEP, transfer=2 * idle)
+    results.append(("file transfer {} s".format(2 * idle), end - start, 3 * idle, "-", 0 <= end - start - 3 * idle <= STEP))
+    session, start = login(sim, module.SESSION, constants)
+    end = expiry(sim, session, step=constants.SESSION_TIMEOUT + 3600)
+    results.append(("asleep past the end", end - start, constants.SESSION_TIMEOUT + 3600, "-", end - start == constants.SESSION_TIMEOUT + 3600))
+
+def mainloop(firmware, results):
+    """Runs main.py, logs in from the console and counts the main loop passes
+    (session checks) while logged in."""
+    with open(SCENARIO) as file_:
+        scenario = json.load(file_)
+    scenario["Duration"] = LOGIN + 10 + MENU
+    with io.open(os.path.join(firmware, "constants.py")) as file_:
+        names = {}
+        exec(file_.read(), names)
+    console = [[LOGIN * 1000, names["ESC_CHAR"] * 3], [(LOGIN + 2) * 1000, names["PASSWD"] + "\r"], [(LOGIN + 5) * 1000, "\x1b"]]
+    scenario.setdefault("Uarts", {})["1"] = {"Recorded":console}
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as file_:
+        json.dump(scenario, file_)
+    sim = SIM(firmware, file_.name)
+    os.unlink(file_.name)
+    sim.install()
+    passes = [0, None]  # Passes logged in, first one us.
+    with contextlib.redirect_stdout(io.StringIO()):
+        module = importlib.import_module("session")
+    check = module.SESSION.check
+    def counted(self):
+        if self.loggedin and self.board.interactive:
+            passes[0] += 1
+            if passes[1] is None:
+                passes[1] = sim.kernel.us
+        return check(self)
+    module.SESSION.check = counted
+    console = io.open(sim.console, "w")
+    stdout = sys.stdout
+    sys.stdout = console
+    try:
+        sim.main = sim.kernel.start(sim._boot)
+        while not sim.kernel.done.wait(1):
+            pass
+    finally:
+        sys.stdout = stdout
+        console.close()
+        sim.uninstall()
+    seconds = (sim.kernel.us - passes[1]) / 1000000 if passes[1] is not None else 0
+    per_hour = round(passes[0] * 3600 / seconds) if seconds else "-"
+    results.append(("main loop passes/h", round(seconds), "-", per_hour, seconds > MENU // 2 and per_hour <= LOOP_MAX))
+
+def main():
+    parser = argparse.ArgumentParser(prog="python3 -m simulator.session", description="Tests the remote session expiry.")
+    parser.add_argument("-f", "--firmware", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "firmware"), help="firmware dir")
+    args = parser.parse_args()
+    sim = SIM(os.path.abspath(args.firmware), SCENARIO, duration=30 * 86400)
+    sim.install()
+    results = []
+    try:
+        sim.kernel.start(tests, (sim, results)).join()
+    finally:
+        sim.uninstall()
+    if results and results[-1][0] != "waiting {} s".format(WAIT):  # Firmware with deadlines.
+        mainloop(os.path.abspath(args.firmware), results)
+    print("{:<24}{:>10}{:>12}{:>14}{:>8}".format("TEST", "ENDED s", "EXPECTED s", "CLOCK READS", "OK"))
+    for name, ended, expected, reads, ok in results:
+        print("{:<24}{:>10}{:>12}{:>14}{:>8}".format(name, ended, expected, reads, "yes" if ok else "NO"))
+    sys.exit(0 if results and all(result[4] for result in results) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Simulated board state and run loop.
+
+The fake modules in simulator/fakes shadow the MicroPython ones and keep their
+state in :data:`current`. The firmware is copied to a work dir mounted as
+/flash, a second dir is mounted as /sd by boot.py when the scenario has an sd
+card, builtin open() is redirected to the mounted dirs.
+"""
+
+import builtins
+import calendar
+import errno
+import gc
+import importlib.util
+import io
+import json
+import os
+import runpy
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+from simulator.kernel import KERNEL
+from simulator.report import REPORT
+from simulator import peers
+from simulator.battery import BATTERY
+
+"""The running simulation, read by the fake modules."""
+current = None
+
+FAKES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fakes")
+
+SCENARIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenarios", "default.json")
+
+class WRITER(object):
+    """Wraps a file opened for writing, counts the written bytes.
+
+    Params:
+        file_(obj)
+        report(obj): :class:`simulator.report.REPORT`
+    """
+
+    def __init__(self, file_, report):
+        self._file = file_
+        self._report = report
+
+    def write(self, data):
+        count = self._file.write(data)
+        self._report.write(len(data.encode("utf-8")) if isinstance(data, str) else len(data))
+        return count
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self._file.close()
+
+class HEAP(object):
+    """Heap model shadowing the gc functions.
+
+    The firmware allocates "Alloc_Rate" bytes per awake second on top of the
+    "Heap_Base" live bytes, a collection frees back to the live bytes and takes
+    "Collect_Us" at 168 MHz. Crossing the threshold (the free heap when unset)
+    counts an automatic collection, as the board allocator does. Collections
+    are counted in the report, the simulated clock doesn't move.
+
+    Params:
+        sim(obj): :class:`SIM`
+    """
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.size = int(sim.config.get("Heap", 102400))
+        self.base = int(sim.config.get("Heap_Base", self.size // 3))
+        self.rate = int(sim.config.get("Alloc_Rate", 4000))
+        self.collect_us = int(sim.config.get("Collect_Us", 1500))
+        self.limit = -1
+        self.mark = 0  # Ticks at the last collection.
+
+    def allocated(self):
+        """Settles the automatic collections, returns the bytes allocated since the last one."""
+        ticks = self.sim.kernel.ticks_us()
+        limit = self.limit if self.limit >= 0 else self.size - self.base
+        allocated = self.rate * (ticks - self.mark) // 1000000
+        while allocated >= max(limit, 1):
+            self.mark += max(limit, 1) * 1000000 // max(self.rate, 1)
+            allocated -= limit
+            self.sim.report.collect(self.cost(), auto=True)
+        return allocated
+
+    def cost(self):
+        """Returns a collection duration at the current clock."""
+        return self.collect_us * 168000000 // self.sim.freq
+
+    def collect(self):
+        self.allocated()
+        self.mark = self.sim.kernel.ticks_us()
+        self.sim.report.collect(self.cost())
+
+    def mem_alloc(self):
+        return min(self.base + self.allocated(), self.size)
+
+    def mem_free(self):
+        return self.size - self.mem_alloc()
+
+    def threshold(self, *args):
+        if args:
+            self.allocated()
+            self.limit = int(args[0])
+        return self.limit
+
+def _getattr(self, name):
+    """Falls back to the class names, as the board MicroPython does for instances."""
+    if name in ("__qualname__", "__name__"):
+        return type(self).__qualname__
+    raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+
+def _merge(config, keys):
+    """Merges keys into a config, nested objects included.
+
+    Params:
+        config(dict)
+        keys(dict)
+    Returns:
+        config(dict)
+    """
+    for key in keys:
+        if isinstance(keys[key], dict) and isinstance(config.get(key), dict):
+            _merge(config[key], keys[key])
+        else:
+            config[key] = keys[key]
+    return config
+
+class SIM(object):
+    """Creates a simulation.
+
+    Params:
+        firmware(str): firmware dir
+        scenario(str): scenario json file, its "Constants" override the
+            firmware ones, its "Configs" {name:source,...} copy firmware
+            config files, e.g. to enable a _disabled one, or merge the
+            source keys into them if the source is an object
+        workdir(str): dir holding the flash and sd copies, temporary if None
+        duration(int): simulated seconds, overrides the scenario
+        constants(dict): firmware constants overrides, added to the scenario ones
+    """
+
+    def __init__(self, firmware, scenario=SCENARIO, workdir=None, duration=None, constants=None):
+        global current
+        with open(scenario) as file_:
+            self.config = json.load(file_)
+        if duration is None:
+            duration = self.config.get("Duration", 86400)
+        epoch = calendar.timegm(time.strptime(self.config.get("Epoch", "2000-01-01 00:00:00"), "%Y-%m-%d %H:%M:%S")) - 946684800
+        self.kernel = KERNEL(epoch, duration, drift=float(self.config.get("Rtc_Drift", 0)))
+        self.report = REPORT(self.kernel)
+        self.firmware = os.path.abspath(firmware)
+        self.workdir = workdir or tempfile.mkdtemp(prefix="buoy_")
+        self.flash = os.path.join(self.workdir, "flash")
+        self.sd = os.path.join(self.workdir, "sd")
+        self.console = os.path.join(self.workdir, "console.txt")
+        self.mounts = {"/flash":self.flash}
+        self.cwd = "/flash"
+        self.freq = int(self.config.get("Freq", 168000000))
+        self.report.clock(self.freq)
+        self.usb = bool(self.config.get("Usb", 0))
+        self.sdcard = bool(self.config.get("Sd", 1))
+        self.adc = self.config.get("Adc", {})
+        self.configs = self.config.get("Configs", {})  # {name:source,...}
+        self.constants = dict(self.config.get("Constants", {}), **(constants or {}))
+        self.reset_cause = 1  # PWRON_RESET
+        self.wakeup_ms = None  # Rtc wakeup period.
+        self.repl = None
+        self.main = None  # Thread running boot.py and main.py.
+        self.pins = {}  # {name:value,...}
+        self.leds = {}  # {id:intensity,...}
+        self.uarts = {}  # {bus:uart,...}
+        self.i2cs = {}  # {bus:pyb.I2C,...}
+        self.sources = {}  # {bus:[source,...],...}
+        for bus in self.config.get("Uarts", {}):
+            self.sources[int(bus)] = peers.build(self.config["Uarts"][bus])
+            for source in self.sources[int(bus)]:
+                source.attach(self)
+                if hasattr(source, "summary"):
+                    self.report.probes.append(source.summary)
+        self.battery = None
+        if "Battery" in self.config:
+            self.battery = BATTERY(self, self.config["Battery"])
+            self.report.probes.append(self.battery.summary)
+        self.report.probes.append(self._governor)
+        self.report.probes.append(self._uasyncio)
+        self.i2c = {}  # {bus:{address:device,...},...}
+        for bus in self.config.get("I2c", {}):
+            for address, config in self.config["I2c"][bus].items():
+                sources = peers.build(config)
+                for source in sources:
+                    source.attach(self)
+                self.i2c.setdefault(int(bus), {})[int(address, 16)] = peers.DDC(sources, config.get("Buf_Len", 4096))
+        current = self
+
+    def path(self, path):
+        """Maps a board path to a host path.
+
+        Params:
+            path(str)
+        Returns:
+            (str)
+        """
+        if not path.startswith("/"):
+            path = self.cwd + "/" + path
+        parts = [part for part in path.split("/") if part and part != "."]
+        if not parts:
+            return self.workdir
+        media = "/" + parts[0]
+        if media not in self.mounts:
+            raise OSError(errno.ENODEV, path)
+        return os.path.join(self.mounts[media], *parts[1:])
+
+    def open(self, file, mode="r", *args, **kwargs):
+        """Replaces builtin open() while the firmware runs."""
+        if isinstance(file, str):
+            file = self.path(file)
+        file_ = io.open(file, mode, *args, **kwargs)
+        if any(char in mode for char in "wa+"):
+            self.report.open()
+            return WRITER(file_, self.report)
+        return file_
+
+    def build_class(self, func, name, *bases, **kwargs):
+        """Replaces builtin __build_class__ while the firmware runs, firmware
+        classes get the instance __qualname__ lookup."""
+        cls = self._build_class(func, name, *bases, **kwargs)
+        if func.__code__.co_filename.startswith(self.flash) and not hasattr(cls, "__getattr__"):
+            cls.__getattr__ = _getattr
+        return cls
+
+    def install(self):
+        """Copies the firmware to flash, shadows the MicroPython modules."""
+        shutil.copytree(self.firmware, self.flash, ignore=shutil.ignore_patterns("__pycache__", "*.pyc"), dirs_exist_ok=True)
+        os.makedirs(self.sd, exist_ok=True)
+        for name in self.configs:  # Scenario configs, copied over the flash ones or merged into them.
+            if isinstance(self.configs[name], dict):
+                with open(os.path.join(self.flash, "configs", name)) as file_:
+                    config = _merge(json.load(file_), self.configs[name])
+                with open(os.path.join(self.flash, "configs", name), "w") as file_:
+                    json.dump(config, file_)
+            else:
+                shutil.copyfile(os.path.join(self.flash, "configs", self.configs[name]), os.path.join(self.flash, "configs", name))
+        if self.constants:  # Scenario overrides, appended to the flash copy.
+            with io.open(os.path.join(self.flash, "constants.py"), "a") as file_:
+                for key in self.constants:
+                    file_.write("\n{} = {!r}".format(key, self.constants[key]))
+        self._path = list(sys.path)
+        self._cwd = os.getcwd()
+        sys.path[:0] = [FAKES, self.flash]
+        self._thread = sys.modules["_thread"]
+        spec = importlib.util.spec_from_file_location("_thread", os.path.join(FAKES, "_thread.py"))  # Builtin, sys.path can't shadow it.
+        sys.modules["_thread"] = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(sys.modules["_thread"])
+        os.chdir(self.flash)
+        builtins.open = self.open
+        self._build_class = builtins.__build_class__
+        builtins.__build_class__ = self.build_class
+        self._gc = {"collect":gc.collect}  # The host one, mem_free(), mem_alloc() and threshold() are MicroPython only.
+        self.heap = HEAP(self)
+        gc.collect = self.heap.collect
+        gc.mem_free = self.heap.mem_free
+        gc.mem_alloc = self.heap.mem_alloc
+        gc.threshold = self.heap.threshold
+
+    def _governor(self):
+        """Returns the frequency switches the firmware governor put off."""
+        governor = sys.modules.get("tools.governor")
+        if governor is None or not getattr(governor, "__file__", "").startswith(self.flash) or not hasattr(governor, "deferred"):
+            return {}
+        return {"freq_deferred":governor.deferred}
+
+    def _uasyncio(self):
+        """Returns the longest event loop pass of the fake uasyncio."""
+        uasyncio = sys.modules.get("uasyncio")
+        if uasyncio is None or not hasattr(uasyncio, "stall_us"):
+            return {}
+        return {"loop_stall_ms":uasyncio.stall_us // 1000}
+
+    def uninstall(self):
+        """Restores the host environment."""
+        builtins.open = io.open
+        builtins.__build_class__ = self._build_class
+        for name in ("collect", "mem_free", "mem_alloc", "threshold"):
+            if name in self._gc:
+                setattr(gc, name, self._gc[name])
+            else:
+                delattr(gc, name)
+        sys.modules["_thread"] = self._thread
+        sys.path[:] = self._path
+        os.chdir(self._cwd)
+
+    def _boot(self):
+        """Runs boot.py then main.py as the board does."""
+        try:
+            runpy.run_path(os.path.join(self.flash, "boot.py"), run_name="boot")
+            runpy.run_path(os.path.join(self.flash, "main.py"), run_name="__main__")
+            self.kernel.halt("main.py returned")
+        except SystemExit:
+            self.kernel.halt("main.py exited")
+        except BaseException as err:
+            if not self.kernel.reason:
+                traceback.print_exc(file=sys.__stderr__)
+                self.kernel.halt("main.py crashed: {!r}".format(err))
+
+    def run(self, quiet=True):
+        """Runs the firmware until the end of the simulated time.
+
+        Params:
+            quiet(bool): redirects the firmware output to the console file
+        Returns:
+            report(obj): :class:`simulator.report.REPORT`
+        """
+        self.install()
+        stdout = sys.stdout
+        console = io.open(self.console, "w")
+        if quiet:
+            sys.stdout = console
+        try:
+            self.main = self.kernel.start(self._boot)
+            while not self.kernel.done.wait(1):
+                pass
+        finally:
+            sys.stdout = stdout
+            console.close()
+            self.uninstall()
+        return self.report
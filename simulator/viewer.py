@@ -0,0 +1,153 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2018 OGS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Host test of the file viewer (firmware tools/viewer.py) on multi MB logs.
+
+Writes logs of growing size to the flash, checks the tail, the pages forward
+and back (past the offset index) and the grep output against the file, and
+shows the peak host allocation of each, which must not grow with the size:
+
+    python3 -m simulator.viewer [-m mbytes,...] [-f firmware]
+
+The first row is the whole file read the config view used. Exits with 1 if
+an output is wrong or a peak grows with the file.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import importlib
+import io
+import os
+import random
+import sys
+import time
+import tracemalloc
+from simulator.sim import SIM, SCENARIO
+
+PAGES = 50  # Paged forward, then back to the first.
+PATTERN = b"ERROR"
+
+def log(path, mbytes):
+    """Writes a log of about mbytes, a few lines longer than a view block.
+
+    Returns:
+        lines(list), bytes
+    """
+    random.seed(mbytes)
+    lines = []
+    size = 0
+    i = 0
+    while size < mbytes * 1024 * 1024:
+        if i % 5000 == 4999:
+            line = b"2018-01-01 00:00:00 dump " + b"x" * random.randint(600, 2000) + b"\n"
+        else:
+            line = b"2018-01-01 00:00:00 %s %d\n" % (PATTERN if i % 997 == 0 else b"ok", random.getrandbits(32))
+        lines.append(line)
+        size += len(line)
+        i += 1
+    lines.append(b"2018-01-01 00:00:00 no newline")  # Partial last line.
+    with open(path, "wb") as file:
+        for line in lines:
+            file.write(line)
+    return lines
+
+def measure(func, *args):
+    """Runs func with a digest of its output.
+
+    Returns:
+        digest, peak bytes, host s
+    """
+    digest = hashlib.sha1()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    func(*args, digest.update)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return digest.hexdigest(), peak, seconds
+
+def pages(viewer, path, out):
+    pager = viewer.PAGER(path)
+    for i in range(PAGES):
+        pager.forward(out)
+    for i in range(PAGES - 1):
+        pager.back(out)
+
+def read(path, out):
+    with open(path, "rb") as file:
+        out(file.read())
+
+def expected(lines, lines_page, block):
+    """Returns the reference digests of the tail, pages and grep outputs."""
+    cut = []  # The viewer lines, longer ones cut at the block.
+    for line in lines:
+        cut.extend(line[i:i + block] for i in range(0, len(line), block))
+    tail = hashlib.sha1(b"".join(lines[-lines_page:]))
+    paged = hashlib.sha1()
+    order = list(range(PAGES)) + list(range(PAGES - 2, -1, -1))
+    for page in order:
+        paged.update(b"".join(cut[page * lines_page:(page + 1) * lines_page]))
+    found = hashlib.sha1(b"".join(line for line in cut if PATTERN in line))
+    return tail.hexdigest(), paged.hexdigest(), found.hexdigest()
+
+def main():
+    parser = argparse.ArgumentParser(prog="python3 -m simulator.viewer", description="Tests the file viewer memory use on large logs.")
+    parser.add_argument("-f", "--firmware", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "firmware"), help="firmware dir")
+    parser.add_argument("-m", "--mbytes", default="1,4,16", help="log sizes")
+    args = parser.parse_args()
+    sim = SIM(os.path.abspath(args.firmware), SCENARIO)
+    sim.install()
+    failed = False
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            viewer = importlib.import_module("tools.viewer")
+            constants = importlib.import_module("constants")
+        print("{:<8}{:<10}{:>12}{:>10}{:>8}".format("MB", "VIEW", "PEAK bytes", "s", "OK"))
+        peaks = {}
+        for mbytes in (int(size) for size in args.mbytes.split(",")):
+            path = "/flash/View_{}.txt".format(mbytes)
+            lines = log(path, mbytes)
+            reference = expected(lines, constants.VIEW_LINES, constants.VIEW_BLOCK)
+            del lines
+            _, peak, seconds = measure(read, path)
+            print("{:<8}{:<10}{:>12}{:>10.3f}{:>8}".format(mbytes, "read", peak, seconds, "-"))
+            views = (("tail", lambda out: viewer.tail(path, constants.VIEW_LINES, out)),
+                ("pages", lambda out: pages(viewer, path, out)),
+                ("grep", lambda out: viewer.grep(path, PATTERN, out)))
+            for (name, view), digest in zip(views, reference):
+                result, peak, seconds = measure(view)
+                ok = result == digest
+                if name in peaks:
+                    ok &= peak <= peaks[name] + 1024  # Constant, give or take the interpreter noise.
+                else:
+                    peaks[name] = peak
+                failed |= not ok
+                print("{:<8}{:<10}{:>12}{:>10.3f}{:>8}".format(mbytes, name, peak, seconds, "yes" if ok else "NO"))
+            os.remove(sim.path(path))
+    finally:
+        sim.uninstall()
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()